@@ -39,8 +39,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.UserProfileMiddleware',  # request.profile & request.role
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',  # Aktif jika QUERY_BUDGET_AKTIF
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -49,8 +51,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Cached loader (compile sekali per proses). EmailCssLoader = app_directories
+            # + inline CSS untuk template core/email/ (lihat core/email_templates.py)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'core.email_templates.EmailCssLoader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -127,13 +136,112 @@ MEDIA_URL = '/media/'
 # Folder fisik di komputer untuk menyimpan file
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Cache (dipakai untuk cache role/profil user)
+# Isi REDIS_URL di .env agar cache dipakai bersama semua worker, jika kosong pakai LocMem
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'birojasaapp',
+        }
+    }
+
+# Lama cache profil user (detik). LocMem per-proses, jadi batasi agar worker lain ikut update
+PROFILE_CACHE_TIMEOUT = int(os.getenv('PROFILE_CACHE_TIMEOUT', 300))
+
+# Budget query per request (core.middleware.QueryBudgetMiddleware): view yang melebihi
+# dicatat ke logger 'core.query_budget'. Batas per view di core/tests.py (QueryBudgetTest),
+# tidak boleh melebihi QUERY_BUDGET_MAKS / QUERY_BUDGET_VIEW di bawah.
+# Default aktif hanya jika DEBUG=True (development). Di production middleware dilepas
+# dari chain (MiddlewareNotUsed) kecuali QUERY_BUDGET_AKTIF=1 diisi di .env.
+QUERY_BUDGET_AKTIF = os.getenv('QUERY_BUDGET_AKTIF', str(DEBUG)).lower() in ('1', 'true')
+QUERY_BUDGET_MAKS = int(os.getenv('QUERY_BUDGET_MAKS', 15))         # Jumlah query per request
+QUERY_BUDGET_MAKS_MS = int(os.getenv('QUERY_BUDGET_MAKS_MS', 200))  # Total waktu SQL per request
+# Budget khusus per nama URL. POST pengajuan menulis kode permohonan, rollup harian,
+# referensi blob, dokumen & audit log dalam satu transaksi (termasuk SAVEPOINT-nya).
+# Setiap save() Permohonan/Pembayaran yang sudah ada + 1 query (SELECT ... FOR UPDATE rollup).
+# Angkanya untuk request pertama hari itu (baris counter/rollup baru di-INSERT),
+# diukur QueryBudgetTest -> request biasa selalu di bawahnya.
+QUERY_BUDGET_VIEW = {
+    'form_pengajuan': 32,
+    'revisi_pengajuan': 20,
+    'verifikasi_permohonan': 19,
+    'konfirmasi_lunas': 23,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.query_budget': {'handlers': ['console'], 'level': 'WARNING'},
+        'core.utils': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Worker PDF (python manage.py pdf_worker)
+PDF_WORKER_PROSES = int(os.getenv('PDF_WORKER_PROSES', os.cpu_count() or 1))
+PDF_JOB_MAKS_PERCOBAAN = 3
+PDF_JOB_RETRY_DETIK = 30  # Jeda retry pertama, dikali 2 setiap gagal (sama seperti email)
+
+# Cache PDF di disk (invoice/struk/laporan), digusur LRU jika melebihi batas ukuran
+PDF_CACHE_DIR = os.path.join(MEDIA_ROOT, 'pdf_cache')
+PDF_CACHE_MAKS_BYTES = int(os.getenv('PDF_CACHE_MAKS_MB', 200)) * 1024 * 1024
+PDF_CACHE_GUSUR_SETIAP = int(os.getenv('PDF_CACHE_GUSUR_SETIAP', 20))  # Scan LRU tiap N kali tulis per proses
+
+# Export laporan di background (python manage.py export_worker)
+EXPORT_LINK_DETIK = 15 * 60       # Masa berlaku link unduhan
+EXPORT_SIMPAN_JAM = 24            # File export dihapus worker setelah ini
+EXPORT_INLINE_MAKS_HARI = 31      # Cetak PDF periode lebih panjang dari ini -> dibuat di background
+
+# Upload bertahap (chunked) dokumen besar, bisa dilanjutkan jika koneksi putus
+UPLOAD_CHUNK_DIR = os.path.join(BASE_DIR, 'upload_tmp')  # Di luar MEDIA_ROOT: tidak bisa diakses publik
+UPLOAD_CHUNK_BYTES = 1024 * 1024          # Ukuran potongan dari browser (harus < DATA_UPLOAD_MAX_MEMORY_SIZE)
+UPLOAD_MAKS_BYTES = 20 * 1024 * 1024      # Ukuran maksimal satu file
+UPLOAD_SIMPAN_JAM = 24                    # Upload yang tidak dipakai form dihapus setelah ini
+
+# File media yatim (tidak dirujuk database), dipindah oleh `manage.py bersihkan_media`
+MEDIA_KARANTINA_DIR = os.path.join(BASE_DIR, 'media_karantina')  # Di luar MEDIA_ROOT
+MEDIA_KARANTINA_HARI = 30         # Isi karantina dihapus permanen setelah ini
+MEDIA_YATIM_MIN_JAM = 24          # File lebih muda dari ini tidak disentuh (upload yang belum commit)
+
+# Normalisasi gambar upload (python manage.py gambar_worker)
+GAMBAR_MAKS_PX = 2000              # Sisi terpanjang gambar setelah diperkecil
+GAMBAR_FORMAT = 'WEBP'             # WEBP atau JPEG
+GAMBAR_KUALITAS = 82
+GAMBAR_THUMBNAIL_PX = (320, 240)   # Ukuran tetap thumbnail di halaman review
+
+# Pengiriman file media lewat view ber-autentikasi (core/media.py):
+# 'django'   = stream dari Python (development/test)
+# 'nginx'    = X-Accel-Redirect ke location internal MEDIA_ACCEL_PREFIX
+# 'sendfile' = X-Sendfile (Apache mod_xsendfile)
+MEDIA_DELIVERY = os.getenv('MEDIA_DELIVERY', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Backend bisa diganti lewat .env, misal console/filebased untuk development
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')  # dipakai filebased backend
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = 'BiroJasaApp <noreply@birojasaapp.com>'
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')  # Untuk link absolut di email
+
+# Worker email (python manage.py email_worker)
+EMAIL_RATE_PER_MENIT = int(os.getenv('EMAIL_RATE_PER_MENIT', 60))
+EMAIL_MAKS_PERCOBAAN = 5
+EMAIL_RETRY_DETIK = 30  # Jeda retry pertama, dikali 2 setiap gagal
 SECURE_CROSS_ORIGIN_OPENER_POLICY = None
 
 # Custom Setting for Firebase
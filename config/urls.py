@@ -1,25 +1,19 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import media_view
+
 urlpatterns = [
     path('2025/', admin.site.urls),
     path('', include('core.urls')),
+    # File upload user (dokumen, bukti bayar, export) hanya lewat view yang cek login & hak akses.
+    # Di production transfer diserahkan ke nginx (X-Accel-Redirect), lihat MEDIA_DELIVERY.
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', media_view, name='media'),
 ]
 
-# --- KONFIGURASI WAJIB UNTUK MEDIA & STATIC ---
-
-# 1. Saat Mode Development (DEBUG = True) -> Laptop Anda
-if settings.DEBUG:
-    # Sajikan File Media (Upload User)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    # Sajikan File Static (CSS/JS)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-
-# 2. Saat Mode Production (DEBUG = False) -> Untuk Tes Error Page tadi
-# (Opsional: Memaksa serve static di local saat debug false, 
+# --- KONFIGURASI WAJIB UNTUK STATIC ---
+# (Opsional saat DEBUG = False: memaksa serve static dari Django,
 # tapi biasanya tidak disarankan untuk production asli)
-else:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -3,7 +3,7 @@ from .models import (
     Pelanggan, Karyawan, Layanan, MasterDokumen, 
     LayananDokumen, Permohonan, Dokumen, Pembayaran,
     PermohonanAuditLog, PembayaranAuditLog,
-    TahapanLayanan, TahapanPermohonan
+    TahapanLayanan, TahapanPermohonan, PdfJob, OutboundEmail, ExportJob, GambarJob, BlobFile
 )
 
 @admin.register(Pelanggan)
@@ -88,4 +88,38 @@ class PembayaranAuditLogAdmin(admin.ModelAdmin):
         return False  # Tidak bisa manual add
     
     def has_delete_permission(self, request, obj=None):
-        return False  # Tidak bisa delete
\ No newline at end of file
+        return False  # Tidak bisa delete
+
+@admin.register(PdfJob)
+class PdfJobAdmin(admin.ModelAdmin):
+    list_display = ('pembayaran', 'jenis', 'status', 'percobaan', 'created_at', 'updated_at')
+    list_filter = ('status', 'jenis')
+    search_fields = ('pembayaran__nomor_invoice', 'email_tujuan')
+    readonly_fields = ('pesan_error', 'created_at', 'updated_at')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subjek', 'email_tujuan', 'status', 'percobaan', 'jadwal_kirim', 'terkirim_at')
+    list_filter = ('status',)
+    search_fields = ('subjek', 'email_tujuan')
+    exclude = ('lampiran',)
+    readonly_fields = ('pesan_error', 'terkirim_at', 'created_at', 'updated_at')
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'diminta_oleh', 'status', 'progres', 'created_at', 'kedaluwarsa_at')
+    list_filter = ('status', 'laporan', 'format')
+    readonly_fields = ('kunci_aktif', 'pesan_error', 'created_at', 'updated_at')
+
+@admin.register(GambarJob)
+class GambarJobAdmin(admin.ModelAdmin):
+    list_display = ('path_asli', 'sumber', 'status', 'created_at', 'updated_at')
+    list_filter = ('status', 'sumber')
+    search_fields = ('path_asli', 'path_hasil')
+    readonly_fields = ('pesan_error', 'created_at', 'updated_at')
+
+@admin.register(BlobFile)
+class BlobFileAdmin(admin.ModelAdmin):
+    list_display = ('nama', 'ukuran', 'jumlah_referensi', 'created_at')
+    search_fields = ('nama', 'sha256')
+    readonly_fields = ('nama', 'sha256', 'ukuran', 'jumlah_referensi', 'created_at', 'updated_at')
@@ -0,0 +1,99 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+# ==========================================
+# ANTREAN JOB DI TABEL (PDF, EMAIL, EXPORT, GAMBAR)
+# ==========================================
+# Semua antrean memakai pola yang sama: status 'pending' -> <status proses> -> selesai,
+# klaim lewat UPDATE bersyarat, dan job yang worker-nya mati dikembalikan ke 'pending'
+# berdasarkan updated_at. Modul antrean cukup menyediakan fungsi proses_*-nya.
+
+# Job yang tidak diperbarui lebih lama dari ini dianggap worker-nya mati -> diantrekan ulang
+BATAS_MACET = datetime.timedelta(minutes=10)
+
+def reset_macet(model, batas=BATAS_MACET, status_proses='processing', **kolom_reset):
+    """
+    Kembalikan job `status_proses` yang updated_at-nya lebih lama dari `batas` ke 'pending'.
+    `kolom_reset`: field lain yang ikut direset (mis. progres=0). Return jumlah job.
+    """
+    waktu = datetime.datetime.now() - batas
+    return model.objects.filter(status=status_proses, updated_at__lt=waktu).update(status='pending', **kolom_reset)
+
+def klaim(model, jumlah, status_proses='processing', urutan='created_at', kandidat=None, select_related=(), **kondisi):
+    """
+    Klaim maksimal `jumlah` job pending (+ `kondisi` filter) dari `kandidat` baris
+    terdepan (default = jumlah). UPDATE bersyarat status='pending' per baris memastikan
+    satu job hanya diambil satu worker walau worker jalan paralel. Return list job.
+    """
+    sekarang = datetime.datetime.now()
+    daftar = model.objects.filter(status='pending', **kondisi).order_by(urutan).values_list('id', flat=True)
+    diklaim = []
+    for pk in daftar[:kandidat or jumlah]:
+        if len(diklaim) == jumlah:
+            break
+        if model.objects.filter(pk=pk, status='pending').update(status=status_proses, updated_at=sekarang):
+            diklaim.append(pk)
+    return list(model.objects.filter(pk__in=diklaim).select_related(*select_related).order_by(urutan))
+
+# ==========================================
+# WORKER (manage.py <nama>_worker)
+# ==========================================
+
+class WorkerCommand(BaseCommand):
+    """
+    Loop worker antrean: reset job macet sekali saat mulai, panggil proses() selama
+    masih ada job, lalu tunggu --interval detik (atau berhenti jika --sekali).
+    Subclass mengisi judul, satuan, model (+ status_proses/kolom_reset) dan proses().
+    """
+    judul = 'Worker'
+    satuan = 'job'
+    model = None
+    status_proses = 'processing'
+    kolom_reset = {}
+    interval = 2
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=self.interval, help='Jeda (detik) saat antrean kosong')
+        parser.add_argument('--sekali', action='store_true', help='Proses antrean yang ada lalu berhenti')
+
+    def mulai(self, options):
+        """Dipanggil sekali sebelum loop, setelah job macet diantrekan ulang."""
+
+    def proses(self, options):
+        """Satu putaran. Return jumlah job yang diproses (0 = antrean kosong)."""
+        raise NotImplementedError
+
+    def laporkan(self, jumlah):
+        self.stdout.write(f'  ✅ {jumlah} {self.satuan} diproses')
+
+    def saat_kosong(self, options):
+        """Dipanggil setiap antrean kosong, sebelum tidur / berhenti."""
+
+    def selesai(self, options):
+        """Dipanggil saat worker berhenti (termasuk Ctrl+C)."""
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{self.judul} berjalan...')
+
+        direset = reset_macet(self.model, status_proses=self.status_proses, **self.kolom_reset)
+        if direset:
+            self.stdout.write(f'  ♻️  {direset} {self.satuan} macet diantrekan ulang')
+
+        self.mulai(options)
+        try:
+            while True:
+                jumlah = self.proses(options)
+                if jumlah:
+                    self.laporkan(jumlah)
+                    continue
+
+                self.saat_kosong(options)
+                if options['sekali']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(f'\n⏹️  {self.judul} dihentikan')
+        finally:
+            self.selesai(options)
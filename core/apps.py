@@ -7,3 +7,5 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals
+        from core.email_templates import muat_template_email
+        muat_template_email()
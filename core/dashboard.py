@@ -0,0 +1,67 @@
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import AktivitasLogin, Karyawan, Pembayaran, Permohonan
+
+# ==========================================
+# QUERYSET DASHBOARD (ANTREAN & RIWAYAT)
+# ==========================================
+# Dipakai views dashboard + endpoint "Muat Lagi", dan oleh QueueIndexExplainTest
+# (EXPLAIN queryset yang sama) untuk memastikan index gabungan di models.py terpakai.
+# Riwayat tidak diurutkan di sini: paginate_keyset mengurutkan (updated_at, id).
+
+def antrean_admin_qs():
+    """
+    Semua permohonan aktif untuk tab-tab dashboard staff admin dalam satu query,
+    dibagi per tab di view. Relasi yang dipakai template ikut di-JOIN.
+    """
+    Status = Permohonan.Status
+    # Sedang berjalan = sudah ada karyawan, status selain Selesai/Menunggu Finalisasi/Diproses.
+    # Ditulis sebagai IN daftar status (bukan NOT IN) agar kedua sisi OR bisa memakai
+    # index status; NOT IN membuat seluruh tabel di-scan.
+    sedang_berjalan = [s for s in Status if s not in (Status.SELESAI, Status.MENUNGGU_FINALISASI, Status.DIPROSES)]
+    return Permohonan.objects.filter(
+        Q(status_proses__in=[
+            Status.MENUNGGU_VERIFIKASI, Status.REVISI, Status.MENUNGGU_PEMBAYARAN,
+            Status.DIPROSES, Status.MENUNGGU_FINALISASI, Status.SIAP_DIAMBIL
+        ])
+        | Q(status_proses__in=sedang_berjalan, karyawan__isnull=False)
+    ).select_related('pelanggan', 'layanan', 'karyawan', 'tagihan').order_by('created_at')
+
+def riwayat_selesai_qs():
+    return Permohonan.objects.filter(status_proses=Permohonan.Status.SELESAI).select_related('pelanggan', 'layanan')
+
+def tugas_lapangan_qs(karyawan):
+    # Tugas Aktif: yang statusnya masih progres di lapangan (belum balik kantor/selesai)
+    return Permohonan.objects.filter(
+        karyawan=karyawan, status_proses__in=Permohonan.STATUS_LAPANGAN
+    ).select_related('layanan', 'pelanggan').order_by('-updated_at')
+
+def riwayat_tugas_qs(karyawan):
+    # Riwayat Tugas: yang sudah diserahkan balik ke kantor atau sudah beres
+    # (Menunggu Finalisasi s/d Selesai, urut di Permohonan.Status)
+    return Permohonan.objects.filter(
+        karyawan=karyawan,
+        status_proses__range=(Permohonan.Status.MENUNGGU_FINALISASI, Permohonan.Status.SELESAI)
+    )
+
+def permohonan_pelanggan_qs(pelanggan):
+    return Permohonan.objects.filter(pelanggan=pelanggan).select_related('layanan', 'karyawan').order_by('-created_at')
+
+def tagihan_pending_qs():
+    return Pembayaran.objects.filter(
+        status_pembayaran='pending'
+    ).select_related('permohonan__layanan', 'permohonan__pelanggan').order_by('created_at')
+
+def riwayat_lunas_qs():
+    return Pembayaran.objects.filter(status_pembayaran='paid')
+
+def login_staff_terakhir_qs(jumlah=10):
+    """
+    Login terakhir semua staff (monitoring dashboard manajer) + nama Karyawan-nya.
+    """
+    staff_emails = Karyawan.objects.values_list('email', flat=True)
+    return (
+        AktivitasLogin.objects.filter(user__email__in=staff_emails).select_related('user')
+        .annotate(nama_staff=Subquery(Karyawan.objects.filter(email=OuterRef('user__email')).values('nama')[:1]))
+        .order_by('-timestamp')[:jumlah]
+    )
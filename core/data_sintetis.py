@@ -0,0 +1,313 @@
+import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import (
+    Pelanggan, Karyawan, Layanan, MasterDokumen, LayananDokumen, Permohonan, Dokumen, Pembayaran,
+    PermohonanAuditLog, PembayaranAuditLog, AktivitasLogin,
+)
+from .stats import rebuild_periode
+from .storage import dedup_storage
+
+# ==========================================
+# DATA SINTETIS BERVOLUME BESAR (manage.py seed_data --scale N)
+# ==========================================
+# Baris disimpan per batch (satu transaksi per batch) sebagai tuple lewat
+# executemany: INSERT multi-baris yang sama dengan bulk_create, tanpa membuat
+# jutaan instance model. PK diisi sendiri sehingga baris anak bisa langsung
+# menunjuk induknya, dan created_at/updated_at berisi tanggal sintetis.
+# Acak dengan seed tetap -> jumlah & sebaran data sama di setiap mesin.
+# Kode memakai huruf 'S' (PMH-20250102-S0000001, PLG-S000001) sehingga tidak
+# pernah bentrok dengan nomor dari core/kode.py yang selalu berupa angka.
+
+PASSWORD_SINTETIS = 'password123'
+AWALAN_PELANGGAN = 'PLG-S'
+PERMOHONAN_PER_PELANGGAN = 10
+PERMOHONAN_PER_LAPANGAN = 20000
+BATAS_HARI_AKTIF = 30  # Permohonan lebih tua dari ini hampir semua sudah selesai/ditolak
+
+Status = Permohonan.Status
+
+# Sebaran status permohonan yang masih berjalan (umur <= BATAS_HARI_AKTIF)
+BOBOT_STATUS_AKTIF = {
+    Status.MENUNGGU_VERIFIKASI: 8, Status.REVISI: 3, Status.MENUNGGU_PEMBAYARAN: 8,
+    Status.DIPROSES: 6, Status.PROSES_LAPANGAN: 6, Status.PROSES_SAMSAT: 5,
+    Status.CEK_FISIK_SELESAI: 3, Status.MENUNGGU_CETAK: 3, Status.MENUNGGU_FINALISASI: 5,
+    Status.SIAP_DIAMBIL: 6, Status.DIKIRIM: 7, Status.SELESAI: 35, Status.DITOLAK: 5,
+}
+BOBOT_STATUS_LAMA = {Status.SELESAI: 92, Status.DITOLAK: 8}
+
+# Syarat dokumen default jika layanan belum punya (seed_data tidak membuatnya)
+SYARAT_DEFAULT = ['KTP', 'STNK', 'Bukti Bayar Pajak']
+
+NAMA_DEPAN = ['Agus', 'Budi', 'Citra', 'Dewi', 'Eko', 'Fitri', 'Gilang', 'Hana', 'Indra', 'Joko', 'Kartika', 'Lina', 'Made', 'Nur', 'Putri', 'Rizky', 'Sari', 'Teguh', 'Wahyu', 'Yuni']
+NAMA_BELAKANG = ['Santoso', 'Wijaya', 'Saputra', 'Lestari', 'Pratama', 'Hidayat', 'Kusuma', 'Nugroho', 'Siregar', 'Setiawan']
+KOTA = ['Jakarta', 'Bandung', 'Surabaya', 'Semarang', 'Yogyakarta', 'Medan', 'Bekasi', 'Depok', 'Tangerang', 'Bogor']
+USER_AGENT = [
+    'Mozilla/5.0 (Linux; Android 13; SM-A546E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+]
+
+UKURAN_INSERT = 1000  # Baris per statement INSERT
+
+def id_berikut(model):
+    return (model.objects.aggregate(terbesar=Max('pk'))['terbesar'] or 0) + 1
+
+def sudah_ada():
+    return Pelanggan.objects.filter(kode_pelanggan__startswith=AWALAN_PELANGGAN).exists()
+
+class PenampungInsert:
+    """
+    Tampung baris satu tabel (tuple sesuai urutan `kolom`, PK diisi otomatis)
+    lalu tulis sekaligus dengan simpan(). Auto_now & save() tidak berjalan:
+    semua kolom wajib harus diisi pemanggil.
+    """
+    def __init__(self, model, kolom):
+        meta = model._meta
+        qn = connection.ops.quote_name
+        kolom_db = [meta.pk.column] + [meta.get_field(nama).column for nama in kolom]
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(meta.db_table), ', '.join(qn(k) for k in kolom_db), ', '.join(['%s'] * len(kolom_db))
+        )
+        self.pk = id_berikut(model)
+        self.baris = []
+
+    def tambah(self, *nilai):
+        pk = self.pk
+        self.pk += 1
+        self.baris.append((pk, *nilai))
+        return pk
+
+    def simpan(self):
+        with connection.cursor() as cursor:
+            for mulai in range(0, len(self.baris), UKURAN_INSERT):
+                cursor.executemany(self.sql, self.baris[mulai:mulai + UKURAN_INSERT])
+        jumlah = len(self.baris)
+        self.baris = []
+        return jumlah
+
+def pilih(rng, bobot):
+    return rng.choices(list(bobot), weights=list(bobot.values()))[0]
+
+def siapkan_syarat():
+    """
+    Layanan -> list id MasterDokumen syaratnya. Layanan tanpa syarat diberi SYARAT_DEFAULT.
+    """
+    master = dict(MasterDokumen.objects.filter(nama_dokumen__in=SYARAT_DEFAULT).values_list('nama_dokumen', 'id'))
+    syarat = {}
+    for layanan_id in Layanan.objects.values_list('id', flat=True):
+        daftar = list(LayananDokumen.objects.filter(layanan_id=layanan_id).values_list('master_dokumen_id', flat=True))
+        if not daftar:
+            daftar = [master[nama] for nama in SYARAT_DEFAULT if nama in master]
+            LayananDokumen.objects.bulk_create([LayananDokumen(layanan_id=layanan_id, master_dokumen_id=m) for m in daftar])
+        syarat[layanan_id] = daftar
+    return syarat
+
+def siapkan_file_contoh(syarat):
+    """
+    Satu file PDF kecil per jenis dokumen, dipakai bersama semua Dokumen
+    sintetis (blob dedup, jumlah_referensi dihitung ulang di akhir).
+    """
+    nama_file = {}
+    for master in MasterDokumen.objects.filter(id__in={m for daftar in syarat.values() for m in daftar}):
+        isi = f'%PDF-1.4\n% Contoh {master.nama_dokumen}\n%%EOF\n'.encode()
+        with transaction.atomic():
+            nama_file[master.id] = dedup_storage.save(f'contoh_{master.id}.pdf', ContentFile(isi))
+    return nama_file
+
+def buat_pelanggan(rng, jumlah, batch, sekarang, hari):
+    """
+    Pelanggan + akun User (grup Pelanggan). Return list (id pelanggan, id user).
+    """
+    password = make_password(PASSWORD_SINTETIS)  # Hash sekali, dipakai semua akun
+    waktu_db = connection.ops.adapt_datetimefield_value
+    grup_id = Group.objects.get_or_create(name='Pelanggan')[0].id
+    users = PenampungInsert(User, [
+        'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+    ])
+    user_grup = PenampungInsert(User.groups.through, ['user_id', 'group_id'])
+    pelanggan = PenampungInsert(Pelanggan, [
+        'kode_pelanggan', 'nama', 'email', 'no_whatsapp', 'alamat_lengkap', 'created_at', 'updated_at',
+    ])
+    hasil = []
+    for mulai in range(0, jumlah, batch):
+        for i in range(mulai + 1, min(mulai + batch, jumlah) + 1):
+            email = f'sintetis{i:07d}@seed.test'
+            nama_depan, nama_belakang = rng.choice(NAMA_DEPAN), rng.choice(NAMA_BELAKANG)
+            dibuat = waktu_db(sekarang - datetime.timedelta(days=hari, seconds=rng.randrange(86400 * 30)))
+            user_id = users.tambah(password, False, email, nama_depan, nama_belakang, email, False, True, dibuat)
+            user_grup.tambah(user_id, grup_id)
+            pelanggan_id = pelanggan.tambah(
+                f'{AWALAN_PELANGGAN}{i:06d}', f'{nama_depan} {nama_belakang}', email,
+                f'08{rng.randrange(10**9, 10**10)}', f'Jl. Sintetis No. {rng.randrange(1, 300)}, {rng.choice(KOTA)}',
+                dibuat, dibuat,
+            )
+            hasil.append((pelanggan_id, user_id))
+        with transaction.atomic():
+            users.simpan()
+            user_grup.simpan()
+            pelanggan.simpan()
+    return hasil
+
+def buat_lapangan(jumlah):
+    """
+    Staff lapangan sintetis (KRY-S001, ...) + staff lapangan yang sudah ada. Return list id Karyawan.
+    """
+    grup = Group.objects.get_or_create(name='Staff Lapangan')[0]
+    password = make_password(PASSWORD_SINTETIS)
+    for i in range(1, jumlah + 1):
+        email = f'lapangan{i:03d}@seed.test'
+        user = User.objects.create(username=email, email=email, password=password)
+        user.groups.add(grup)
+        Karyawan.objects.create(kode_karyawan=f'KRY-S{i:03d}', nama=f'Staff Lapangan {i}', email=email, role='lapangan')
+    return list(Karyawan.objects.filter(role='lapangan').values_list('id', flat=True))
+
+class PenulisTransaksi:
+    """
+    Permohonan + Dokumen, Pembayaran dan audit log-nya, dengan alur yang sesuai
+    status (tagihan hanya ada setelah diverifikasi, log lunas hanya jika paid, dst).
+    """
+    def __init__(self, rng, karyawan, syarat, file_contoh):
+        self.rng = rng
+        self.karyawan = karyawan
+        self.syarat = syarat
+        self.file_contoh = file_contoh
+        # Diambil sekali: lewat proxy `connection` untuk setiap nilai cukup mahal
+        self.waktu_db = connection.ops.adapt_datetimefield_value
+        self.permohonan = PenampungInsert(Permohonan, [
+            'kode_permohonan', 'pelanggan_id', 'layanan_id', 'karyawan_id', 'status_proses', 'biaya_resmi',
+            'metode_pengiriman', 'catatan_penolakan', 'nomor_resi', 'created_at', 'updated_at',
+        ])
+        self.dokumen = PenampungInsert(Dokumen, [
+            'kode_dokumen', 'permohonan_id', 'master_dokumen_id', 'path_file', 'status_file', 'catatan_perbaikan',
+            'created_at', 'updated_at',
+        ])
+        self.pembayaran = PenampungInsert(Pembayaran, [
+            'nomor_invoice', 'permohonan_id', 'biaya_pengiriman', 'total_biaya', 'metode_pembayaran',
+            'status_pembayaran', 'created_at', 'updated_at',
+        ])
+        self.audit_permohonan = PenampungInsert(PermohonanAuditLog, ['permohonan_id', 'karyawan_id', 'action', 'notes', 'timestamp'])
+        self.audit_pembayaran = PenampungInsert(PembayaranAuditLog, ['pembayaran_id', 'karyawan_id', 'action', 'notes', 'timestamp'])
+
+    def tambah(self, nomor, pelanggan_id, layanan_id, harga_jasa, karyawan_id, status, biaya_resmi, kurir, dibuat, selesai):
+        rng, waktu_db, staff_admin = self.rng, self.waktu_db, self.karyawan['staff_admin']
+        kode = f'PMH-{dibuat:%Y%m%d}-S{nomor:07d}'
+        diubah = selesai if status >= Status.MENUNGGU_FINALISASI else dibuat
+        permohonan_id = self.permohonan.tambah(
+            kode, pelanggan_id, layanan_id, karyawan_id, int(status), biaya_resmi,
+            'Kirim Kurir' if kurir else 'Ambil di Kantor',
+            'Dokumen tidak sesuai data kendaraan' if status == Status.DITOLAK else None,
+            f'JNE{nomor:010d}' if kurir and status in (Status.DIKIRIM, Status.SELESAI) else None,
+            waktu_db(dibuat), waktu_db(diubah),
+        )
+        for urutan, master_id in enumerate(self.syarat[layanan_id]):
+            perbaikan = status == Status.REVISI and urutan == 0
+            self.dokumen.tambah(
+                f'DOK-S{nomor:07d}-{master_id}', permohonan_id, master_id, self.file_contoh[master_id],
+                'Perbaikan' if perbaikan else 'Digital Diupload',
+                'Foto buram, mohon upload ulang' if perbaikan else None,
+                waktu_db(dibuat), waktu_db(dibuat),
+            )
+
+        def log(action, karyawan_id, waktu, notes):
+            self.audit_permohonan.tambah(permohonan_id, karyawan_id, action, notes, waktu_db(waktu))
+
+        log('created', None, dibuat, 'Permohonan dibuat (data sintetis)')
+        if status == Status.DITOLAK:
+            log('rejected', staff_admin, diubah, 'Dokumen tidak sesuai data kendaraan')
+            return
+        if status < Status.MENUNGGU_PEMBAYARAN:
+            return
+
+        diverifikasi = dibuat + datetime.timedelta(hours=rng.randrange(1, 24))
+        log('verified', staff_admin, diverifikasi, f'Diverifikasi. Biaya resmi: Rp {biaya_resmi:,}')
+        lunas = status > Status.MENUNGGU_PEMBAYARAN
+        waktu_lunas = diverifikasi + datetime.timedelta(hours=rng.randrange(1, 48))
+        total = harga_jasa + biaya_resmi
+        metode = rng.choice(['Tunai', 'Transfer/QRIS Manual']) if lunas else None
+        pembayaran_id = self.pembayaran.tambah(
+            f'INV-{kode}', permohonan_id, 0, total, metode, 'paid' if lunas else 'pending',
+            waktu_db(diverifikasi), waktu_db(waktu_lunas if lunas else diverifikasi),
+        )
+        self.audit_pembayaran.tambah(
+            pembayaran_id, staff_admin, 'invoice_created', f'Invoice generated. Total: Rp {total:,}', waktu_db(diverifikasi)
+        )
+        if lunas:
+            for action in ('payment_verified', 'payment_confirmed'):
+                self.audit_pembayaran.tambah(
+                    pembayaran_id, self.karyawan['staff_keuangan'], action,
+                    f'Terima {metode}. Total: Rp {total:,}', waktu_db(waktu_lunas),
+                )
+        if status >= Status.PROSES_LAPANGAN:
+            log('assigned', staff_admin, waktu_lunas, 'Ditugaskan ke staff lapangan')
+        if status >= Status.MENUNGGU_FINALISASI:
+            log('completed', karyawan_id, diubah, 'Pekerjaan lapangan selesai')
+        if status == Status.SELESAI:
+            log('delivered', staff_admin, diubah, 'Dokumen diserahkan ke pelanggan')
+
+    def simpan(self):
+        # Induk dulu (foreign key)
+        with transaction.atomic():
+            for penampung in (self.permohonan, self.dokumen, self.pembayaran, self.audit_permohonan, self.audit_pembayaran):
+                penampung.simpan()
+
+def buat_permohonan(rng, jumlah, batch, sekarang, hari, pelanggan, lapangan, karyawan, syarat, file_contoh):
+    """
+    Generator: simpan `jumlah` permohonan beserta turunannya per batch, yield
+    jumlah permohonan yang sudah tersimpan setelah setiap batch.
+    """
+    layanan = list(Layanan.objects.values_list('id', 'harga_jasa', 'has_custom_tahapan'))
+    penulis = PenulisTransaksi(rng, karyawan, syarat, file_contoh)
+    for mulai in range(0, jumlah, batch):
+        for nomor in range(mulai + 1, min(mulai + batch, jumlah) + 1):
+            # Urut waktu mengikuti nomor (data lama di awal), jam acak di hari itu
+            umur = hari * (jumlah - nomor) / jumlah
+            dibuat = sekarang - datetime.timedelta(days=umur, seconds=rng.randrange(3600))
+            status = pilih(rng, BOBOT_STATUS_AKTIF if umur <= BATAS_HARI_AKTIF else BOBOT_STATUS_LAMA)
+            layanan_id, harga, multi_tahap = rng.choice(layanan)
+            # Pelanggan lama lebih sering mengajukan (sebaran tidak rata seperti data asli)
+            pelanggan_id = pelanggan[int(len(pelanggan) * rng.random() ** 2)][0]
+            penulis.tambah(
+                nomor, pelanggan_id, layanan_id, harga,
+                karyawan_id=rng.choice(lapangan) if Status.PROSES_LAPANGAN <= status < Status.DITOLAK else None,
+                status=status,
+                biaya_resmi=(375000 if multi_tahap else rng.randrange(100, 600) * 1000) if Status.MENUNGGU_PEMBAYARAN <= status < Status.DITOLAK else 0,
+                kurir=rng.random() < 0.4,
+                dibuat=dibuat,
+                selesai=min(dibuat + datetime.timedelta(days=rng.randrange(1, 15)), sekarang),
+            )
+        penulis.simpan()
+        yield min(mulai + batch, jumlah)
+
+def buat_aktivitas_login(rng, pelanggan, batch, sekarang, hari):
+    """
+    1-3 login per pelanggan sintetis + login harian staff. Return jumlah baris.
+    """
+    user_staff = list(User.objects.filter(email__in=Karyawan.objects.values('email')).values_list('id', flat=True))
+    waktu_db = connection.ops.adapt_datetimefield_value
+    login = PenampungInsert(AktivitasLogin, ['user_id', 'ip_address', 'user_agent', 'timestamp'])
+    user_id = [u for _, u in pelanggan for _ in range(rng.randrange(1, 4))] + user_staff * hari
+    jumlah = 0
+    for mulai in range(0, len(user_id), batch):
+        for uid in user_id[mulai:mulai + batch]:
+            login.tambah(
+                uid, f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+                rng.choice(USER_AGENT), waktu_db(sekarang - datetime.timedelta(days=rng.uniform(0, hari))),
+            )
+        with transaction.atomic():
+            jumlah += login.simpan()
+    return jumlah
+
+def bangun_ulang_rollup(sekarang, hari):
+    """
+    Data sintetis tidak lewat save() -> DailyStats/DailyPendapatan dihitung ulang.
+    Satu periode sekaligus (bukan per bulan seperti rebuild_stats): setiap
+    periode berarti satu scan tabel, dan seeding tidak bersaing dengan request.
+    """
+    dari = (sekarang - datetime.timedelta(days=hari + 1)).date()
+    return rebuild_periode(dari, sekarang.date())
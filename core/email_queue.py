@@ -0,0 +1,125 @@
+import datetime
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+
+from .antrean import klaim
+from .models import OutboundEmail
+
+# Error yang menandakan koneksi SMTP putus (koneksi dibuka ulang di batch berikutnya)
+ERROR_KONEKSI = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# ==========================================
+# DIPANGGIL DARI WORKER (manage.py email_worker)
+# ==========================================
+
+def ambil_email(jumlah):
+    """
+    Klaim maksimal `jumlah` email yang sudah jatuh tempo (jadwal_kirim <= sekarang).
+    Klaim bersyarat (core/antrean.py) mencegah email terkirim dobel oleh dua worker.
+    """
+    return klaim(
+        OutboundEmail, jumlah, status_proses='sending', urutan='jadwal_kirim',
+        jadwal_kirim__lte=datetime.datetime.now()
+    )
+
+def buat_pesan(email, connection):
+    if email.pesan_teks:
+        # multipart/alternative: text/plain + text/html
+        pesan = EmailMultiAlternatives(
+            subject=email.subjek,
+            body=email.pesan_teks,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=email.daftar_tujuan,
+            connection=connection
+        )
+        pesan.attach_alternative(email.pesan_html, 'text/html')
+    else:
+        pesan = EmailMessage(
+            subject=email.subjek,
+            body=email.pesan_html,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=email.daftar_tujuan,
+            connection=connection
+        )
+        pesan.content_subtype = "html" # Set isi email jadi HTML
+    if email.lampiran:
+        pesan.attach(email.nama_lampiran, bytes(email.lampiran), 'application/pdf')
+    return pesan
+
+def tandai_gagal(email, error):
+    """
+    Retry dengan exponential backoff (EMAIL_RETRY_DETIK * 2^percobaan),
+    setelah EMAIL_MAKS_PERCOBAAN status jadi 'failed'.
+    """
+    email.percobaan += 1
+    email.pesan_error = str(error)
+    if email.percobaan < settings.EMAIL_MAKS_PERCOBAAN:
+        email.status = 'pending'
+        jeda = settings.EMAIL_RETRY_DETIK * (2 ** (email.percobaan - 1))
+        email.jadwal_kirim = datetime.datetime.now() + datetime.timedelta(seconds=jeda)
+    else:
+        email.status = 'failed'
+    email.save(update_fields=['status', 'percobaan', 'pesan_error', 'jadwal_kirim', 'updated_at'])
+
+def tandai_terkirim(email):
+    email.status = 'sent'
+    email.pesan_error = None
+    email.terkirim_at = datetime.datetime.now()
+    email.save(update_fields=['status', 'pesan_error', 'terkirim_at', 'updated_at'])
+
+class PengirimEmail:
+    """
+    Kirim antrean lewat SATU koneksi SMTP yang dipakai ulang antar email
+    (bukan thread + koneksi TLS baru per email), dengan batas kirim per menit.
+    """
+    def __init__(self, per_menit=None, sleep=time.sleep):
+        per_menit = settings.EMAIL_RATE_PER_MENIT if per_menit is None else per_menit
+        self.jeda = 60.0 / per_menit if per_menit else 0
+        self.sleep = sleep
+        self.connection = None
+        self.kirim_terakhir = None
+
+    def buka(self):
+        if self.connection is None:
+            self.connection = get_connection()
+            self.connection.open()
+        return self.connection
+
+    def tutup(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass  # Koneksi memang sudah putus
+            self.connection = None
+
+    def tunggu_rate_limit(self):
+        if self.jeda and self.kirim_terakhir is not None:
+            sisa = self.jeda - (time.monotonic() - self.kirim_terakhir)
+            if sisa > 0:
+                self.sleep(sisa)
+        self.kirim_terakhir = time.monotonic()
+
+    def kirim_batch(self, jumlah):
+        """
+        Kirim satu batch. Return jumlah email yang diproses (terkirim + gagal).
+        """
+        emails = ambil_email(jumlah)
+        for email in emails:
+            self.tunggu_rate_limit()
+            try:
+                connection = self.buka()
+                # Satu email per panggilan agar status per email akurat; koneksi tetap sama
+                if not connection.send_messages([buat_pesan(email, connection)]):
+                    raise smtplib.SMTPException('Email tidak diterima server SMTP.')
+            except ERROR_KONEKSI as e:
+                self.tutup()
+                tandai_gagal(email, e)
+            except Exception as e:
+                tandai_gagal(email, e)
+            else:
+                tandai_terkirim(email)
+        return len(emails)
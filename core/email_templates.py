@@ -0,0 +1,119 @@
+import functools
+import os
+import re
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.template.loaders import app_directories
+
+from .utils import kirim_notifikasi_email
+
+# ==========================================
+# REGISTRY TEMPLATE EMAIL
+# ==========================================
+# nama -> subjek (format string, diisi dari context).
+# Template HTML: core/templates/core/email/<nama>.html
+
+EMAIL_TEMPLATES = {
+    'selamat_datang': 'Selamat Datang di BiroJasaApp!',
+    'perbaikan_dokumen': 'Perbaikan Dokumen: {permohonan.kode_permohonan}',
+    'tagihan_terbit': 'Tagihan Terbit: {permohonan.kode_permohonan}',
+    'pembayaran_lunas': 'LUNAS: Pembayaran {permohonan.kode_permohonan} Berhasil',
+    'pembayaran_tunai': 'Menunggu Pembayaran Tunai: {permohonan.kode_permohonan}',
+    'konfirmasi_bayar': 'KONFIRMASI BAYAR: {permohonan.kode_permohonan}',
+    'dokumen_dikirim': '📦 DOKUMEN DIKIRIM: {permohonan.kode_permohonan}',
+    'siap_diambil': '✅ SIAP DIAMBIL: {permohonan.kode_permohonan}',
+    'permohonan_ditolak': 'PENTING: Permohonan Ditolak ({permohonan.kode_permohonan})',
+    'update_status': 'Update Status: {permohonan.kode_permohonan}',
+}
+
+def template_email(nama):
+    return f'core/email/{nama}.html'
+
+def render_email(nama, context):
+    """
+    Render email dari registry. Return (subjek, pesan_html).
+    """
+    context = {'site_url': settings.SITE_URL, **context}
+    subjek = EMAIL_TEMPLATES[nama].format(**context)
+    return subjek, get_template(template_email(nama)).render(context)
+
+def kirim_email_template(nama, email_tujuan, context, pdf_data=None, pdf_name="dokumen.pdf"):
+    """
+    Render template email lalu masukkan ke antrean (text/plain dibuat otomatis).
+    """
+    subjek, pesan_html = render_email(nama, context)
+    return kirim_notifikasi_email(subjek, pesan_html, email_tujuan, pdf_data, pdf_name)
+
+def muat_template_email():
+    """
+    Dipanggil sekali dari CoreConfig.ready(): compile + inline CSS semua
+    template email sekarang, supaya email pertama tidak menanggungnya.
+    """
+    for nama in EMAIL_TEMPLATES:
+        get_template(template_email(nama))
+
+# ==========================================
+# CSS INLINING (SAAT TEMPLATE DI-LOAD)
+# ==========================================
+
+CSS_EMAIL = os.path.join(os.path.dirname(__file__), 'templates', 'core', 'email', 'email.css')
+
+RE_CSS_RULE = re.compile(r'([^{}]+)\{([^}]*)\}')
+RE_TAG = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>')
+RE_CLASS = re.compile(r'\sclass="([^"]*)"')
+RE_STYLE = re.compile(r'\sstyle="([^"]*)"')
+
+@functools.lru_cache(maxsize=None)
+def baca_css_email():
+    """
+    Parse email.css -> list (nama_class, deklarasi) sesuai urutan di file.
+    Hanya selector .class sederhana (boleh dipisah koma).
+    """
+    with open(CSS_EMAIL, encoding='utf-8') as f:
+        css = re.sub(r'/\*.*?\*/', '', f.read(), flags=re.S)
+
+    rules = []
+    for selectors, deklarasi in RE_CSS_RULE.findall(css):
+        deklarasi = ' '.join(deklarasi.split()).strip().rstrip(';')
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            if re.fullmatch(r'\.[\w-]+', selector):
+                rules.append((selector[1:], deklarasi))
+    return rules
+
+def inline_css(source, rules):
+    """
+    Ganti class="..." dengan style="..." pada setiap tag HTML.
+    Urutan mengikuti urutan aturan di CSS (cascade), style bawaan tag tetap paling kuat.
+    """
+    def ganti(match):
+        tag, attrs, tutup = match.group(1), match.group(2) or '', match.group(3)
+        kelas = RE_CLASS.search(attrs)
+        if not kelas:
+            return match.group(0)
+
+        nama_class = kelas.group(1).split()
+        gaya = [deklarasi for nama, deklarasi in rules if nama in nama_class]
+        style_lama = RE_STYLE.search(attrs)
+        if style_lama:
+            gaya.append(style_lama.group(1).strip().rstrip(';'))
+            attrs = RE_STYLE.sub('', attrs)
+        attrs = RE_CLASS.sub('', attrs)
+        if gaya:
+            attrs = f' style="{"; ".join(gaya)};"' + attrs
+        return f'<{tag}{attrs}{tutup}>'
+
+    return RE_TAG.sub(ganti, source)
+
+class EmailCssLoader(app_directories.Loader):
+    """
+    Loader app_directories + inline CSS untuk template core/email/*.html.
+    Dipasang di dalam cached.Loader (settings.TEMPLATES), sehingga inlining
+    hanya terjadi sekali per template per proses.
+    """
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        if origin.template_name.startswith('core/email/') and origin.template_name.endswith('.html'):
+            contents = inline_css(contents, baca_css_email())
+        return contents
@@ -0,0 +1,168 @@
+import csv
+import datetime
+import hashlib
+import io
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db import IntegrityError, transaction
+
+from .antrean import klaim
+from .models import ExportJob
+from .laporan import (
+    TEMPLATE_LAPORAN_GABUNGAN, HEADER_LAPORAN_KEUANGAN, laporan_keuangan_qs, baris_laporan_keuangan,
+    kunci_laporan_gabungan, konteks_pdf_laporan_gabungan
+)
+from .pdf_cache import ambil_pdf, simpan_pdf
+from .utils import render_to_pdf
+
+try: import openpyxl
+except ImportError: openpyxl = None
+
+# Baris per query + jeda update progres
+EXPORT_CHUNK_SIZE = 2000
+
+SALT_LINK = 'core.export_jobs.link'
+
+# ==========================================
+# DIPANGGIL DARI VIEWS
+# ==========================================
+
+def kunci_export(laporan, format, start_date, end_date, karyawan):
+    bagian = [laporan, format, start_date, end_date]
+    if format == 'pdf':
+        bagian.append(karyawan.id if karyawan else None)  # PDF mencantumkan nama pencetak
+    return hashlib.sha256('|'.join(str(b) for b in bagian).encode()).hexdigest()
+
+def antrekan_export(laporan, format, periode, start_date, end_date, karyawan):
+    """
+    Simpan permintaan export. Return (job, baru).
+    Permintaan identik yang masih pending/processing -> job yang sudah ada (baru=False).
+    """
+    if format not in ExportJob.FORMAT_LAPORAN.get(laporan, ()):
+        raise ValueError(f"Format '{format}' tidak tersedia untuk laporan '{laporan}'.")
+
+    kunci = kunci_export(laporan, format, start_date, end_date, karyawan)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                job = ExportJob.objects.create(
+                    laporan=laporan, format=format, periode=periode, start_date=start_date,
+                    end_date=end_date, diminta_oleh=karyawan, kunci_aktif=kunci
+                )
+            return job, True
+        except IntegrityError:
+            job = ExportJob.objects.filter(kunci_aktif=kunci).first()
+            if job:
+                return job, False
+            # Job lama selesai di antara INSERT dan SELECT -> coba INSERT lagi
+    raise RuntimeError('Gagal membuat export, silakan coba lagi.')
+
+def buat_link_token(job):
+    return signing.dumps(job.pk, salt=SALT_LINK)
+
+def baca_link_token(token):
+    """
+    Return id job dari token link unduhan.
+    Raise signing.BadSignature (termasuk SignatureExpired) jika token tidak valid / kedaluwarsa.
+    """
+    return signing.loads(token, salt=SALT_LINK, max_age=settings.EXPORT_LINK_DETIK)
+
+# ==========================================
+# DIPANGGIL DARI WORKER (manage.py export_worker)
+# ==========================================
+
+def ambil_export():
+    """
+    Klaim satu job pending; 5 kandidat agar job yang keduluan worker lain dilewati.
+    """
+    jobs = klaim(ExportJob, 1, kandidat=5, select_related=('diminta_oleh',))
+    return jobs[0] if jobs else None
+
+def set_progres(job, persen):
+    # updated_at ikut diperbarui sebagai tanda worker masih hidup (lihat antrean.reset_macet)
+    job.progres = min(int(persen), 99)
+    ExportJob.objects.filter(pk=job.pk).update(progres=job.progres, updated_at=datetime.datetime.now())
+
+def baris_dengan_progres(job, laporan):
+    total = laporan.count() or 1
+    for i, row in enumerate(baris_laporan_keuangan(laporan, chunk_size=EXPORT_CHUNK_SIZE), 1):
+        if i % EXPORT_CHUNK_SIZE == 0:
+            set_progres(job, i * 100 / total)
+        yield row
+
+def tulis_keuangan_csv(job, f):
+    teks = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    writer = csv.writer(teks)
+    writer.writerow(HEADER_LAPORAN_KEUANGAN)
+    writer.writerows(baris_dengan_progres(job, laporan_keuangan_qs(job.start_date, job.end_date)))
+    teks.flush()
+    teks.detach()
+
+def tulis_keuangan_xlsx(job, f):
+    if openpyxl is None:
+        raise RuntimeError('Library openpyxl belum terinstall, export XLSX tidak tersedia.')
+    # write_only: baris langsung di-stream ke file, memori tetap
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Laporan Keuangan')
+    sheet.append(HEADER_LAPORAN_KEUANGAN)
+    for row in baris_dengan_progres(job, laporan_keuangan_qs(job.start_date, job.end_date)):
+        sheet.append(row)
+    workbook.save(f)
+
+def tulis_gabungan_pdf(job, f):
+    karyawan = job.diminta_oleh
+    kunci, _ = kunci_laporan_gabungan(karyawan, job.periode, job.start_date, job.end_date)
+    pdf = ambil_pdf(kunci)
+    if pdf is None:
+        context = konteks_pdf_laporan_gabungan(karyawan, job.periode, job.start_date, job.end_date)
+        set_progres(job, 30)
+        pdf = render_to_pdf(TEMPLATE_LAPORAN_GABUNGAN, context)
+        if not pdf:
+            raise RuntimeError('Render PDF gagal.')
+        simpan_pdf(kunci, pdf)
+    f.write(pdf)
+
+PEMBUAT_EXPORT = {
+    ('keuangan', 'csv'): tulis_keuangan_csv,
+    ('keuangan', 'xlsx'): tulis_keuangan_xlsx,
+    ('gabungan', 'pdf'): tulis_gabungan_pdf,
+}
+
+def proses_export(job):
+    """
+    Tulis file ke temporary file lalu simpan ke storage (MEDIA_ROOT/exports/).
+    """
+    try:
+        with tempfile.TemporaryFile() as f:
+            PEMBUAT_EXPORT[(job.laporan, job.format)](job, f)
+            f.seek(0)
+            job.file.save(f"{uuid.uuid4().hex}.{job.format}", File(f), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.pesan_error = str(e)
+    else:
+        job.status = 'done'
+        job.progres = 100
+        job.pesan_error = None
+        job.kedaluwarsa_at = datetime.datetime.now() + datetime.timedelta(hours=settings.EXPORT_SIMPAN_JAM)
+    job.kunci_aktif = None  # Permintaan identik berikutnya membuat job baru
+    job.save(update_fields=['status', 'progres', 'pesan_error', 'file', 'kedaluwarsa_at', 'kunci_aktif', 'updated_at'])
+    return job
+
+def hapus_export_kedaluwarsa():
+    """
+    Hapus file export yang sudah lewat masa simpan. Return jumlah job yang kedaluwarsa.
+    """
+    jobs = ExportJob.objects.filter(status='done', kedaluwarsa_at__lt=datetime.datetime.now())
+    jumlah = 0
+    for job in jobs:
+        if job.file:
+            job.file.delete(save=False)
+        job.status = 'expired'
+        job.save(update_fields=['status', 'file', 'updated_at'])
+        jumlah += 1
+    return jumlah
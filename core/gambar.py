@@ -0,0 +1,161 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from .antrean import klaim
+from .models import GambarJob, Dokumen, Permohonan, Pembayaran
+
+EKSTENSI_GAMBAR = ('jpg', 'jpeg', 'png', 'webp', 'bmp', 'gif')
+
+# sumber -> (model, field file)
+SUMBER_GAMBAR = {
+    'dokumen': (Dokumen, 'path_file'),
+    'hasil_lapangan': (Permohonan, 'hasil_lapangan'),
+    'bukti_bayar': (Pembayaran, 'bukti_pembayaran'),
+}
+
+EKSTENSI_FORMAT = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+def is_gambar(nama):
+    return bool(nama) and os.path.splitext(nama)[1].lower().lstrip('.') in EKSTENSI_GAMBAR
+
+def format_simpan():
+    """
+    Return (format Pillow, ekstensi). WEBP turun ke JPEG jika Pillow dibuild tanpa libwebp.
+    """
+    fmt = settings.GAMBAR_FORMAT.upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        fmt = 'JPEG'
+    return fmt, EKSTENSI_FORMAT[fmt]
+
+def path_thumbnail(nama):
+    """
+    Thumbnail disimpan di thumbnail/<path file tanpa ekstensi>.<ekstensi format>,
+    jadi template bisa menemukannya dari nama file saja (tanpa query).
+    """
+    return f"thumbnail/{os.path.splitext(nama)[0]}.{format_simpan()[1]}"
+
+# ==========================================
+# DIPANGGIL DARI VIEWS
+# ==========================================
+
+def antrekan_gambar(sumber, *files):
+    """
+    Masukkan file gambar yang baru diupload ke antrean (PDF dilewati).
+    Panggil setelah file tersimpan, di transaksi yang sama dengan barisnya.
+    """
+    jobs = [GambarJob(sumber=sumber, path_asli=f.name) for f in files if f and is_gambar(f.name)]
+    if jobs:
+        GambarJob.objects.bulk_create(jobs, ignore_conflicts=True)
+        # Dokumen dedup: file yang sama bisa diupload lagi setelah blob lamanya
+        # dinormalisasi & dihapus -> job 'done' dengan path yang sama diulang
+        GambarJob.objects.filter(
+            sumber=sumber, path_asli__in=[job.path_asli for job in jobs], status='done'
+        ).update(status='pending', path_hasil=None)
+
+# ==========================================
+# DIPANGGIL DARI WORKER (manage.py gambar_worker)
+# ==========================================
+
+def ke_rgb(img):
+    # Transparansi (PNG screenshot) diratakan ke latar putih
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        latar = Image.new('RGB', img.size, (255, 255, 255))
+        latar.paste(img, mask=img.getchannel('A'))
+        return latar
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+def encode(img, fmt):
+    # Tanpa argumen exif= -> metadata EXIF (lokasi GPS, model HP) tidak ikut tersimpan
+    buf = io.BytesIO()
+    img.save(buf, fmt, quality=settings.GAMBAR_KUALITAS)
+    return ContentFile(buf.getvalue())
+
+def buka_gambar(storage, path):
+    maks = settings.GAMBAR_MAKS_PX
+    with storage.open(path, 'rb') as f:
+        img = Image.open(f)
+        # JPEG: decode langsung di skala 1/2, 1/4, 1/8 (jauh lebih cepat untuk foto HP)
+        img.draft('RGB', (maks, maks))
+        # Putar sesuai orientasi EXIF sebelum EXIF-nya dibuang
+        img = ke_rgb(ImageOps.exif_transpose(img))
+    img.thumbnail((maks, maks), Image.LANCZOS)
+    return img
+
+def normalisasi(job):
+    """
+    Simpan versi ternormalisasi + thumbnail, lalu arahkan field pemilik ke file baru.
+    Return path file hasil.
+    """
+    fmt, ext = format_simpan()
+    model, field = SUMBER_GAMBAR[job.sumber]
+    # Storage milik field (Dokumen -> DedupStorage, hasil disimpan sebagai blob baru)
+    storage = model._meta.get_field(field).storage
+    img = buka_gambar(storage, job.path_asli)
+
+    hasil = encode(img, fmt)
+    thumbnail = encode(ImageOps.pad(img, settings.GAMBAR_THUMBNAIL_PX, color=(255, 255, 255)), fmt)
+
+    # Simpan blob + UPDATE dalam satu transaksi (aturan DedupStorage.save)
+    with transaction.atomic():
+        path_hasil = storage.save(f"{os.path.splitext(job.path_asli)[0]}.{ext}", hasil)
+        path_thumb = path_thumbnail(path_hasil)
+        default_storage.delete(path_thumb)
+        default_storage.save(path_thumb, thumbnail)
+        # UPDATE bersyarat: jika file diganti user selama diproses, hasil dibuang
+        dipindah = model.objects.filter(**{field: job.path_asli}).update(**{field: path_hasil})
+
+    if dipindah:
+        storage.delete(job.path_asli)
+        if hasattr(storage, 'hitung_ulang'):
+            # Semua Dokumen yang berbagi blob asli pindah sekaligus -> referensi dihitung ulang
+            storage.hitung_ulang(path_hasil)
+    else:
+        storage.delete(path_hasil)
+        if not storage.exists(path_hasil):  # Blob hasil bisa dipakai Dokumen lain
+            default_storage.delete(path_thumb)
+    return path_hasil
+
+def proses_antrean_gambar(jumlah):
+    """
+    Satu putaran worker. Return jumlah job yang diproses.
+    """
+    jobs = klaim(GambarJob, jumlah)
+    for job in jobs:
+        try:
+            job.path_hasil = normalisasi(job)
+        except Exception as e:
+            job.status = 'failed'
+            job.pesan_error = str(e)
+        else:
+            job.status = 'done'
+            job.pesan_error = None
+        job.save(update_fields=['status', 'path_hasil', 'pesan_error', 'updated_at'])
+    return len(jobs)
+
+def antrekan_gambar_lama():
+    """
+    Antrekan gambar yang diupload sebelum pipeline ini ada. Return jumlah job baru.
+    """
+    sudah = GambarJob.objects.filter(path_hasil__isnull=False).values('path_hasil')
+    jumlah = GambarJob.objects.count()
+    for sumber, (model, field) in SUMBER_GAMBAR.items():
+        nama_file = (
+            model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            .exclude(**{f'{field}__in': sudah}).values_list(field, flat=True).iterator()
+        )
+        batch = []
+        for nama in nama_file:
+            if is_gambar(nama):
+                batch.append(GambarJob(sumber=sumber, path_asli=nama))
+            if len(batch) >= 1000:
+                GambarJob.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        GambarJob.objects.bulk_create(batch, ignore_conflicts=True)
+    return GambarJob.objects.count() - jumlah
@@ -0,0 +1,198 @@
+import datetime
+import os
+import re
+import shutil
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Dokumen, Permohonan, Pembayaran, ExportJob, BlobFile
+from .gambar import is_gambar, path_thumbnail
+from .storage import FOLDER_BLOB, hitung_pemakai
+
+# ==========================================
+# GARBAGE COLLECTOR FILE MEDIA (manage.py bersihkan_media)
+# ==========================================
+# File yang tidak lagi dirujuk database (dokumen revisi yang diganti, foto hasil
+# lapangan yang ditimpa, sisa cascade delete) dipindah ke MEDIA_KARANTINA_DIR,
+# bukan langsung dihapus. MEDIA_ROOT dibaca per direktori dengan os.scandir dan
+# path yang dirujuk hanya dimuat untuk direktori itu saja (bukan subfoldernya):
+# satu folder shard blob/ab/cd/ atau dokumen_upload/ab/cd/, jadi memori sebesar isi
+# satu direktori, bukan seluruh blob/ atau MEDIA_ROOT.
+
+# (model, field) yang menyimpan path file relatif terhadap MEDIA_ROOT
+FILE_TERPAKAI = [
+    (Dokumen, 'path_file'),
+    (Permohonan, 'hasil_lapangan'),
+    (Pembayaran, 'bukti_pembayaran'),
+    (ExportJob, 'file'),
+]
+
+FOLDER_THUMBNAIL = 'thumbnail'
+FOLDER_DILEWATI = ('pdf_cache',)  # Dikelola LRU di core/pdf_cache.py
+UKURAN_CHUNK = 2000
+
+def path_terpakai(folder):
+    """
+    Set path yang dirujuk database langsung di dalam direktori `folder/`
+    (tanpa subfolder). Index path memakai awalan (startswith), regex hanya
+    menyaring baris milik subfolder. Thumbnail dirujuk lewat gambar pemiliknya
+    (thumbnail/<nama tanpa ekstensi>.<format>).
+    """
+    thumbnail = folder.split('/')[0] == FOLDER_THUMBNAIL
+    folder_pemilik = folder[len(FOLDER_THUMBNAIL) + 1:] if thumbnail else folder
+    awalan = f'{folder_pemilik}/' if folder_pemilik else ''
+    terpakai = set()
+    for model, field in FILE_TERPAKAI:
+        nama_file = model.objects.filter(**{
+            f'{field}__startswith': awalan,
+            f'{field}__regex': rf'^{re.escape(awalan)}[^/]+$',
+        })
+        for nama in nama_file.values_list(field, flat=True).iterator(chunk_size=UKURAN_CHUNK):
+            if not thumbnail:
+                terpakai.add(nama)
+            elif is_gambar(nama):
+                terpakai.add(path_thumbnail(nama))
+    return terpakai
+
+def scan_direktori(root, folder):
+    """
+    Generator (direktori relatif, [(path relatif, os.DirEntry)]) untuk setiap
+    direktori di bawah `folder`: yang ditahan di memori hanya isi satu direktori.
+    """
+    antrean = [folder]
+    while antrean:
+        relatif = antrean.pop()
+        files = []
+        with os.scandir(os.path.join(root, relatif)) as isi:
+            for entry in isi:
+                nama = f'{relatif}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    antrean.append(nama)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append((nama, entry))
+        yield relatif, files
+
+def cari_yatim(root, folder, batas_mtime):
+    """
+    Generator (path, ukuran) file di `folder` yang tidak dirujuk database dan
+    lebih tua dari batas_mtime (termasuk blob/*.tmp sisa upload yang terputus).
+    """
+    for direktori, files in scan_direktori(root, folder):
+        if not files:
+            continue
+        terpakai = path_terpakai(direktori)
+        for nama, entry in files:
+            if nama in terpakai:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime <= batas_mtime:
+                yield nama, stat.st_size
+
+def per_batch(items, ukuran):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= ukuran:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def masih_dipakai(batch):
+    """
+    Cek ulang kandidat ke database tepat sebelum dipindah: baris bisa saja
+    dibuat setelah set path dimuat.
+    """
+    dipakai = set()
+    for model, field in FILE_TERPAKAI:
+        dipakai.update(model.objects.filter(**{f'{field}__in': batch}).values_list(field, flat=True))
+    return dipakai
+
+def pindah_ke_karantina(nama, folder_karantina):
+    tujuan = os.path.join(folder_karantina, nama)
+    os.makedirs(os.path.dirname(tujuan), exist_ok=True)
+    shutil.move(os.path.join(settings.MEDIA_ROOT, nama), tujuan)
+
+def karantina_blob(nama, folder_karantina):
+    """
+    Blob dedup dipindah dengan protokol lock yang sama seperti DedupStorage:
+    baris BlobFile dikunci, pemakai dihitung ulang, baru file dipindah.
+    """
+    with transaction.atomic():
+        blob = BlobFile.objects.select_for_update().filter(nama=nama).first()
+        if hitung_pemakai(nama):
+            return False
+        pindah_ke_karantina(nama, folder_karantina)
+        if blob:
+            blob.delete()
+    return True
+
+def karantina_batch(batch, folder_karantina):
+    """
+    Return (jumlah file, jumlah byte) yang dipindah dari batch (nama, ukuran).
+    """
+    dipakai = masih_dipakai([nama for nama, _ in batch])
+    jumlah = total = 0
+    for nama, ukuran in batch:
+        if nama in dipakai:
+            continue
+        try:
+            if nama.startswith(f'{FOLDER_BLOB}/'):
+                if not karantina_blob(nama, folder_karantina):
+                    continue
+            else:
+                pindah_ke_karantina(nama, folder_karantina)
+        except FileNotFoundError:
+            continue  # Sudah dihapus proses lain
+        jumlah += 1
+        total += ukuran
+    return jumlah, total
+
+def bersihkan_media(min_jam=None, batch=500, coba=False):
+    """
+    Pindahkan file yatim ke MEDIA_KARANTINA_DIR/<tanggal>/<path asli>.
+    `coba=True` hanya menghitung. Return dict folder -> (jumlah file, jumlah byte).
+    """
+    min_jam = settings.MEDIA_YATIM_MIN_JAM if min_jam is None else min_jam
+    batas_mtime = time.time() - min_jam * 3600
+    folder_karantina = os.path.join(settings.MEDIA_KARANTINA_DIR, datetime.date.today().strftime('%Y%m%d'))
+    root = settings.MEDIA_ROOT
+    hasil = {}
+    if not os.path.isdir(root):
+        return hasil
+
+    with os.scandir(root) as isi:
+        folder_teratas = sorted(entry.name for entry in isi if entry.is_dir(follow_symlinks=False))
+
+    for folder in folder_teratas:
+        if folder in FOLDER_DILEWATI:
+            continue
+        jumlah = total = 0
+        for kandidat in per_batch(cari_yatim(root, folder, batas_mtime), batch):
+            if coba:
+                dipindah, ukuran = len(kandidat), sum(ukuran for _, ukuran in kandidat)
+            else:
+                dipindah, ukuran = karantina_batch(kandidat, folder_karantina)
+            jumlah += dipindah
+            total += ukuran
+        if jumlah:
+            hasil[folder] = (jumlah, total)
+    return hasil
+
+def hapus_karantina_lama(hari=None):
+    """
+    Hapus permanen folder karantina yang lebih lama dari `hari`. Return jumlah folder.
+    """
+    hari = settings.MEDIA_KARANTINA_HARI if hari is None else hari
+    batas = (datetime.date.today() - datetime.timedelta(days=hari)).strftime('%Y%m%d')
+    if not os.path.isdir(settings.MEDIA_KARANTINA_DIR):
+        return 0
+    jumlah = 0
+    with os.scandir(settings.MEDIA_KARANTINA_DIR) as isi:
+        for entry in isi:
+            if entry.is_dir() and entry.name.isdigit() and entry.name < batas:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                jumlah += 1
+    return jumlah
@@ -0,0 +1,95 @@
+import datetime
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import KodeCounter, Permohonan, Karyawan, Layanan
+
+# ==========================================
+# GENERATOR KODE (HI/LO)
+# ==========================================
+# Nomor diambil per blok dari tabel KodeCounter: satu UPDATE nilai = nilai + blok
+# (row lock singkat) membagikan `blok` nomor sekaligus ke proses ini, nomor
+# berikutnya diambil dari memori tanpa query. Dua proses tidak pernah mendapat
+# blok yang sama, jadi kode tidak bisa bentrok. Konsekuensinya nomor bisa
+# melompat (sisa blok hilang saat proses restart) dan tidak urut antar proses.
+
+# prefix -> (model, field kode, nomor reset tiap hari, digit minimal, ukuran blok)
+URUTAN_KODE = {
+    'PMH': (Permohonan, 'kode_permohonan', True, 4, 20),
+    'KRY': (Karyawan, 'kode_karyawan', False, 3, 1),  # Jarang dibuat -> blok 1, tanpa lompatan
+    'LAY': (Layanan, 'kode_layanan', False, 3, 1),
+}
+
+def nomor_terakhir_lama(model, field, prefix):
+    """
+    Nomor terbesar yang sudah terpakai dengan format lama (KRY-5, KRY-001,
+    PMH-20250102-143015). Hanya dipanggil sekali saat baris counter dibuat.
+    """
+    terbesar = 0
+    for kode in model.objects.filter(**{f'{field}__startswith': f'{prefix}-'}).values_list(field, flat=True).iterator():
+        sisa = kode[len(prefix) + 1:]
+        if sisa.isdigit():
+            terbesar = max(terbesar, int(sisa))
+    return terbesar
+
+def ambil_blok(prefix, ukuran, model, field):
+    """
+    Reservasi `ukuran` nomor untuk prefix. Return (nomor_awal, nomor_akhir).
+    """
+    with transaction.atomic():
+        if not KodeCounter.objects.filter(prefix=prefix).update(nilai=F('nilai') + ukuran):
+            try:
+                with transaction.atomic():
+                    KodeCounter.objects.create(prefix=prefix, nilai=nomor_terakhir_lama(model, field, prefix) + ukuran)
+            except IntegrityError:
+                # Baris dibuat proses lain di antara UPDATE dan INSERT
+                KodeCounter.objects.filter(prefix=prefix).update(nilai=F('nilai') + ukuran)
+        # Dibaca di transaksi yang sama dengan UPDATE -> masih memegang lock baris
+        akhir = KodeCounter.objects.filter(prefix=prefix).values_list('nilai', flat=True).get()
+    return akhir - ukuran + 1, akhir
+
+class GeneratorKode:
+    """
+    Cache blok per proses. Satu instance = satu proses worker (lihat `generator`).
+    """
+    def __init__(self):
+        self.blok = {}  # prefix -> [nomor berikut, nomor akhir]
+        self.lock = threading.Lock()
+
+    def simpan_blok(self, prefix, awal, akhir):
+        with self.lock:
+            self.blok[prefix] = [awal, akhir]
+
+    def nomor_berikut(self, prefix):
+        with self.lock:
+            blok = self.blok.get(prefix)
+            if blok and blok[0] <= blok[1]:
+                nomor = blok[0]
+                blok[0] += 1
+                return nomor
+        return None
+
+    def buat_kode(self, jenis, tanggal=None):
+        model, field, harian, digit, ukuran = URUTAN_KODE[jenis]
+        prefix = f"{jenis}-{(tanggal or datetime.date.today()).strftime('%Y%m%d')}" if harian else jenis
+
+        nomor = self.nomor_berikut(prefix)
+        if nomor is None:
+            awal, akhir = ambil_blok(prefix, ukuran, model, field)
+            nomor = awal
+            if awal < akhir:
+                # Sisa blok baru dipakai ulang setelah transaksi commit: jika
+                # transaksi pemanggil rollback, reservasi ikut batal dan nomornya
+                # bisa dibagikan lagi ke proses lain.
+                transaction.on_commit(lambda: self.simpan_blok(prefix, awal + 1, akhir))
+        return f"{prefix}-{nomor:0{digit}d}"
+
+generator = GeneratorKode()
+
+def buat_kode(jenis, tanggal=None):
+    """
+    Kode unik berikutnya, contoh: buat_kode('PMH') -> 'PMH-20250102-0001', buat_kode('KRY') -> 'KRY-005'.
+    """
+    return generator.buat_kode(jenis, tanggal)
@@ -0,0 +1,156 @@
+import datetime
+
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Permohonan, Pembayaran, DailyStats, DailyPendapatan
+from .pdf_cache import kunci_pdf
+from .utils import iter_keyset
+
+# ==========================================
+# LAPORAN KEUANGAN (PEMBAYARAN LUNAS)
+# ==========================================
+# Dipakai export CSV streaming (laporan_keuangan_view) dan export background (export_worker).
+
+HEADER_LAPORAN_KEUANGAN = ['No Invoice', 'Tanggal', 'Pelanggan', 'Total']
+
+def laporan_keuangan_qs(start_date=None, end_date=None):
+    laporan = Pembayaran.objects.filter(status_pembayaran='paid').order_by('-updated_at')
+    if start_date and end_date:
+        laporan = laporan.filter(updated_at__date__range=[start_date, end_date])
+    return laporan
+
+def baris_laporan_keuangan(laporan, chunk_size=2000):
+    """
+    Baris CSV/XLSX per pembayaran, dibaca per chunk (memori tetap, nama pelanggan lewat JOIN).
+    """
+    rows = iter_keyset(laporan, 'nomor_invoice', 'permohonan__pelanggan__nama', 'total_biaya', chunk_size=chunk_size)
+    for updated_at, _, nomor_invoice, nama_pelanggan, total_biaya in rows:
+        yield [nomor_invoice, updated_at.strftime("%d-%m-%Y"), nama_pelanggan, total_biaya]
+
+# ==========================================
+# LAPORAN GABUNGAN (OPERASIONAL + KEUANGAN)
+# ==========================================
+# Dipakai bersama oleh preview HTML dan cetak PDF (?print) di
+# cetak_laporan_gabungan_view, agar keduanya menghitung hal yang sama.
+
+TEMPLATE_LAPORAN_GABUNGAN = 'core/pdf/laporan_gabungan_pdf.html'
+
+def periode_laporan(periode, custom_start=None, custom_end=None, today=None):
+    """
+    Return (start_date, end_date, label_periode). Periode tidak dikenal atau custom
+    tanpa tanggal -> bulan ini, tanggal 1 s/d akhir bulan (sama dengan 'bulanan';
+    dulu default ini berakhir hari ini tapi label periodenya tidak terisi).
+    Raise ValueError jika tanggal custom tidak valid atau awal setelah akhir.
+    """
+    today = today or datetime.date.today()
+    awal_bulan = today.replace(day=1)
+    akhir_bulan = (awal_bulan + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+
+    if periode == 'harian':
+        return today, today, today.strftime('%d %B %Y')
+    if periode == 'mingguan':
+        start_date = today - datetime.timedelta(days=today.weekday())  # Senin minggu ini
+        end_date = start_date + datetime.timedelta(days=6)  # Minggu
+        return start_date, end_date, f"{start_date.strftime('%d %b')} - {end_date.strftime('%d %b %Y')}"
+    if periode == 'tahunan':
+        return today.replace(month=1, day=1), today.replace(month=12, day=31), f'Tahun {today.year}'
+    if periode == 'custom' and custom_start and custom_end:
+        start_date = datetime.datetime.strptime(custom_start, '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(custom_end, '%Y-%m-%d').date()
+        if start_date > end_date:
+            raise ValueError('Tanggal awal setelah tanggal akhir')
+        return start_date, end_date, f"{start_date.strftime('%d %b %Y')} - {end_date.strftime('%d %b %Y')}"
+    return awal_bulan, akhir_bulan, today.strftime('%B %Y')
+
+def versi_laporan_gabungan(start_date, end_date):
+    """
+    Penanda versi data periode (jumlah + updated_at terakhir) untuk kunci cache PDF.
+    """
+    versi_permohonan = Permohonan.objects.filter(created_at__date__range=[start_date, end_date]).aggregate(
+        jumlah=Count('id'), terakhir=Max('updated_at'),
+        pelanggan=Max('pelanggan__updated_at'), layanan=Max('layanan__updated_at')
+    )
+    versi_pembayaran = Pembayaran.objects.filter(status_pembayaran='paid', updated_at__date__range=[start_date, end_date]).aggregate(
+        jumlah=Count('id'), terakhir=Max('updated_at'), pelanggan=Max('permohonan__pelanggan__updated_at')
+    )
+    return [*versi_permohonan.values(), *versi_pembayaran.values()]
+
+def kunci_laporan_gabungan(karyawan, label_periode, start_date, end_date):
+    """
+    Return (kunci cache PDF, last_modified). Dipakai view (?print) dan export_worker,
+    sehingga keduanya berbagi file di cache PDF.
+    """
+    versi = versi_laporan_gabungan(start_date, end_date)
+    kunci = kunci_pdf(
+        TEMPLATE_LAPORAN_GABUNGAN, label_periode, start_date, end_date, karyawan.id, karyawan.updated_at, *versi
+    )
+    last_modified = max(
+        [v for v in (*versi, karyawan.updated_at) if isinstance(v, datetime.datetime)],
+        default=None
+    )
+    return kunci, last_modified
+
+def konteks_laporan_gabungan(start_date, end_date, dengan_daftar=False):
+    """
+    Statistik periode dari rollup harian dalam 3 query: agregat bersyarat
+    permohonan, breakdown per layanan, breakdown per metode (total keuangan
+    dijumlah dari breakdown metode). dengan_daftar=True menambah daftar
+    transaksi untuk PDF (+2 query, relasi sudah di-select_related).
+    """
+    Status = Permohonan.Status
+    stats_permohonan = DailyStats.objects.filter(tanggal__range=[start_date, end_date])
+    stats_pendapatan = DailyPendapatan.objects.filter(tanggal__range=[start_date, end_date])
+
+    # === LAPORAN OPERASIONAL ===
+    operasional = stats_permohonan.aggregate(
+        total=Sum('jumlah_permohonan', default=0),
+        selesai=Sum('jumlah_permohonan', filter=Q(status_proses=Status.SELESAI), default=0),
+        ditolak=Sum('jumlah_permohonan', filter=Q(status_proses=Status.DITOLAK), default=0),
+    )
+
+    # Penting: order_by() kosong di awal me-reset sorting default agar GROUP BY valid
+    layanan_stats = list(stats_permohonan.order_by().values('layanan__nama_layanan').annotate(
+        jumlah_count=Sum('jumlah_permohonan')
+    ).filter(jumlah_count__gt=0).order_by('-jumlah_count'))
+
+    # === LAPORAN KEUANGAN ===
+    metode_stats = list(stats_pendapatan.order_by().values('metode_pembayaran').annotate(
+        jumlah_count=Sum('jumlah_transaksi'),
+        total_bayar=Sum('total_pemasukan')
+    ).filter(jumlah_count__gt=0).order_by('-total_bayar'))
+
+    context = {
+        'start_date': start_date,
+        'end_date': end_date,
+
+        # Operasional
+        'total_permohonan': operasional['total'],
+        'permohonan_selesai': operasional['selesai'],
+        'permohonan_diproses': operasional['total'] - operasional['selesai'] - operasional['ditolak'],
+        'permohonan_ditolak': operasional['ditolak'],
+        'layanan_stats': layanan_stats,
+
+        # Keuangan
+        'total_transaksi': sum(stat['jumlah_count'] for stat in metode_stats),
+        'total_pemasukan': sum(stat['total_bayar'] for stat in metode_stats),
+        'metode_stats': metode_stats,
+    }
+
+    if dengan_daftar:
+        context['permohonan_list'] = Permohonan.objects.filter(
+            created_at__date__range=[start_date, end_date]
+        ).select_related('pelanggan', 'layanan').order_by('-created_at')
+        context['pembayaran_list'] = Pembayaran.objects.filter(
+            status_pembayaran='paid',
+            updated_at__date__range=[start_date, end_date]
+        ).select_related('permohonan__pelanggan').order_by('-updated_at')
+    return context
+
+def konteks_pdf_laporan_gabungan(karyawan, label_periode, start_date, end_date):
+    context = konteks_laporan_gabungan(start_date, end_date, dengan_daftar=True)
+    context.update({
+        'karyawan': karyawan,
+        'periode': label_periode,
+        'generated_at': datetime.datetime.now(),
+    })
+    return context
@@ -0,0 +1,36 @@
+"""
+Pindahkan file media yang tidak dirujuk database ke folder karantina
+Jalankan berkala (cron) dengan: python manage.py bersihkan_media
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.gc_media import bersihkan_media, hapus_karantina_lama
+
+
+class Command(BaseCommand):
+    help = 'Karantina file media yatim (revisi lama, cascade delete) lalu hapus karantina yang sudah lama'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coba', action='store_true', help='Hanya hitung, tidak memindahkan file')
+        parser.add_argument('--min-jam', type=float, default=None, help='Umur minimal file yatim (default MEDIA_YATIM_MIN_JAM)')
+        parser.add_argument('--batch', type=int, default=500, help='Jumlah kandidat yang dicek ulang ke database sekaligus')
+        parser.add_argument('--hari-karantina', type=int, default=None, help='Hapus karantina lebih lama dari ini (default MEDIA_KARANTINA_HARI)')
+
+    def handle(self, *args, **options):
+        aksi = 'ditemukan' if options['coba'] else 'dikarantina'
+        self.stdout.write('🧹 Memeriksa file media yatim...')
+
+        hasil = bersihkan_media(min_jam=options['min_jam'], batch=options['batch'], coba=options['coba'])
+        for folder, (jumlah, ukuran) in hasil.items():
+            self.stdout.write(f'  📁 {folder}/: {jumlah} file ({filesizeformat(ukuran)})')
+
+        jumlah = sum(jumlah for jumlah, _ in hasil.values())
+        ukuran = sum(ukuran for _, ukuran in hasil.values())
+        self.stdout.write(self.style.SUCCESS(f'✅ {jumlah} file yatim {aksi} ({filesizeformat(ukuran)})'))
+        if not options['coba']:
+            self.stdout.write(f'  Karantina: {settings.MEDIA_KARANTINA_DIR}')
+            dihapus = hapus_karantina_lama(options['hari_karantina'])
+            if dihapus:
+                self.stdout.write(f'  🗑️  {dihapus} folder karantina lama dihapus permanen')
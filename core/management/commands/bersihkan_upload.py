@@ -0,0 +1,15 @@
+"""
+Hapus upload bertahap (chunked) yang tidak pernah dipakai form
+Jalankan berkala (cron) dengan: python manage.py bersihkan_upload
+"""
+from django.core.management.base import BaseCommand
+
+from core.uploads import hapus_upload_kedaluwarsa
+
+
+class Command(BaseCommand):
+    help = 'Hapus file upload sementara yang lebih lama dari UPLOAD_SIMPAN_JAM'
+
+    def handle(self, *args, **options):
+        jumlah = hapus_upload_kedaluwarsa()
+        self.stdout.write(self.style.SUCCESS(f'🗑️  {jumlah} upload sementara dihapus'))
@@ -0,0 +1,34 @@
+"""
+Worker Email - Kirim antrean OutboundEmail lewat satu koneksi SMTP
+Jalankan dengan: python manage.py email_worker
+"""
+from core.antrean import WorkerCommand
+from core.email_queue import PengirimEmail
+from core.models import OutboundEmail
+
+
+class Command(WorkerCommand):
+    help = 'Kirim antrean email (retry + backoff + rate limit)'
+    judul = '📨 Worker email'
+    satuan = 'email'
+    model = OutboundEmail
+    status_proses = 'sending'
+    interval = 5
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=50, help='Jumlah email per batch')
+        parser.add_argument('--per-menit', type=int, default=None, help='Batas email per menit (default EMAIL_RATE_PER_MENIT)')
+        super().add_arguments(parser)
+
+    def mulai(self, options):
+        self.pengirim = PengirimEmail(per_menit=options['per_menit'])
+
+    def proses(self, options):
+        return self.pengirim.kirim_batch(options['batch'])
+
+    def saat_kosong(self, options):
+        # Antrean kosong: tutup koneksi agar tidak diputus server karena idle
+        self.pengirim.tutup()
+
+    def selesai(self, options):
+        self.pengirim.tutup()
@@ -0,0 +1,30 @@
+"""
+Worker Export - Buat file export laporan (CSV/XLSX/PDF) dari antrean ExportJob
+Jalankan dengan: python manage.py export_worker
+"""
+from core.antrean import WorkerCommand
+from core.export_jobs import ambil_export, proses_export, hapus_export_kedaluwarsa
+from core.models import ExportJob
+
+
+class Command(WorkerCommand):
+    help = 'Proses antrean export laporan + hapus file export yang kedaluwarsa'
+    judul = '📁 Worker export'
+    satuan = 'export'
+    model = ExportJob
+    kolom_reset = {'progres': 0}
+
+    def proses(self, options):
+        dihapus = hapus_export_kedaluwarsa()
+        if dihapus:
+            self.stdout.write(f'  🗑️  {dihapus} file export kedaluwarsa dihapus')
+
+        job = ambil_export()
+        if not job:
+            return 0
+        job = proses_export(job)
+        self.stdout.write(f'  {"✅" if job.status == "done" else "❌"} {job} -> {job.get_status_display()}')
+        return 1
+
+    def laporkan(self, jumlah):
+        pass  # Status tiap job sudah ditulis di proses()
@@ -0,0 +1,26 @@
+"""
+Worker Gambar - Normalisasi gambar upload (buang EXIF, perkecil, encode ulang, thumbnail)
+Jalankan dengan: python manage.py gambar_worker
+"""
+from core.antrean import WorkerCommand
+from core.gambar import proses_antrean_gambar, antrekan_gambar_lama
+from core.models import GambarJob
+
+
+class Command(WorkerCommand):
+    help = 'Proses antrean normalisasi gambar + thumbnail'
+    judul = '🖼️  Worker gambar'
+    satuan = 'gambar'
+    model = GambarJob
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10, help='Jumlah gambar per putaran')
+        parser.add_argument('--antrekan-lama', action='store_true', help='Antrekan juga gambar yang diupload sebelum worker ini ada')
+        super().add_arguments(parser)
+
+    def mulai(self, options):
+        if options['antrekan_lama']:
+            self.stdout.write(f'  📥 {antrekan_gambar_lama()} gambar lama diantrekan')
+
+    def proses(self, options):
+        return proses_antrean_gambar(options['batch'])
@@ -0,0 +1,28 @@
+"""
+Laporan penghematan storage dokumen (blob dedup SHA-256)
+Jalankan dengan: python manage.py laporan_dedup
+"""
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.storage import laporan_dedup, hitung_ulang_semua
+
+
+class Command(BaseCommand):
+    help = 'Tampilkan ruang disk yang dihemat oleh penyimpanan dokumen dedup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hitung-ulang', action='store_true', help='Samakan jumlah referensi dengan data Dokumen (blob tanpa pemakai dihapus)')
+
+    def handle(self, *args, **options):
+        if options['hitung_ulang']:
+            dihapus = hitung_ulang_semua()
+            self.stdout.write(f'  ♻️  Referensi dihitung ulang, {dihapus} blob tanpa pemakai dihapus')
+
+        data = laporan_dedup()
+        self.stdout.write('📦 Penyimpanan dokumen (dedup):')
+        self.stdout.write(f"  Blob di disk      : {data['jumlah_blob']} file ({filesizeformat(data['bytes_fisik'])})")
+        self.stdout.write(f"  Dokumen pemakai   : {data['jumlah_referensi']} ({filesizeformat(data['bytes_logis'])} tanpa dedup)")
+        self.stdout.write(self.style.SUCCESS(
+            f"  Dihemat           : {filesizeformat(data['bytes_hemat'])} ({data['persen_hemat']}%)"
+        ))
@@ -0,0 +1,30 @@
+"""
+Worker PDF - Render invoice/struk dari antrean PdfJob lalu kirim email
+Jalankan dengan: python manage.py pdf_worker
+"""
+from django.conf import settings
+
+from core.antrean import WorkerCommand
+from core.models import PdfJob
+from core.pdf_jobs import buat_pool, proses_antrean
+
+
+class Command(WorkerCommand):
+    help = 'Proses antrean PDF (invoice/struk) memakai process pool'
+    judul = '🖨️  Worker PDF'
+    model = PdfJob
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proses', type=int, default=settings.PDF_WORKER_PROSES, help='Jumlah proses render PDF')
+        super().add_arguments(parser)
+
+    def mulai(self, options):
+        self.stdout.write(f"  ⚙️  {options['proses']} proses render")
+        self.pool = buat_pool(options['proses'])
+
+    def proses(self, options):
+        # Ambil 2x jumlah proses agar pool tidak menganggur saat menunggu query
+        return proses_antrean(self.pool, options['proses'] * 2)
+
+    def selesai(self, options):
+        self.pool.shutdown()
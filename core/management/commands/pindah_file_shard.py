@@ -0,0 +1,41 @@
+"""
+Pindahkan file upload lama dari folder datar (dan blob dedup blob/ab/) ke layout shard (ab/cd/)
+Aman dijalankan saat aplikasi hidup, bisa dihentikan & dilanjutkan:
+    python manage.py pindah_file_shard --batch 500 --jeda 0.5
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.shard import FILE_SHARD, pindah_batch
+
+
+class Command(BaseCommand):
+    help = 'Pindahkan file upload lama (dokumen_upload/, bukti_bayar/, blob/ab/) ke sub-folder shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='Jumlah baris per batch')
+        parser.add_argument('--jeda', type=float, default=0, help='Jeda (detik) antar batch agar disk/DB tidak terlalu sibuk')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🚚 Pindah file ke layout shard...')
+        total_pindah = total_hilang = 0
+        for model, field, folder in FILE_SHARD:
+            terakhir = 0
+            pindah = hilang = 0
+            while True:
+                terakhir, jumlah, tidak_ada = pindah_batch(model, field, folder, terakhir, options['batch'])
+                if terakhir is None:
+                    break
+                pindah += jumlah
+                hilang += tidak_ada
+                self.stdout.write(f'  📦 {model.__name__}.{field} ({folder}/): {pindah} file dipindah')
+                if options['jeda']:
+                    time.sleep(options['jeda'])
+
+            total_pindah += pindah
+            total_hilang += hilang
+            if hilang:
+                self.stdout.write(self.style.WARNING(f'  ⚠️  {model.__name__}.{field} ({folder}/): {hilang} file tidak ditemukan di disk'))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Selesai: {total_pindah} file dipindah, {total_hilang} tidak ditemukan'))
@@ -0,0 +1,48 @@
+"""
+Rebuild Rollup - Hitung ulang DailyStats & DailyPendapatan dari data transaksi
+Jalankan dengan: python manage.py rebuild_stats [--dari YYYY-MM-DD] [--sampai YYYY-MM-DD]
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import DailyStats, DailyPendapatan
+from core.stats import tanggal_awal_data, rentang_bulanan, rebuild_periode, hapus_di_luar
+
+
+def parse_tanggal(nilai):
+    try:
+        return datetime.datetime.strptime(nilai, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Format tanggal '{nilai}' salah, gunakan YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = 'Backfill / hitung ulang rollup statistik harian (per bulan, satu transaksi per bulan)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dari', type=parse_tanggal, help='Tanggal awal (default: data paling lama)')
+        parser.add_argument('--sampai', type=parse_tanggal, help='Tanggal akhir (default: hari ini)')
+
+    def handle(self, *args, **options):
+        penuh = not options['dari'] and not options['sampai']
+        dari = options['dari'] or tanggal_awal_data()
+        sampai = options['sampai'] or datetime.date.today()
+
+        if dari is None:
+            DailyStats.objects.all().delete()
+            DailyPendapatan.objects.all().delete()
+            self.stdout.write('⏭️  Belum ada data transaksi, rollup dikosongkan')
+            return
+        if dari > sampai:
+            raise CommandError('--dari harus sebelum --sampai.')
+
+        self.stdout.write(f'📊 Rebuild rollup {dari} s/d {sampai}...')
+        if penuh:
+            hapus_di_luar(dari, sampai)
+
+        for awal, akhir in rentang_bulanan(dari, sampai):
+            jumlah_stats, jumlah_pendapatan = rebuild_periode(awal, akhir)
+            self.stdout.write(f'  ✅ {awal:%Y-%m}: {jumlah_stats} baris permohonan, {jumlah_pendapatan} baris pendapatan')
+
+        self.stdout.write(self.style.SUCCESS('✨ Rollup selesai dibangun ulang'))
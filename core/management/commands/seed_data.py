@@ -1,15 +1,28 @@
 """
 Seeder Command - Membuat data sample untuk testing
 Jalankan dengan: python manage.py seed_data
+Data volume besar (dashboard/laporan seperti production): python manage.py seed_data --scale 1000000
 """
-from django.core.management.base import BaseCommand
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User, Group
 from core.models import Karyawan, Pelanggan, Layanan, MasterDokumen, LayananDokumen, TahapanLayanan
+from core import data_sintetis
+from core.storage import dedup_storage
 
 
 class Command(BaseCommand):
     help = 'Seed database dengan data sample untuk testing'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0, help='Tambah N permohonan sintetis (+ pelanggan, dokumen, tagihan, log) lewat bulk_create')
+        parser.add_argument('--batch', type=int, default=5000, help='Jumlah permohonan per batch/transaksi')
+        parser.add_argument('--seed', type=int, default=42, help='Seed acak (data sama untuk seed yang sama)')
+        parser.add_argument('--hari', type=int, default=365, help='Sebar tanggal permohonan selama N hari terakhir')
+
     def create_groups(self):
         """Create role groups"""
         self.stdout.write('\n📝 Membuat groups...')
@@ -264,6 +277,10 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f"  ✅ Dokumen {nama} dibuat")
         
+        # === 5. DATA SINTETIS (--scale) ===
+        if options['scale']:
+            self.seed_sintetis(options['scale'], options['batch'], options['seed'], options['hari'])
+
         # === SUMMARY ===
         self.stdout.write('\n' + '='*50)
         self.stdout.write(self.style.SUCCESS('✅ SEEDING SELESAI!'))
@@ -277,3 +294,44 @@ class Command(BaseCommand):
         self.stdout.write('👤 Pelanggan  : pelanggan@test.com / password123')
         self.stdout.write('👤 Pelanggan 2: pelanggan2@test.com / password123')
         self.stdout.write('─'*50 + '\n')
+
+    def seed_sintetis(self, jumlah, batch, seed, hari):
+        if jumlah < 0 or batch < 1 or hari < 1:
+            raise CommandError('--scale, --batch dan --hari harus bilangan positif.')
+        if data_sintetis.sudah_ada():
+            raise CommandError('Data sintetis sudah ada. Kosongkan database (manage.py flush) lalu seed ulang.')
+
+        rng = random.Random(seed)
+        # Dibulatkan ke jam -> data sama walau dijalankan di menit berbeda
+        sekarang = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+        mulai = time.monotonic()
+        self.stdout.write(f'\n📝 Membuat {jumlah:,} permohonan sintetis (seed {seed}, {hari} hari)...')
+
+        syarat = data_sintetis.siapkan_syarat()
+        file_contoh = data_sintetis.siapkan_file_contoh(syarat)
+        karyawan = {
+            role: Karyawan.objects.filter(role=role).values_list('id', flat=True).first()
+            for role in ('staff_admin', 'staff_keuangan')
+        }
+
+        pelanggan = data_sintetis.buat_pelanggan(
+            rng, max(1, jumlah // data_sintetis.PERMOHONAN_PER_PELANGGAN), batch, sekarang, hari
+        )
+        self.stdout.write(f'  ✅ {len(pelanggan):,} pelanggan + akun login')
+        lapangan = data_sintetis.buat_lapangan(max(1, jumlah // data_sintetis.PERMOHONAN_PER_LAPANGAN))
+        self.stdout.write(f'  ✅ {len(lapangan):,} staff lapangan')
+
+        for dibuat in data_sintetis.buat_permohonan(
+            rng, jumlah, batch, sekarang, hari, pelanggan, lapangan, karyawan, syarat, file_contoh
+        ):
+            self.stdout.write(f'  ⏳ {dibuat:,}/{jumlah:,} permohonan ({time.monotonic() - mulai:.0f} detik)')
+
+        login = data_sintetis.buat_aktivitas_login(rng, pelanggan, batch, sekarang, hari)
+        self.stdout.write(f'  ✅ {login:,} aktivitas login')
+
+        for nama in file_contoh.values():
+            dedup_storage.hitung_ulang(nama)
+        data_sintetis.bangun_ulang_rollup(sekarang, hari)
+        self.stdout.write('  📊 Rollup statistik dibangun ulang')
+        self.stdout.write(self.style.SUCCESS(f'  ✨ Data sintetis selesai dalam {time.monotonic() - mulai:.0f} detik'))
+        self.stdout.write('  👤 Pelanggan sintetis: sintetis0000001@seed.test / password123')
@@ -0,0 +1,152 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import content_disposition_header, http_date
+from django.views.static import was_modified_since
+
+from .models import Dokumen, Permohonan, Pembayaran, Karyawan, Pelanggan
+
+# ==========================================
+# HAK AKSES FILE MEDIA
+# ==========================================
+# Karyawan boleh membuka semua upload (kecuali folder internal / khusus manajer),
+# pelanggan hanya file miliknya sendiri.
+
+FOLDER_INTERNAL = ('pdf_cache/',)   # Hanya dibaca server, tidak pernah dikirim langsung
+FOLDER_MANAJER = ('exports/',)
+
+def normalisasi_path(path):
+    """
+    Path relatif terhadap MEDIA_ROOT tanpa '..'. Path di luar MEDIA_ROOT -> Http404.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File tidak ditemukan.')
+    if path.startswith('..') or path == '.':
+        raise Http404('File tidak ditemukan.')
+    return path
+
+def milik_pelanggan(pelanggan, path):
+    if path.startswith('thumbnail/'):
+        # thumbnail/<nama file hasil normalisasi> (lihat core/gambar.py)
+        return milik_pelanggan(pelanggan, path[len('thumbnail/'):])
+    if path.startswith('bukti_bayar/'):
+        return Pembayaran.objects.filter(bukti_pembayaran=path, permohonan__pelanggan=pelanggan).exists()
+    return (
+        Dokumen.objects.filter(path_file=path, permohonan__pelanggan=pelanggan).exists()
+        or Permohonan.objects.filter(hasil_lapangan=path, pelanggan=pelanggan).exists()
+    )
+
+def boleh_akses(profile, path):
+    if path.startswith(FOLDER_INTERNAL):
+        return False
+    if isinstance(profile, Karyawan):
+        return profile.role == 'manajer' or not path.startswith(FOLDER_MANAJER)
+    if isinstance(profile, Pelanggan):
+        return milik_pelanggan(profile, path)
+    return False
+
+# ==========================================
+# PENGIRIMAN FILE (NGINX / X-SENDFILE / DJANGO)
+# ==========================================
+
+RE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_MEDIA = 64 * 1024
+
+def parse_range(header, ukuran):
+    """
+    Return (awal, akhir) untuk satu rentang 'bytes=a-b' / 'bytes=a-' / 'bytes=-n',
+    None jika header tidak ada / tidak didukung (kirim file utuh),
+    atau False jika rentang di luar ukuran file (416).
+    """
+    cocok = RE_RANGE.match(header or '')
+    if not cocok or cocok.groups() == ('', ''):
+        return None
+    awal, akhir = cocok.groups()
+    if awal == '':
+        # Suffix: n byte terakhir
+        awal, akhir = max(ukuran - int(akhir), 0), ukuran - 1
+    else:
+        awal = int(awal)
+        akhir = min(int(akhir), ukuran - 1) if akhir else ukuran - 1
+    if awal >= ukuran or awal > akhir:
+        return False
+    return awal, akhir
+
+def baca_rentang(f, awal, akhir):
+    try:
+        f.seek(awal)
+        sisa = akhir - awal + 1
+        while sisa > 0:
+            data = f.read(min(CHUNK_MEDIA, sisa))
+            if not data:
+                break
+            sisa -= len(data)
+            yield data
+    finally:
+        f.close()
+
+def stream_file(request, full_path, content_type):
+    """
+    Mode 'django' (development/test): stream dari Python, dengan
+    Last-Modified/If-Modified-Since dan HTTP Range (satu rentang).
+    """
+    try:
+        stat = os.stat(full_path)
+    except FileNotFoundError:
+        raise Http404('File tidak ditemukan.')
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), int(stat.st_mtime)):
+        return HttpResponseNotModified()
+
+    last_modified = http_date(stat.st_mtime)
+    rentang = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+    if request.META.get('HTTP_IF_RANGE', last_modified) != last_modified:
+        rentang = None  # File sudah berubah sejak potongan sebelumnya -> kirim utuh
+
+    if rentang is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+    elif rentang is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        awal, akhir = rentang
+        response = StreamingHttpResponse(baca_rentang(open(full_path, 'rb'), awal, akhir), status=206, content_type=content_type)
+        response['Content-Length'] = akhir - awal + 1
+        response['Content-Range'] = f'bytes {awal}-{akhir}/{stat.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    return response
+
+def kirim_media(request, path, nama_unduhan=None):
+    """
+    Kirim file MEDIA_ROOT/<path> sesuai settings.MEDIA_DELIVERY. Pada mode nginx/sendfile
+    Python hanya mengisi header; transfer (termasuk Range) dikerjakan web server.
+    Cek hak akses dilakukan pemanggil.
+    """
+    path = normalisasi_path(path)
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_DELIVERY == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    elif settings.MEDIA_DELIVERY == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = stream_file(request, full_path, content_type)
+
+    if nama_unduhan:
+        response['Content-Disposition'] = content_disposition_header(True, nama_unduhan)
+    # private: hanya browser user ini yang boleh menyimpan (bukan proxy/CDN)
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
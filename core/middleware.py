@@ -0,0 +1,171 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .models import Karyawan, Pelanggan
+
+# Role untuk user yang terdaftar sebagai Pelanggan (Karyawan memakai Karyawan.role)
+ROLE_PELANGGAN = 'pelanggan'
+
+# Key cache profil per user id (dihapus via signal saat User/Karyawan/Pelanggan berubah)
+PROFILE_CACHE_KEY = 'user_profile:{}'
+
+# ==========================================
+# HELPER: RESOLUSI PROFIL USER
+# ==========================================
+
+def _role_profil(profile):
+    return profile.role if isinstance(profile, Karyawan) else ROLE_PELANGGAN
+
+def _cari_profil(user):
+    """
+    Cari profil asli user (Karyawan lebih dulu, lalu Pelanggan). Email yang terdaftar
+    di keduanya tetap diperlakukan sebagai Karyawan, sama seperti semua cek akses lama
+    (role redirect, manajer_check, view staff, audit login).
+    Return: (profile, role) atau (None, None) jika tidak punya profil.
+    """
+    karyawan = Karyawan.objects.filter(email=user.email).first()
+    if karyawan:
+        return karyawan, _role_profil(karyawan)
+
+    pelanggan = Pelanggan.objects.filter(email=user.email).first()
+    if pelanggan:
+        return pelanggan, _role_profil(pelanggan)
+
+    return None, None
+
+# Model profil per jenis. Cache menyimpan (jenis, pk, role), bukan instance ter-pickle
+MODEL_PROFIL = {'karyawan': Karyawan, 'pelanggan': Pelanggan}
+TANPA_PROFIL = ('', None, None)
+
+def _simpan_profil(user, profile, role):
+    """
+    Simpan hasil _cari_profil ke cache Django + memo di objek user.
+    """
+    if profile is None:
+        info = TANPA_PROFIL
+    else:
+        info = ('karyawan' if isinstance(profile, Karyawan) else 'pelanggan', profile.pk, role)
+    cache.set(PROFILE_CACHE_KEY.format(user.pk), info, settings.PROFILE_CACHE_TIMEOUT)
+    user._profile_info = info
+    user._profile_obj = profile
+    return info
+
+def _info_profil(user):
+    """
+    (jenis, pk, role) milik user. Cache hit -> tanpa query; miss -> cari per email.
+    """
+    if not hasattr(user, '_profile_info'):
+        info = cache.get(PROFILE_CACHE_KEY.format(user.pk))
+        if info is None:
+            info = _simpan_profil(user, *_cari_profil(user))
+        user._profile_info = info
+    return user._profile_info
+
+def hapus_cache_profil(user_ids):
+    """
+    Hapus cache profil untuk daftar user id (dipanggil dari signals).
+    """
+    cache.delete_many([PROFILE_CACHE_KEY.format(pk) for pk in user_ids])
+
+def get_user_role(user):
+    """
+    Role user ('admin', 'manajer', ..., 'pelanggan') atau None. Dipakai cek akses;
+    saat cache profil terisi tidak ada query sama sekali.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    return _info_profil(user)[2]
+
+def get_user_profile(user):
+    """
+    Ambil (profile, role) milik user. Instance profil baru diambil (per pk) saat
+    fungsi ini dipanggil; hasilnya disimpan di objek user, jadi dalam satu request
+    hanya sekali. Cukup butuh role -> pakai get_user_role.
+    """
+    if user is None or not user.is_authenticated:
+        return None, None
+
+    jenis, pk, role = _info_profil(user)
+    if not hasattr(user, '_profile_obj'):
+        profile = MODEL_PROFIL[jenis].objects.filter(pk=pk).first() if jenis else None
+        if jenis and profile is None:
+            # Cache basi (profil terhapus tanpa signal) -> cari ulang per email
+            jenis, pk, role = _simpan_profil(user, *_cari_profil(user))
+            profile = user._profile_obj
+        user._profile_obj = profile
+    return user._profile_obj, role
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+
+class UserProfileMiddleware:
+    """
+    Pasang request.profile (Karyawan/Pelanggan) dan request.role secara lazy.
+    request.role dibaca dari cache profil saja; instance profil hanya di-query
+    jika request.profile benar-benar dipakai.
+    Harus diletakkan SETELAH AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_user_profile(request.user)[0])
+        request.role = SimpleLazyObject(lambda: get_user_role(request.user))
+        return self.get_response(request)
+
+logger_query = logging.getLogger('core.query_budget')
+
+class PencatatQuery:
+    """
+    execute_wrapper: hitung jumlah query dan total waktu SQL (detik).
+    """
+    def __init__(self):
+        self.jumlah = 0
+        self.detik = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        mulai = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.jumlah += 1
+            self.detik += time.perf_counter() - mulai
+
+class QueryBudgetMiddleware:
+    """
+    Catat ke logger 'core.query_budget' setiap view yang melebihi budget query
+    (QUERY_BUDGET_MAKS, bisa per nama URL lewat QUERY_BUDGET_VIEW) atau waktu
+    SQL (QUERY_BUDGET_MAKS_MS). Aktif jika QUERY_BUDGET_AKTIF.
+    Query dari StreamingHttpResponse (export CSV) berjalan setelah middleware
+    selesai, jadi tidak ikut terhitung.
+    """
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_AKTIF:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pencatat = PencatatQuery()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(pencatat))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        nama_view = match.view_name if match else request.path
+        budget = settings.QUERY_BUDGET_VIEW.get(nama_view, settings.QUERY_BUDGET_MAKS)
+        ms = pencatat.detik * 1000
+        if pencatat.jumlah > budget or ms > settings.QUERY_BUDGET_MAKS_MS:
+            logger_query.warning(
+                'Query budget terlampaui: %s %s (%s) -> %d query (budget %d), %.1f ms SQL',
+                request.method, request.path, nama_view, pencatat.jumlah, budget, ms
+            )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_layanan_deskripsi_layanan_has_custom_tahapan_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aktivitaslogin',
+            index=models.Index(fields=['user', '-timestamp'], name='login_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pembayaran',
+            index=models.Index(fields=['status_pembayaran', 'created_at'], name='pby_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pembayaran',
+            index=models.Index(fields=['status_pembayaran', 'updated_at'], name='pby_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['status_proses', 'created_at'], name='pmh_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['status_proses', 'updated_at'], name='pmh_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['karyawan', 'updated_at'], name='pmh_kry_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['pelanggan', 'created_at'], name='pmh_plg_created_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+# Teks status lama -> kode integer baru (lihat Permohonan.Status)
+STATUS_LAMA = {
+    'Menunggu Verifikasi': 10,
+    'Revisi': 15,
+    'Menunggu Pembayaran': 20,
+    'Diproses': 30,
+    'Proses Lapangan': 40,
+    'Proses di SAMSAT/SATPAS': 41,
+    'Cek Fisik Selesai': 42,
+    'Menunggu Cetak': 43,
+    'Menunggu Finalisasi': 50,
+    'Siap Diambil': 60,
+    'Dikirim': 70,
+    'Selesai': 80,
+    'Ditolak': 90,
+}
+
+
+def status_ke_integer(apps, schema_editor):
+    Permohonan = apps.get_model('core', 'Permohonan')
+    for teks, kode in STATUS_LAMA.items():
+        Permohonan.objects.filter(status_proses=teks).update(status_kode=kode)
+
+    # Teks bebas lain (dulu status lapangan bisa diisi apa saja dari form):
+    # anggap masih di lapangan jika sudah ada petugas, selain itu antre verifikasi.
+    lainnya = Permohonan.objects.exclude(status_proses__in=list(STATUS_LAMA))
+    lainnya.filter(karyawan__isnull=False).update(status_kode=40)
+    lainnya.filter(karyawan__isnull=True).update(status_kode=10)
+
+
+def status_ke_teks(apps, schema_editor):
+    Permohonan = apps.get_model('core', 'Permohonan')
+    for teks, kode in STATUS_LAMA.items():
+        Permohonan.objects.filter(status_kode=kode).update(status_proses=teks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='permohonan',
+            name='pmh_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='permohonan',
+            name='pmh_status_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='permohonan',
+            name='status_kode',
+            field=models.PositiveSmallIntegerField(default=10),
+        ),
+        migrations.RunPython(status_ke_integer, status_ke_teks),
+        migrations.RemoveField(
+            model_name='permohonan',
+            name='status_proses',
+        ),
+        migrations.RenameField(
+            model_name='permohonan',
+            old_name='status_kode',
+            new_name='status_proses',
+        ),
+        migrations.AlterField(
+            model_name='permohonan',
+            name='status_proses',
+            field=models.PositiveSmallIntegerField(choices=[(10, 'Menunggu Verifikasi'), (15, 'Revisi'), (20, 'Menunggu Pembayaran'), (30, 'Diproses'), (40, 'Proses Lapangan'), (41, 'Proses di SAMSAT/SATPAS'), (42, 'Cek Fisik Selesai'), (43, 'Menunggu Cetak'), (50, 'Menunggu Finalisasi'), (60, 'Siap Diambil'), (70, 'Dikirim'), (80, 'Selesai'), (90, 'Ditolak')], default=10),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['status_proses', 'created_at'], name='pmh_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permohonan',
+            index=models.Index(fields=['status_proses', 'updated_at'], name='pmh_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_permohonan_status_integer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jenis', models.CharField(choices=[('invoice', 'Invoice Tagihan'), ('struk', 'Struk Lunas')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Menunggu'), ('processing', 'Sedang Diproses'), ('done', 'Selesai'), ('failed', 'Gagal')], default='pending', max_length=20)),
+                ('percobaan', models.PositiveSmallIntegerField(default=0)),
+                ('pesan_error', models.TextField(blank=True, null=True)),
+                ('email_subjek', models.CharField(max_length=255)),
+                ('email_pesan', models.TextField()),
+                ('email_tujuan', models.EmailField(max_length=100)),
+                ('nama_file', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pembayaran', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to='core.pembayaran')),
+            ],
+            options={
+                'verbose_name': 'Antrean PDF',
+                'verbose_name_plural': 'Antrean PDF',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_pdfjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subjek', models.CharField(max_length=255)),
+                ('pesan_html', models.TextField()),
+                ('email_tujuan', models.TextField(help_text='Daftar email, dipisah koma')),
+                ('lampiran', models.BinaryField(blank=True, null=True)),
+                ('nama_lampiran', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Menunggu'), ('sending', 'Sedang Dikirim'), ('sent', 'Terkirim'), ('failed', 'Gagal')], default='pending', max_length=20)),
+                ('percobaan', models.PositiveSmallIntegerField(default=0)),
+                ('pesan_error', models.TextField(blank=True, null=True)),
+                ('jadwal_kirim', models.DateTimeField(default=django.utils.timezone.now)),
+                ('terkirim_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Antrean Email',
+                'verbose_name_plural': 'Antrean Email',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'jadwal_kirim'], name='email_status_jadwal_idx')],
+            },
+        ),
+    ]
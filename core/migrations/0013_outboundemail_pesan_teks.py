@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='pesan_teks',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
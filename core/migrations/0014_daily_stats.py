@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_outboundemail_pesan_teks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tanggal', models.DateField()),
+                ('status_proses', models.PositiveSmallIntegerField(choices=[(10, 'Menunggu Verifikasi'), (15, 'Revisi'), (20, 'Menunggu Pembayaran'), (30, 'Diproses'), (40, 'Proses Lapangan'), (41, 'Proses di SAMSAT/SATPAS'), (42, 'Cek Fisik Selesai'), (43, 'Menunggu Cetak'), (50, 'Menunggu Finalisasi'), (60, 'Siap Diambil'), (70, 'Dikirim'), (80, 'Selesai'), (90, 'Ditolak')])),
+                ('jumlah_permohonan', models.PositiveIntegerField(default=0)),
+                ('layanan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.layanan')),
+            ],
+            options={
+                'verbose_name': 'Statistik Harian Permohonan',
+                'verbose_name_plural': 'Statistik Harian Permohonan',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPendapatan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tanggal', models.DateField()),
+                ('metode_pembayaran', models.CharField(blank=True, default='', max_length=30)),
+                ('jumlah_transaksi', models.PositiveIntegerField(default=0)),
+                ('total_pemasukan', models.PositiveBigIntegerField(default=0)),
+                ('layanan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_pendapatan', to='core.layanan')),
+            ],
+            options={
+                'verbose_name': 'Statistik Harian Pendapatan',
+                'verbose_name_plural': 'Statistik Harian Pendapatan',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystats',
+            constraint=models.UniqueConstraint(fields=('tanggal', 'layanan', 'status_proses'), name='dailystats_unik'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypendapatan',
+            constraint=models.UniqueConstraint(fields=('tanggal', 'layanan', 'metode_pembayaran'), name='dailypendapatan_unik'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('laporan', models.CharField(choices=[('keuangan', 'Laporan Keuangan'), ('gabungan', 'Laporan Gabungan')], max_length=20)),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)'), ('pdf', 'PDF')], max_length=10)),
+                ('periode', models.CharField(max_length=100)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('kunci_aktif', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Menunggu'), ('processing', 'Sedang Dibuat'), ('done', 'Selesai'), ('failed', 'Gagal'), ('expired', 'Kedaluwarsa')], default='pending', max_length=20)),
+                ('progres', models.PositiveSmallIntegerField(default=0)),
+                ('pesan_error', models.TextField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, max_length=255, null=True, upload_to='exports/')),
+                ('kedaluwarsa_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('diminta_oleh', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to='core.karyawan')),
+            ],
+            options={
+                'verbose_name': 'Export Laporan',
+                'verbose_name_plural': 'Export Laporan',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='export_status_created_idx')],
+            },
+        ),
+    ]
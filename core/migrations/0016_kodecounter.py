@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=30, unique=True)),
+                ('nilai', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Counter Kode',
+                'verbose_name_plural': 'Counter Kode',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0016_kodecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSementara',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nama_file', models.CharField(max_length=255)),
+                ('ukuran', models.PositiveBigIntegerField()),
+                ('diterima', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('uploading', 'Sedang Diupload'), ('selesai', 'Selesai')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sementara', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Sementara',
+                'verbose_name_plural': 'Upload Sementara',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_uploadsementara'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GambarJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sumber', models.CharField(choices=[('dokumen', 'Dokumen Persyaratan'), ('hasil_lapangan', 'Foto Hasil Lapangan'), ('bukti_bayar', 'Bukti Pembayaran')], max_length=20)),
+                ('path_asli', models.CharField(max_length=255, unique=True)),
+                ('path_hasil', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Menunggu'), ('processing', 'Diproses'), ('done', 'Selesai'), ('failed', 'Gagal')], default='pending', max_length=20)),
+                ('pesan_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Antrean Gambar',
+                'verbose_name_plural': 'Antrean Gambar',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='gambar_status_created_idx')],
+            },
+        ),
+    ]
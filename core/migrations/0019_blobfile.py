@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:24
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_gambarjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nama', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('ukuran', models.PositiveBigIntegerField()),
+                ('jumlah_referensi', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Blob File',
+                'verbose_name_plural': 'Blob File',
+            },
+        ),
+        migrations.AlterField(
+            model_name='dokumen',
+            name='path_file',
+            field=models.FileField(db_index=True, max_length=255, storage=core.storage.DedupStorage(), upload_to=core.models.get_file_path),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:26
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_blobfile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pembayaran',
+            name='bukti_pembayaran',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=core.models.get_bukti_bayar_path),
+        ),
+    ]
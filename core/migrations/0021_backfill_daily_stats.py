@@ -0,0 +1,70 @@
+import datetime
+
+from django.db import migrations, transaction
+from django.db.models import Count, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+# Isi DailyStats & DailyPendapatan dari data yang sudah ada sebelum 0014 (sama
+# dengan `manage.py rebuild_stats`), satu transaksi per bulan kalender agar
+# tabel besar tidak dikunci lama. Setelah ini rollup dijaga oleh save()/signal.
+
+def rentang_bulanan(dari, sampai):
+    awal = dari
+    while awal <= sampai:
+        bulan_depan = (awal.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        yield awal, min(bulan_depan - datetime.timedelta(days=1), sampai)
+        awal = bulan_depan
+
+
+def backfill_rollup(apps, schema_editor):
+    Permohonan = apps.get_model('core', 'Permohonan')
+    Pembayaran = apps.get_model('core', 'Pembayaran')
+    DailyStats = apps.get_model('core', 'DailyStats')
+    DailyPendapatan = apps.get_model('core', 'DailyPendapatan')
+
+    paid = Pembayaran.objects.filter(status_pembayaran='paid')
+    awal = [
+        Permohonan.objects.aggregate(awal=Min('created_at'))['awal'],
+        paid.aggregate(awal=Min('updated_at'))['awal'],
+    ]
+    awal = [t.date() for t in awal if t]
+    if not awal:
+        return
+
+    for dari, sampai in rentang_bulanan(min(awal), datetime.date.today()):
+        with transaction.atomic():
+            DailyStats.objects.filter(tanggal__range=[dari, sampai]).delete()
+            DailyPendapatan.objects.filter(tanggal__range=[dari, sampai]).delete()
+
+            stats = Permohonan.objects.filter(created_at__date__range=[dari, sampai]).order_by().values(
+                'layanan_id', 'status_proses', tgl=TruncDate('created_at')
+            ).annotate(jumlah=Count('id'))
+            DailyStats.objects.bulk_create([
+                DailyStats(tanggal=row['tgl'], layanan_id=row['layanan_id'], status_proses=row['status_proses'], jumlah_permohonan=row['jumlah'])
+                for row in stats
+            ])
+
+            pendapatan = paid.filter(updated_at__date__range=[dari, sampai]).order_by().values(
+                'permohonan__layanan_id', tgl=TruncDate('updated_at'), metode=Coalesce('metode_pembayaran', Value(''))
+            ).annotate(jumlah=Count('id'), total=Sum('total_biaya'))
+            DailyPendapatan.objects.bulk_create([
+                DailyPendapatan(
+                    tanggal=row['tgl'], layanan_id=row['permohonan__layanan_id'], metode_pembayaran=row['metode'],
+                    jumlah_transaksi=row['jumlah'], total_pemasukan=row['total'] or 0
+                )
+                for row in pendapatan
+            ])
+
+
+class Migration(migrations.Migration):
+    # Transaksi per bulan di dalam backfill_rollup, bukan satu transaksi untuk semua data
+    atomic = False
+
+    dependencies = [
+        ('core', '0020_upload_shard'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
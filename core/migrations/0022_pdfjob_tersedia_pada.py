@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_backfill_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfjob',
+            name='tersedia_pada',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,15 +1,31 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 import os
 import uuid
 
+from .storage import dedup_storage
+
 # --- FUNGSI PEMBANTU (RENAME FILE OTOMATIS) ---
+def path_shard(folder, filename):
+    """
+    <folder>/ab/cd/<uuid>.<ext>: nama acak (aman, tidak bentrok) dan dua level
+    sub-folder dari awalan uuid, supaya satu folder tidak berisi ratusan ribu file.
+    File lama di folder datar dipindah dengan `manage.py pindah_file_shard`.
+    """
+    ext = filename.split('.')[-1].lower() # Ambil ekstensi file (jpg, pdf, png)
+    nama = uuid.uuid4().hex # Buat nama baru acak
+    return f"{folder}/{nama[:2]}/{nama[2:4]}/{nama}.{ext}"
+
 def get_file_path(instance, filename):
     """
     Mengubah nama file asli menjadi UUID agar aman dan tidak bentrok.
     """
-    ext = filename.split('.')[-1] # Ambil ekstensi file (jpg, pdf, png)
-    filename = f"{uuid.uuid4()}.{ext}" # Buat nama baru acak
-    return os.path.join('dokumen_upload/', filename)
+    return path_shard('dokumen_upload', filename)
+
+def get_bukti_bayar_path(instance, filename):
+    # Dulu nama asli dari HP pelanggan dipakai apa adanya di bukti_bayar/
+    return path_shard('bukti_bayar', filename)
 
 # ==========================================
 # 1. ENTITAS MASTER (DATA ACUAN)
@@ -121,13 +137,55 @@ class TahapanLayanan(models.Model):
 # ==========================================
 
 class Permohonan(models.Model):
+    # --- STATUS PROSES (STATE MACHINE) ---
+    # Disimpan sebagai angka kecil yang urut sesuai alur kerja, sehingga query
+    # antrean cukup range scan di index (status_proses, ...).
+    # Label (kanan) sama dengan teks status lama agar tampilan tidak berubah.
+    class Status(models.IntegerChoices):
+        MENUNGGU_VERIFIKASI = 10, 'Menunggu Verifikasi'
+        REVISI = 15, 'Revisi'
+        MENUNGGU_PEMBAYARAN = 20, 'Menunggu Pembayaran'
+        DIPROSES = 30, 'Diproses'
+        PROSES_LAPANGAN = 40, 'Proses Lapangan'
+        PROSES_SAMSAT = 41, 'Proses di SAMSAT/SATPAS'
+        CEK_FISIK_SELESAI = 42, 'Cek Fisik Selesai'
+        MENUNGGU_CETAK = 43, 'Menunggu Cetak'
+        MENUNGGU_FINALISASI = 50, 'Menunggu Finalisasi'
+        SIAP_DIAMBIL = 60, 'Siap Diambil'
+        DIKIRIM = 70, 'Dikirim'
+        SELESAI = 80, 'Selesai'
+        DITOLAK = 90, 'Ditolak'
+
+    # Status yang masih dikerjakan staff lapangan (range 40-43)
+    STATUS_LAPANGAN = (
+        Status.PROSES_LAPANGAN, Status.PROSES_SAMSAT,
+        Status.CEK_FISIK_SELESAI, Status.MENUNGGU_CETAK,
+    )
+
+    # Tabel transisi: status asal -> status tujuan yang diizinkan
+    TRANSISI_STATUS = {
+        Status.MENUNGGU_VERIFIKASI: {Status.MENUNGGU_PEMBAYARAN, Status.REVISI, Status.DITOLAK},
+        Status.REVISI: {Status.MENUNGGU_VERIFIKASI, Status.DITOLAK},
+        Status.MENUNGGU_PEMBAYARAN: {Status.DIPROSES, Status.DITOLAK},
+        Status.DIPROSES: {Status.PROSES_LAPANGAN, Status.DITOLAK},
+        Status.PROSES_LAPANGAN: {*STATUS_LAPANGAN, Status.MENUNGGU_FINALISASI},
+        Status.PROSES_SAMSAT: {*STATUS_LAPANGAN, Status.MENUNGGU_FINALISASI},
+        Status.CEK_FISIK_SELESAI: {*STATUS_LAPANGAN, Status.MENUNGGU_FINALISASI},
+        Status.MENUNGGU_CETAK: {*STATUS_LAPANGAN, Status.MENUNGGU_FINALISASI},
+        Status.MENUNGGU_FINALISASI: {Status.SIAP_DIAMBIL, Status.DIKIRIM, Status.SELESAI},
+        Status.SIAP_DIAMBIL: {Status.DIKIRIM, Status.SELESAI},
+        Status.DIKIRIM: {Status.SELESAI},
+        Status.SELESAI: set(),
+        Status.DITOLAK: {Status.MENUNGGU_VERIFIKASI},
+    }
+
     kode_permohonan = models.CharField(max_length=30, unique=True)
     
     pelanggan = models.ForeignKey(Pelanggan, on_delete=models.CASCADE, related_name='permohonan_list')
     layanan = models.ForeignKey(Layanan, on_delete=models.RESTRICT) 
     karyawan = models.ForeignKey(Karyawan, on_delete=models.SET_NULL, null=True, blank=True, related_name='tugas_list')
     
-    status_proses = models.CharField(max_length=30, default='Menunggu Verifikasi')
+    status_proses = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.MENUNGGU_VERIFIKASI)
     biaya_resmi = models.PositiveIntegerField(default=0, blank=True, null=True)
     metode_pengiriman = models.CharField(max_length=30, blank=True, null=True)
     catatan_pelanggan = models.TextField(blank=True, null=True)
@@ -140,16 +198,76 @@ class Permohonan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Index gabungan sesuai pola query antrean/dashboard
+        indexes = [
+            models.Index(fields=['status_proses', 'created_at'], name='pmh_status_created_idx'),   # antrean staff admin
+            models.Index(fields=['status_proses', 'updated_at'], name='pmh_status_updated_idx'),   # riwayat selesai & revisi
+            models.Index(fields=['karyawan', 'updated_at'], name='pmh_kry_updated_idx'),           # tugas & riwayat lapangan
+            models.Index(fields=['pelanggan', 'created_at'], name='pmh_plg_created_idx'),          # dashboard pelanggan
+        ]
+
     def __str__(self):
         return self.kode_permohonan
 
+    def bisa_ubah_status(self, status_baru):
+        return status_baru in self.TRANSISI_STATUS.get(self.status_proses, set())
+
+    def ubah_status(self, status_baru):
+        """
+        Pindahkan status sesuai TRANSISI_STATUS (belum disimpan, panggil save()).
+        Raise ValueError jika transisi tidak diizinkan.
+        """
+        try:
+            status_baru = self.Status(int(status_baru))
+        except (TypeError, ValueError):
+            raise ValueError(f"Status '{status_baru}' tidak dikenal.")
+
+        if not self.bisa_ubah_status(status_baru):
+            raise ValueError(
+                f"Status tidak bisa diubah dari '{self.get_status_proses_display()}' ke '{status_baru.label}'."
+            )
+        self.status_proses = status_baru
+
+    # --- ROLLUP DailyStats ---
+    FIELD_STATS = ('created_at', 'layanan_id', 'status_proses')
+
+    def kunci_stats(self):
+        """
+        Baris DailyStats tempat permohonan ini dihitung.
+        """
+        if self.created_at is None:
+            return None
+        return {'tanggal': self.created_at.date(), 'layanan_id': self.layanan_id, 'status_proses': self.status_proses}
+
+    def _kunci_stats_lama(self):
+        """
+        Kunci dari baris yang tersimpan sekarang, dikunci (SELECT ... FOR UPDATE) sampai
+        transaksi save selesai. Bukan dari nilai saat instance dimuat: dua instance basi
+        dari baris yang sama akan mengurangi baris DailyStats yang sudah tidak berlaku.
+        """
+        if self._state.adding:
+            return None
+        lama = Permohonan.objects.select_for_update().filter(pk=self.pk).values(*self.FIELD_STATS).first()
+        return Permohonan(**lama).kunci_stats() if lama else None
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            kunci_lama = self._kunci_stats_lama()
+            super().save(*args, **kwargs)
+            kunci_baru = self.kunci_stats()
+            if kunci_lama != kunci_baru:
+                if kunci_lama:
+                    DailyStats.tambah(kunci_lama, jumlah_permohonan=-1)
+                DailyStats.tambah(kunci_baru, jumlah_permohonan=1)
+
 class Dokumen(models.Model):
     kode_dokumen = models.CharField(max_length=30, unique=True)
     permohonan = models.ForeignKey(Permohonan, on_delete=models.CASCADE, related_name='berkas_upload')
     master_dokumen = models.ForeignKey(MasterDokumen, on_delete=models.RESTRICT)
     
-    # Menggunakan FileField dengan fungsi rename otomatis
-    path_file = models.FileField(upload_to=get_file_path, max_length=255)
+    # Disimpan per hash isi (core/storage.py): file yang sama dipakai bersama antar Dokumen
+    path_file = models.FileField(upload_to=get_file_path, storage=dedup_storage, max_length=255, db_index=True)
     status_file = models.CharField(max_length=30, default='Digital Diupload')
     catatan_perbaikan = models.TextField(blank=True, null=True, verbose_name='Catatan Perbaikan')
     
@@ -177,14 +295,54 @@ class Pembayaran(models.Model):
     metode_pembayaran = models.CharField(max_length=30, blank=True, null=True)
     status_pembayaran = models.CharField(max_length=30, default='pending')
     transaction_id_gateway = models.CharField(max_length=100, blank=True, null=True)
-    bukti_pembayaran = models.FileField(upload_to='bukti_bayar/', blank=True, null=True)
+    bukti_pembayaran = models.FileField(upload_to=get_bukti_bayar_path, max_length=255, blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status_pembayaran', 'created_at'], name='pby_status_created_idx'),  # antrean keuangan
+            models.Index(fields=['status_pembayaran', 'updated_at'], name='pby_status_updated_idx'),  # riwayat & laporan lunas
+        ]
+
     def __str__(self):
         return self.nomor_invoice
 
+    # --- ROLLUP DailyPendapatan ---
+    FIELD_PENDAPATAN = ('status_pembayaran', 'updated_at', 'metode_pembayaran', 'total_biaya')
+
+    def kunci_pendapatan(self):
+        """
+        (kunci DailyPendapatan tanpa layanan, total_biaya) jika lunas, selain itu None.
+        """
+        if self.status_pembayaran != 'paid' or self.updated_at is None:
+            return None
+        return {'tanggal': self.updated_at.date(), 'metode_pembayaran': self.metode_pembayaran or ''}, self.total_biaya
+
+    def _kunci_pendapatan_lama(self):
+        # Sama seperti Permohonan._kunci_stats_lama: baca baris tersimpan + kunci barisnya
+        if self._state.adding:
+            return None
+        lama = Pembayaran.objects.select_for_update().filter(pk=self.pk).values(*self.FIELD_PENDAPATAN).first()
+        return Pembayaran(**lama).kunci_pendapatan() if lama else None
+
+    def catat_pendapatan(self, kunci, arah):
+        if kunci:
+            DailyPendapatan.tambah(
+                {**kunci[0], 'layanan_id': self.permohonan.layanan_id},
+                jumlah_transaksi=arah, total_pemasukan=arah * kunci[1]
+            )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            kunci_lama = self._kunci_pendapatan_lama()
+            super().save(*args, **kwargs)
+            kunci_baru = self.kunci_pendapatan()
+            if kunci_lama != kunci_baru:
+                self.catat_pendapatan(kunci_lama, -1)
+                self.catat_pendapatan(kunci_baru, 1)
+
 class TahapanPermohonan(models.Model):
     """
     Tracking progress tahapan untuk setiap permohonan.
@@ -345,13 +503,399 @@ class AktivitasLogin(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Aktivitas Login'
         verbose_name_plural = 'Aktivitas Login'
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='login_user_time_idx'),  # login terakhir per user
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.ip_address} pada {self.timestamp}"
 
     @property
     def get_staff_name(self):
+        if hasattr(self, 'nama_staff'):
+            # Diisi annotate() di dashboard manajer (tanpa query per baris)
+            return self.nama_staff or self.user.username
         try:
             return Karyawan.objects.get(email=self.user.email).nama
         except Karyawan.DoesNotExist:
-            return self.user.username
\ No newline at end of file
+            return self.user.username
+# ==========================================
+# 6. ANTREAN PROSES BACKGROUND
+# ==========================================
+
+class PdfJob(models.Model):
+    """
+    Antrean render PDF (invoice/struk) di luar request.
+    Diproses oleh `python manage.py pdf_worker`, lalu PDF dilampirkan ke email.
+    """
+    JENIS_CHOICES = [
+        ('invoice', 'Invoice Tagihan'),
+        ('struk', 'Struk Lunas'),
+    ]
+
+    # Template PDF per jenis job
+    TEMPLATE_PDF = {
+        'invoice': 'core/pdf/invoice_pdf.html',
+        'struk': 'core/pdf/struk_lunas_pdf.html',
+    }
+
+    STATUS_CHOICES = [
+        ('pending', 'Menunggu'),
+        ('processing', 'Sedang Diproses'),
+        ('done', 'Selesai'),
+        ('failed', 'Gagal'),
+    ]
+
+    jenis = models.CharField(max_length=20, choices=JENIS_CHOICES)
+    pembayaran = models.ForeignKey(Pembayaran, on_delete=models.CASCADE, related_name='pdf_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    percobaan = models.PositiveSmallIntegerField(default=0)
+    pesan_error = models.TextField(blank=True, null=True)
+    tersedia_pada = models.DateTimeField(default=timezone.now)  # Diundur saat render gagal (backoff)
+
+    # Email yang dikirim setelah PDF jadi
+    email_subjek = models.CharField(max_length=255)
+    email_pesan = models.TextField()
+    email_tujuan = models.EmailField(max_length=100)
+    nama_file = models.CharField(max_length=100)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Antrean PDF'
+        verbose_name_plural = 'Antrean PDF'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx'),  # ambil antrean worker
+        ]
+
+    def __str__(self):
+        return f"{self.get_jenis_display()} {self.pembayaran.nomor_invoice} ({self.get_status_display()})"
+
+class OutboundEmail(models.Model):
+    """
+    Antrean email keluar. Dikirim oleh `python manage.py email_worker` lewat
+    satu koneksi SMTP, sehingga email tidak hilang saat server restart.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Menunggu'),
+        ('sending', 'Sedang Dikirim'),
+        ('sent', 'Terkirim'),
+        ('failed', 'Gagal'),
+    ]
+
+    subjek = models.CharField(max_length=255)
+    pesan_html = models.TextField()
+    pesan_teks = models.TextField(blank=True, null=True)  # Alternatif text/plain
+    email_tujuan = models.TextField(help_text='Daftar email, dipisah koma')
+    lampiran = models.BinaryField(blank=True, null=True)
+    nama_lampiran = models.CharField(max_length=100, blank=True, null=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    percobaan = models.PositiveSmallIntegerField(default=0)
+    pesan_error = models.TextField(blank=True, null=True)
+    jadwal_kirim = models.DateTimeField(default=timezone.now)  # Diundur saat retry (backoff)
+    terkirim_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Antrean Email'
+        verbose_name_plural = 'Antrean Email'
+        indexes = [
+            models.Index(fields=['status', 'jadwal_kirim'], name='email_status_jadwal_idx'),  # ambil antrean worker
+        ]
+
+    def __str__(self):
+        return f"{self.subjek} -> {self.email_tujuan} ({self.get_status_display()})"
+
+    @property
+    def daftar_tujuan(self):
+        return [email.strip() for email in self.email_tujuan.split(',') if email.strip()]
+
+class ExportJob(models.Model):
+    """
+    Export laporan (CSV/XLSX/PDF) yang dibuat di background oleh
+    `python manage.py export_worker`, lalu diunduh manajer lewat link berbatas waktu.
+    """
+    LAPORAN_CHOICES = [
+        ('keuangan', 'Laporan Keuangan'),
+        ('gabungan', 'Laporan Gabungan'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+        ('pdf', 'PDF'),
+    ]
+
+    # Format yang tersedia per jenis laporan
+    FORMAT_LAPORAN = {
+        'keuangan': ('csv', 'xlsx'),
+        'gabungan': ('pdf',),
+    }
+
+    STATUS_CHOICES = [
+        ('pending', 'Menunggu'),
+        ('processing', 'Sedang Dibuat'),
+        ('done', 'Selesai'),
+        ('failed', 'Gagal'),
+        ('expired', 'Kedaluwarsa'),
+    ]
+
+    laporan = models.CharField(max_length=20, choices=LAPORAN_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    periode = models.CharField(max_length=100)  # Label periode, contoh: 'Tahun 2025'
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+    diminta_oleh = models.ForeignKey(Karyawan, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+
+    # Diisi selama pending/processing, NULL setelah selesai. UNIQUE -> permintaan
+    # identik yang datang bersamaan hanya menghasilkan satu job.
+    kunci_aktif = models.CharField(max_length=64, blank=True, null=True, unique=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progres = models.PositiveSmallIntegerField(default=0)  # Persen 0-100
+    pesan_error = models.TextField(blank=True, null=True)
+    file = models.FileField(upload_to='exports/', max_length=255, blank=True, null=True)
+    kedaluwarsa_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Export Laporan'
+        verbose_name_plural = 'Export Laporan'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_status_created_idx'),  # ambil antrean worker
+        ]
+
+    def __str__(self):
+        return f"{self.get_laporan_display()} {self.periode} ({self.get_format_display()})"
+
+    @property
+    def nama_file(self):
+        return f"{self.get_laporan_display().replace(' ', '_')}_{self.periode.replace(' ', '_')}.{self.format}"
+
+class GambarJob(models.Model):
+    """
+    Antrean normalisasi gambar upload (dokumen, foto hasil lapangan, bukti bayar).
+    Diproses oleh `python manage.py gambar_worker`: EXIF dibuang, diperkecil,
+    di-encode ulang + dibuatkan thumbnail (lihat core/gambar.py).
+    """
+    SUMBER_CHOICES = [
+        ('dokumen', 'Dokumen Persyaratan'),
+        ('hasil_lapangan', 'Foto Hasil Lapangan'),
+        ('bukti_bayar', 'Bukti Pembayaran'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Menunggu'),
+        ('processing', 'Diproses'),
+        ('done', 'Selesai'),
+        ('failed', 'Gagal'),
+    ]
+
+    sumber = models.CharField(max_length=20, choices=SUMBER_CHOICES)
+    # Nama file di storage saat diantrekan. Baris pemilik dicari lewat nama ini
+    # (bulk_create di MySQL tidak mengembalikan id).
+    path_asli = models.CharField(max_length=255, unique=True)
+    path_hasil = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    pesan_error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Antrean Gambar'
+        verbose_name_plural = 'Antrean Gambar'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='gambar_status_created_idx'),  # ambil antrean worker
+        ]
+
+    def __str__(self):
+        return f"{self.get_sumber_display()}: {self.path_asli} ({self.status})"
+
+# ==========================================
+# 7. ROLLUP STATISTIK (DASHBOARD & LAPORAN)
+# ==========================================
+# Diperbarui di Permohonan.save()/Pembayaran.save() (satu transaksi dengan
+# datanya) dan signal post_delete. Data lama diisi migrasi 0021_backfill_daily_stats,
+# hitung ulang manual: `python manage.py rebuild_stats`.
+
+class RollupHarian(models.Model):
+    """
+    Dasar tabel rollup: satu baris per tanggal + dimensi, berisi counter.
+    """
+    tanggal = models.DateField()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def tambah(cls, kunci, **delta):
+        """
+        Upsert atomik: UPDATE kolom = kolom + delta, INSERT jika baris belum ada.
+        """
+        delta = {kolom: nilai for kolom, nilai in delta.items() if nilai}
+        if not delta:
+            return
+        perubahan = {kolom: models.F(kolom) + nilai for kolom, nilai in delta.items()}
+        if cls.objects.filter(**kunci).update(**perubahan):
+            return
+        if any(nilai < 0 for nilai in delta.values()):
+            # Baris hari itu belum ada (data lama belum di-backfill) -> kolom counter
+            # tidak boleh negatif, jadi baris dibuat dari data sumber yang sudah
+            # berubah di transaksi ini (delta sudah termasuk di dalamnya)
+            isi = cls.hitung_dari_data(kunci)
+            if not any(isi.values()):
+                return
+        else:
+            isi = delta
+        try:
+            with transaction.atomic():
+                cls.objects.create(**kunci, **isi)
+        except IntegrityError:
+            # Baris dibuat request lain di antara UPDATE dan INSERT
+            cls.objects.filter(**kunci).update(**perubahan)
+
+    @classmethod
+    def hitung_dari_data(cls, kunci):
+        """
+        Nilai counter baris `kunci` dihitung langsung dari tabel transaksi.
+        """
+        raise NotImplementedError
+
+class DailyStats(RollupHarian):
+    """
+    Jumlah permohonan per tanggal masuk (created_at), per layanan, per status saat ini.
+    """
+    layanan = models.ForeignKey(Layanan, on_delete=models.CASCADE, related_name='daily_stats')
+    status_proses = models.PositiveSmallIntegerField(choices=Permohonan.Status.choices)
+    jumlah_permohonan = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Statistik Harian Permohonan'
+        verbose_name_plural = 'Statistik Harian Permohonan'
+        constraints = [
+            models.UniqueConstraint(fields=['tanggal', 'layanan', 'status_proses'], name='dailystats_unik'),
+        ]
+
+    def __str__(self):
+        return f"{self.tanggal} {self.layanan} {self.get_status_proses_display()}: {self.jumlah_permohonan}"
+
+    @classmethod
+    def hitung_dari_data(cls, kunci):
+        return {'jumlah_permohonan': Permohonan.objects.filter(
+            created_at__date=kunci['tanggal'], layanan_id=kunci['layanan_id'], status_proses=kunci['status_proses']
+        ).count()}
+
+class DailyPendapatan(RollupHarian):
+    """
+    Pembayaran lunas per tanggal (updated_at, sama dengan filter laporan), per layanan, per metode.
+    """
+    layanan = models.ForeignKey(Layanan, on_delete=models.CASCADE, related_name='daily_pendapatan')
+    metode_pembayaran = models.CharField(max_length=30, blank=True, default='')
+    jumlah_transaksi = models.PositiveIntegerField(default=0)
+    total_pemasukan = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Statistik Harian Pendapatan'
+        verbose_name_plural = 'Statistik Harian Pendapatan'
+        constraints = [
+            models.UniqueConstraint(fields=['tanggal', 'layanan', 'metode_pembayaran'], name='dailypendapatan_unik'),
+        ]
+
+    def __str__(self):
+        return f"{self.tanggal} {self.layanan} {self.metode_pembayaran or '-'}: Rp {self.total_pemasukan:,}"
+
+    @classmethod
+    def hitung_dari_data(cls, kunci):
+        metode = models.Q(metode_pembayaran=kunci['metode_pembayaran'])
+        if not kunci['metode_pembayaran']:
+            metode |= models.Q(metode_pembayaran__isnull=True)
+        hasil = Pembayaran.objects.filter(
+            metode, status_pembayaran='paid', updated_at__date=kunci['tanggal'], permohonan__layanan_id=kunci['layanan_id']
+        ).aggregate(jumlah=models.Count('id'), total=models.Sum('total_biaya'))
+        return {'jumlah_transaksi': hasil['jumlah'], 'total_pemasukan': hasil['total'] or 0}
+
+# ==========================================
+# 8. PENOMORAN KODE (PMH / KRY / LAY)
+# ==========================================
+# Dipakai core/kode.py. Satu baris per prefix (per hari untuk PMH), `nilai` =
+# nomor terakhir yang sudah dibagikan. Worker mengambil nomor per blok.
+
+class KodeCounter(models.Model):
+    prefix = models.CharField(max_length=30, unique=True)  # contoh: 'PMH-20250102', 'KRY'
+    nilai = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Counter Kode'
+        verbose_name_plural = 'Counter Kode'
+
+    def __str__(self):
+        return f"{self.prefix}: {self.nilai}"
+
+# ==========================================
+# 9. UPLOAD BERTAHAP (CHUNKED, BISA DILANJUTKAN)
+# ==========================================
+
+class UploadSementara(models.Model):
+    """
+    File yang diupload per potongan lewat /upload/ (lihat core/uploads.py).
+    Isi ditulis langsung ke UPLOAD_CHUNK_DIR/<id>.part; form cukup mengirim id-nya.
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Sedang Diupload'),
+        ('selesai', 'Selesai'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sementara')
+    nama_file = models.CharField(max_length=255)
+    ukuran = models.PositiveBigIntegerField()  # Total byte yang akan dikirim
+    diterima = models.PositiveBigIntegerField(default=0)  # Byte yang sudah tertulis (= offset chunk berikutnya)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Upload Sementara'
+        verbose_name_plural = 'Upload Sementara'
+
+    def __str__(self):
+        return f"{self.nama_file} ({self.diterima}/{self.ukuran})"
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_CHUNK_DIR, f'{self.id}.part')
+
+# ==========================================
+# 10. PENYIMPANAN DEDUP (CONTENT-ADDRESSED)
+# ==========================================
+# Dipakai core/storage.py. File dengan isi sama (hash SHA-256 sama) hanya
+# disimpan sekali di MEDIA_ROOT/blob/; baris Dokumen menunjuk ke blob yang sama.
+
+class BlobFile(models.Model):
+    nama = models.CharField(max_length=255, unique=True)  # Path relatif di storage: blob/ab/cd/<sha256>.<ext>
+    sha256 = models.CharField(max_length=64, db_index=True)
+    ukuran = models.PositiveBigIntegerField()
+    jumlah_referensi = models.PositiveIntegerField(default=0)  # Jumlah baris yang menunjuk ke blob ini
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Blob File'
+        verbose_name_plural = 'Blob File'
+
+    def __str__(self):
+        return f"{self.nama} ({self.jumlah_referensi}x)"
@@ -0,0 +1,129 @@
+import hashlib
+import itertools
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .utils import render_to_pdf
+
+# ==========================================
+# CACHE PDF (CONTENT-ADDRESSED, DI DISK)
+# ==========================================
+# File disimpan di MEDIA_ROOT/pdf_cache/<2 huruf>/<sha256>.pdf.
+# Nama file = hash(template + updated_at data yang dipakai), jadi data
+# berubah -> kunci baru; file lama tinggal tunggu tergusur LRU.
+
+def kunci_pdf(template_src, *bagian):
+    """
+    Kunci cache = sha256 dari nama template + semua bagian (updated_at, id, periode, dll).
+    """
+    h = hashlib.sha256(template_src.encode())
+    for item in bagian:
+        h.update(b'\0')
+        h.update(item.isoformat().encode() if hasattr(item, 'isoformat') else str(item).encode())
+    return h.hexdigest()
+
+def _path_cache(kunci):
+    return os.path.join(settings.PDF_CACHE_DIR, kunci[:2], f'{kunci}.pdf')
+
+def ambil_pdf(kunci):
+    """
+    Ambil PDF dari cache. mtime di-update saat hit sebagai penanda LRU.
+    """
+    path = _path_cache(kunci)
+    try:
+        with open(path, 'rb') as f:
+            pdf = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # File tergusur proses lain, isi sudah terbaca
+    return pdf
+
+# Jumlah simpan_pdf di proses ini: gusur_lru men-scan seluruh folder cache, jadi
+# hanya dijalankan setiap PDF_CACHE_GUSUR_SETIAP kali tulis, bukan tiap tulis.
+_jumlah_simpan = itertools.count(1)
+
+def simpan_pdf(kunci, pdf):
+    """
+    Tulis atomik (tmp lalu rename) agar request lain tidak membaca file setengah jadi.
+    Ukuran cache bisa melewati batas sementara, paling banyak
+    PDF_CACHE_GUSUR_SETIAP file per proses sampai penggusuran berikutnya.
+    """
+    path = _path_cache(kunci)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    if next(_jumlah_simpan) % settings.PDF_CACHE_GUSUR_SETIAP == 0:
+        gusur_lru()
+
+def gusur_lru(batas_bytes=None):
+    """
+    Hapus file yang paling lama tidak dipakai (mtime terlama) sampai total ukuran <= batas.
+    """
+    batas_bytes = settings.PDF_CACHE_MAKS_BYTES if batas_bytes is None else batas_bytes
+    files = []
+    total = 0
+    if not os.path.isdir(settings.PDF_CACHE_DIR):
+        return 0
+
+    for sub in os.scandir(settings.PDF_CACHE_DIR):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    dihapus = 0
+    for _, size, path in sorted(files):
+        if total <= batas_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        dihapus += 1
+    return dihapus
+
+def render_pdf_cache(template_src, kunci, buat_context):
+    """
+    Ambil dari cache, atau render lalu simpan. `buat_context` dipanggil hanya saat miss.
+    """
+    pdf = ambil_pdf(kunci)
+    if pdf is None:
+        pdf = render_to_pdf(template_src, buat_context())
+        if pdf:
+            simpan_pdf(kunci, pdf)
+    return pdf
+
+# ==========================================
+# RESPONSE HTTP (ETag / Last-Modified)
+# ==========================================
+
+def cek_not_modified(request, kunci, last_modified=None):
+    """
+    Return response 304 jika browser sudah punya versi yang sama, selain itu None.
+    """
+    timestamp = int(time.mktime(last_modified.timetuple())) if last_modified else None
+    return get_conditional_response(request, etag=quote_etag(kunci), last_modified=timestamp)
+
+def respon_pdf(pdf, kunci, filename, last_modified=None):
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['ETag'] = quote_etag(kunci)
+    if last_modified:
+        response['Last-Modified'] = http_date(time.mktime(last_modified.timetuple()))
+    # private: laporan hanya untuk user yang login, browser wajib revalidasi
+    response['Cache-Control'] = 'private, no-cache'
+    return response
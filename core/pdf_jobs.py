@@ -0,0 +1,115 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.template.loader import get_template
+
+from .antrean import klaim
+from .models import PdfJob
+from .pdf_cache import kunci_pdf, ambil_pdf, simpan_pdf
+from .utils import html_ke_pdf, kirim_notifikasi_email
+
+# ==========================================
+# DIPANGGIL DARI VIEWS
+# ==========================================
+
+def antrekan_pdf_email(jenis, pembayaran, subjek, pesan_html, email_tujuan, nama_file):
+    """
+    Simpan job PDF (invoice/struk) ke antrean. Response view tidak lagi
+    menunggu xhtml2pdf; email + lampiran dikirim oleh worker.
+    """
+    return PdfJob.objects.create(
+        jenis=jenis,
+        pembayaran=pembayaran,
+        email_subjek=subjek,
+        email_pesan=pesan_html,
+        email_tujuan=email_tujuan,
+        nama_file=nama_file
+    )
+
+# ==========================================
+# DIPANGGIL DARI WORKER (manage.py pdf_worker)
+# ==========================================
+
+def buat_pool(jumlah_proses=None):
+    """
+    Process pool untuk xhtml2pdf (CPU-bound, menahan GIL sehingga thread tidak membantu).
+    django.setup() di tiap proses agar link_callback bisa membaca settings/static.
+    """
+    return ProcessPoolExecutor(max_workers=jumlah_proses or settings.PDF_WORKER_PROSES, initializer=django.setup)
+
+def ambil_job(jumlah):
+    # Job yang baru gagal render menunggu sampai tersedia_pada (backoff)
+    return klaim(
+        PdfJob, jumlah, select_related=('pembayaran__permohonan__pelanggan', 'pembayaran__permohonan__layanan'),
+        tersedia_pada__lte=datetime.datetime.now()
+    )
+
+def kunci_cache(job):
+    """
+    Kunci cache PDF: template + updated_at semua data yang tampil di invoice/struk.
+    """
+    pembayaran = job.pembayaran
+    permohonan = pembayaran.permohonan
+    return kunci_pdf(
+        PdfJob.TEMPLATE_PDF[job.jenis], pembayaran.id, pembayaran.updated_at, permohonan.updated_at,
+        permohonan.pelanggan.updated_at, permohonan.layanan.updated_at
+    )
+
+def render_html(job):
+    pembayaran = job.pembayaran
+    context = {'permohonan': pembayaran.permohonan, 'pembayaran': pembayaran}
+    return get_template(PdfJob.TEMPLATE_PDF[job.jenis]).render(context)
+
+def selesaikan_job(job, pdf_file, error=None):
+    """
+    Kirim email (dengan PDF jika berhasil) lalu update status job.
+    Gagal render -> dicoba ulang dengan exponential backoff (PDF_JOB_RETRY_DETIK * 2^percobaan,
+    seperti antrean email) sampai PDF_JOB_MAKS_PERCOBAAN, setelah itu email tetap
+    dikirim tanpa lampiran (sama seperti perilaku lama).
+    """
+    if pdf_file:
+        kirim_notifikasi_email(job.email_subjek, job.email_pesan, job.email_tujuan, pdf_file, job.nama_file)
+        job.status = 'done'
+        job.pesan_error = None
+    else:
+        job.percobaan += 1
+        job.pesan_error = error or 'Render PDF gagal.'
+        if job.percobaan < settings.PDF_JOB_MAKS_PERCOBAAN:
+            job.status = 'pending'
+            jeda = settings.PDF_JOB_RETRY_DETIK * (2 ** (job.percobaan - 1))
+            job.tersedia_pada = datetime.datetime.now() + datetime.timedelta(seconds=jeda)
+        else:
+            kirim_notifikasi_email(job.email_subjek, job.email_pesan, job.email_tujuan)
+            job.status = 'failed'
+    job.save(update_fields=['status', 'percobaan', 'pesan_error', 'tersedia_pada', 'updated_at'])
+
+def proses_antrean(pool, jumlah):
+    """
+    Satu putaran worker: render HTML di proses utama (butuh ORM), konversi
+    ke PDF paralel di process pool. PDF yang sudah ada di cache tidak
+    dirender ulang. Return jumlah job yang diproses.
+    """
+    jobs = ambil_job(jumlah)
+    futures = []
+    for job in jobs:
+        try:
+            kunci = kunci_cache(job)
+            pdf_file = ambil_pdf(kunci)
+            if pdf_file:
+                selesaikan_job(job, pdf_file)
+            else:
+                futures.append((job, kunci, pool.submit(html_ke_pdf, render_html(job))))
+        except Exception as e:
+            selesaikan_job(job, None, str(e))
+
+    for job, kunci, future in futures:
+        try:
+            pdf_file = future.result()
+            if pdf_file:
+                simpan_pdf(kunci, pdf_file)
+            selesaikan_job(job, pdf_file)
+        except Exception as e:
+            selesaikan_job(job, None, str(e))
+    return len(jobs)
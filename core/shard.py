@@ -0,0 +1,121 @@
+import os
+import shutil
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Dokumen, Permohonan, Pembayaran, GambarJob
+from .gambar import path_thumbnail
+
+# ==========================================
+# PINDAH FILE LAMA KE LAYOUT SHARD
+# ==========================================
+# File lama ada di folder datar (dokumen_upload/<uuid>.jpg, bukti_bayar/<nama asli>)
+# atau blob dedup layout lama satu level (blob/ab/<sha256>.<ext>).
+# Per batch: file disalin/di-hardlink ke path baru dulu (path lama tetap bisa
+# dibuka), lalu path di database diganti dengan satu UPDATE bersyarat, baru
+# file lama dihapus. Baris yang sudah pindah tidak cocok lagi dengan filter
+# folder datar, jadi command bisa dihentikan dan dijalankan ulang kapan saja.
+
+# (model, field, folder lama)
+FILE_SHARD = [
+    (Dokumen, 'path_file', 'dokumen_upload'),
+    (Permohonan, 'hasil_lapangan', 'dokumen_upload'),
+    (Pembayaran, 'bukti_pembayaran', 'bukti_bayar'),
+    (Dokumen, 'path_file', 'blob'),
+]
+
+# Path lama di dalam folder (default: langsung di folder, tanpa sub-folder)
+POLA_LAMA = {
+    'blob': r'[0-9a-f]{2}/[^/]+',  # blob/ab/<sha256>.<ext> -> disimpan ulang ke blob/ab/cd/
+}
+
+def salin_file(storage, lama, baru):
+    """
+    Hardlink (instan, tanpa tambahan ruang disk), copy jika beda filesystem.
+    """
+    tujuan = storage.path(baru)
+    os.makedirs(os.path.dirname(tujuan), exist_ok=True)
+    try:
+        os.link(storage.path(lama), tujuan)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(storage.path(lama), tujuan)
+
+def siapkan_path_baru(field, nama_lama):
+    """
+    Tulis file di lokasi baru, return nama barunya. DedupStorage (Dokumen)
+    menyimpan ulang lewat save() -> file lama sekaligus di-hash & dedup.
+    """
+    storage = field.storage
+    if hasattr(storage, 'hitung_ulang'):
+        with storage.open(nama_lama, 'rb') as f:
+            return storage.save(nama_lama, File(f))
+    baru = field.generate_filename(None, os.path.basename(nama_lama))
+    salin_file(storage, nama_lama, baru)
+    return baru
+
+def pindah_thumbnail(lama, baru):
+    thumb_lama = path_thumbnail(lama)
+    if default_storage.exists(thumb_lama):
+        salin_file(default_storage, thumb_lama, path_thumbnail(baru))
+
+def kandidat_pindah(model, nama_field, folder, setelah_pk, jumlah):
+    """
+    Baris dengan file di layout lama. Gambar yang masih antre di gambar_worker
+    dilewati dulu (path-nya dipakai job), dipindah di putaran berikutnya.
+    """
+    antre = GambarJob.objects.filter(status__in=['pending', 'processing']).values('path_asli')
+    return list(
+        model.objects.filter(pk__gt=setelah_pk, **{f'{nama_field}__regex': rf'^{folder}/{POLA_LAMA.get(folder, "[^/]+")}$'})
+        .exclude(**{f'{nama_field}__in': antre})
+        .order_by('pk').values_list('pk', nama_field)[:jumlah]
+    )
+
+def pindah_batch(model, nama_field, folder, setelah_pk=0, jumlah=500):
+    """
+    Pindahkan satu batch. Return (pk terakhir atau None jika selesai, jumlah pindah, jumlah file hilang).
+    """
+    baris = kandidat_pindah(model, nama_field, folder, setelah_pk, jumlah)
+    if not baris:
+        return None, 0, 0
+
+    field = model._meta.get_field(nama_field)
+    storage = field.storage
+    rencana = []  # (pk, nama lama, nama baru)
+    hilang = 0
+    dipindah = set()
+    # Satu transaksi per batch: blob DedupStorage baru harus commit bersama UPDATE barisnya
+    with transaction.atomic():
+        for pk, lama in baris:
+            try:
+                baru = siapkan_path_baru(field, lama)
+            except FileNotFoundError:
+                hilang += 1  # Dibiarkan, tetap tercatat di folder lama
+                continue
+            pindah_thumbnail(lama, baru)
+            rencana.append((pk, lama, baru))
+
+        if rencana:
+            # Satu UPDATE untuk satu batch; hanya baris yang path-nya belum diganti user
+            model.objects.filter(pk__in=[pk for pk, _, _ in rencana]).update(**{nama_field: Case(
+                *[When(pk=pk, **{nama_field: lama}, then=Value(baru)) for pk, lama, baru in rencana],
+                default=F(nama_field), output_field=field,
+            )})
+            dipindah = set(model.objects.filter(pk__in=[pk for pk, _, _ in rencana]).values_list('pk', nama_field))
+
+    # Setelah commit: buang file lama, atau salinan baru jika barisnya berubah di tengah jalan
+    jumlah_pindah = 0
+    for pk, lama, baru in rencana:
+        if (pk, baru) in dipindah:
+            sisa = lama
+            jumlah_pindah += 1
+        else:
+            sisa = baru
+        storage.delete(sisa)
+        if not storage.exists(sisa):  # Blob dedup bisa masih dipakai baris lain
+            default_storage.delete(path_thumbnail(sisa))
+    return baris[-1][0], jumlah_pindah, hilang
@@ -1,6 +1,10 @@
+from django.contrib.auth.models import User
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import AktivitasLogin, Karyawan
+from .models import AktivitasLogin, Karyawan, Pelanggan, Permohonan, Pembayaran, DailyStats, Dokumen
+from .middleware import ROLE_PELANGGAN, get_user_role, hapus_cache_profil
+from .storage import lepas_setelah_commit
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -12,8 +16,8 @@ def get_client_ip(request):
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
-    # Hanya catat aktivitas jika User adalah Karyawan
-    if Karyawan.objects.filter(email=user.email).exists():
+    # Hanya catat aktivitas jika User adalah Karyawan (punya role selain pelanggan)
+    if get_user_role(user) not in (None, ROLE_PELANGGAN):
         ip = get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         AktivitasLogin.objects.create(
@@ -21,3 +25,37 @@ def log_user_login(sender, request, user, **kwargs):
             ip_address=ip,
             user_agent=user_agent
         )
+
+@receiver(post_save, sender=Karyawan)
+@receiver(post_delete, sender=Karyawan)
+@receiver(post_save, sender=Pelanggan)
+@receiver(post_delete, sender=Pelanggan)
+def reset_cache_profil(sender, instance, **kwargs):
+    # Role/profil berubah -> hapus cache profil milik user dengan email tersebut
+    user_ids = User.objects.filter(email=instance.email).values_list('id', flat=True)
+    hapus_cache_profil(list(user_ids))
+
+@receiver(post_save, sender=User)
+def reset_cache_profil_user(sender, instance, created, update_fields=None, **kwargs):
+    # Email user bisa berubah -> profil yang cocok ikut berubah.
+    # Update last_login saat login tidak mengubah profil, cache tetap dipakai.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    hapus_cache_profil([instance.pk])
+
+@receiver(post_delete, sender=Permohonan)
+def kurangi_daily_stats(sender, instance, **kwargs):
+    # Dikirim di dalam transaksi delete (termasuk cascade dari Pelanggan)
+    kunci = instance.kunci_stats()
+    if kunci:
+        DailyStats.tambah(kunci, jumlah_permohonan=-1)
+
+@receiver(post_delete, sender=Pembayaran)
+def kurangi_daily_pendapatan(sender, instance, **kwargs):
+    # Cascade menghapus Pembayaran sebelum Permohonan, jadi layanan masih bisa dibaca
+    instance.catat_pendapatan(instance.kunci_pendapatan(), -1)
+
+@receiver(post_delete, sender=Dokumen)
+def lepas_blob_dokumen(sender, instance, **kwargs):
+    # Blob bisa dipakai Dokumen lain -> DedupStorage hanya menghapus jika pemakainya habis
+    lepas_setelah_commit(instance.path_file.storage, instance.path_file.name)
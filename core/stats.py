@@ -0,0 +1,69 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+from .models import Permohonan, Pembayaran, DailyStats, DailyPendapatan
+
+# ==========================================
+# REBUILD ROLLUP (manage.py rebuild_stats)
+# ==========================================
+# Backfill pertama kali dijalankan migrasi 0021_backfill_daily_stats. Command ini
+# untuk memperbaiki rollup jika ada data yang diubah tanpa lewat save()
+# (queryset.update(), SQL manual, dll).
+
+def tanggal_awal_data():
+    awal = [
+        Permohonan.objects.aggregate(awal=Min('created_at'))['awal'],
+        Pembayaran.objects.filter(status_pembayaran='paid').aggregate(awal=Min('updated_at'))['awal'],
+    ]
+    awal = [t.date() for t in awal if t]
+    return min(awal) if awal else None
+
+def rentang_bulanan(dari, sampai):
+    """
+    Pecah dari..sampai (inklusif) per bulan kalender -> [(awal, akhir), ...].
+    """
+    awal = dari
+    while awal <= sampai:
+        bulan_depan = (awal.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        akhir = min(bulan_depan - datetime.timedelta(days=1), sampai)
+        yield awal, akhir
+        awal = bulan_depan
+
+def rebuild_periode(dari, sampai):
+    """
+    Hitung ulang rollup tanggal dari..sampai (inklusif) dalam satu transaksi.
+    Return (jumlah baris DailyStats, jumlah baris DailyPendapatan).
+    """
+    with transaction.atomic():
+        DailyStats.objects.filter(tanggal__range=[dari, sampai]).delete()
+        DailyPendapatan.objects.filter(tanggal__range=[dari, sampai]).delete()
+
+        stats = Permohonan.objects.filter(created_at__date__range=[dari, sampai]).order_by().values(
+            'layanan_id', 'status_proses', tgl=TruncDate('created_at')
+        ).annotate(jumlah=Count('id'))
+        DailyStats.objects.bulk_create([
+            DailyStats(tanggal=row['tgl'], layanan_id=row['layanan_id'], status_proses=row['status_proses'], jumlah_permohonan=row['jumlah'])
+            for row in stats
+        ])
+
+        pendapatan = Pembayaran.objects.filter(status_pembayaran='paid', updated_at__date__range=[dari, sampai]).order_by().values(
+            'permohonan__layanan_id', tgl=TruncDate('updated_at'), metode=Coalesce('metode_pembayaran', Value(''))
+        ).annotate(jumlah=Count('id'), total=Sum('total_biaya'))
+        DailyPendapatan.objects.bulk_create([
+            DailyPendapatan(
+                tanggal=row['tgl'], layanan_id=row['permohonan__layanan_id'], metode_pembayaran=row['metode'],
+                jumlah_transaksi=row['jumlah'], total_pemasukan=row['total'] or 0
+            )
+            for row in pendapatan
+        ])
+    return len(stats), len(pendapatan)
+
+def hapus_di_luar(dari, sampai):
+    """
+    Rebuild penuh: buang baris rollup di luar rentang data (data sudah dihapus).
+    """
+    for model in (DailyStats, DailyPendapatan):
+        model.objects.exclude(tanggal__range=[dari, sampai]).delete()
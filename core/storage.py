@@ -0,0 +1,348 @@
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.db import IntegrityError, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import Case, Count, F, PositiveIntegerField, Sum, Value, When
+from django.utils.deconstruct import deconstructible
+
+# ==========================================
+# STORAGE DEDUP (CONTENT-ADDRESSED)
+# ==========================================
+# Isi file di-hash (SHA-256) sambil ditulis ke file sementara, lalu disimpan
+# sebagai blob/ab/cd/<sha256>.<ext> (dua level sub-folder dari awalan hash, sama
+# seperti path_shard di models.py). Isi sama -> nama sama -> satu file di
+# disk, dipakai bersama oleh beberapa baris Dokumen (KTP/STNK pelanggan lama).
+# Jumlah pemakai dicatat di BlobFile.jumlah_referensi; file fisik baru dihapus
+# saat tidak ada lagi baris yang menunjuk ke blob tersebut.
+#
+# save() wajib dipanggil di dalam transaction.atomic() yang sama dengan INSERT /
+# UPDATE baris pemakainya: lock baris BlobFile dari +1 referensi tertahan sampai
+# baris itu ikut commit. Tanpa itu hitung_ulang() dari penghapusan Dokumen lain
+# bisa menghitung 0 pemakai di antara keduanya lalu menghapus file yang baru
+# saja dipakai.
+
+FOLDER_BLOB = 'blob'
+UKURAN_CHUNK = 64 * 1024
+
+# (app, model, field) yang menyimpan nama blob -> dasar hitung ulang referensi
+PEMAKAI_BLOB = (
+    ('core', 'Dokumen', 'path_file'),
+)
+
+def hitung_pemakai(nama):
+    return sum(
+        apps.get_model(app, model)._default_manager.filter(**{field: nama}).count()
+        for app, model, field in PEMAKAI_BLOB
+    )
+
+def hitung_pemakai_banyak(daftar):
+    """
+    hitung_pemakai() untuk banyak nama sekaligus: satu query per field pemakai.
+    Return {nama: jumlah pemakai}.
+    """
+    jumlah = dict.fromkeys(daftar, 0)
+    for app, model, field in PEMAKAI_BLOB:
+        baris = (
+            apps.get_model(app, model)._default_manager.filter(**{f'{field}__in': jumlah})
+            .order_by().values(field).annotate(n=Count('pk')).values_list(field, 'n')
+        )
+        for nama, n in baris:
+            jumlah[nama] += n
+    return jumlah
+
+def tambah_referensi(nama, sha256, ukuran, jumlah=1):
+    """
+    Upsert atomik jumlah_referensi + jumlah (pola sama dengan RollupHarian.tambah).
+    """
+    BlobFile = apps.get_model('core', 'BlobFile')
+    if BlobFile.objects.filter(nama=nama).update(jumlah_referensi=F('jumlah_referensi') + jumlah):
+        return
+    try:
+        with transaction.atomic():
+            BlobFile.objects.create(nama=nama, sha256=sha256, ukuran=ukuran, jumlah_referensi=jumlah)
+    except IntegrityError:
+        # Baris dibuat request lain di antara UPDATE dan INSERT
+        BlobFile.objects.filter(nama=nama).update(jumlah_referensi=F('jumlah_referensi') + jumlah)
+
+def tambah_referensi_banyak(blob):
+    """
+    tambah_referensi() untuk banyak blob sekaligus dengan jumlah query tetap:
+    SELECT ... FOR UPDATE, satu UPDATE untuk blob yang sudah ada, satu INSERT
+    untuk yang baru. `blob`: {nama: (sha256, ukuran, jumlah)}.
+    """
+    BlobFile = apps.get_model('core', 'BlobFile')
+    ada = set(BlobFile.objects.select_for_update().filter(nama__in=blob).values_list('nama', flat=True))
+    if ada:
+        BlobFile.objects.filter(nama__in=ada).update(jumlah_referensi=F('jumlah_referensi') + Case(
+            *[When(nama=nama, then=Value(blob[nama][2])) for nama in ada],
+            output_field=PositiveIntegerField(),
+        ))
+    baru = [
+        BlobFile(nama=nama, sha256=sha256, ukuran=ukuran, jumlah_referensi=jumlah)
+        for nama, (sha256, ukuran, jumlah) in blob.items() if nama not in ada
+    ]
+    if not baru:
+        return
+    try:
+        with transaction.atomic():
+            BlobFile.objects.bulk_create(baru)
+    except IntegrityError:
+        # Sebagian dibuat request lain di antara SELECT dan INSERT
+        for b in baru:
+            tambah_referensi(b.nama, b.sha256, b.ukuran, b.jumlah_referensi)
+
+@deconstructible
+class DedupStorage(FileSystemStorage):
+    """
+    FileSystemStorage yang menyimpan file berdasarkan hash isinya.
+    Nama dari upload_to hanya dipakai ekstensinya.
+    """
+    def _cek_transaksi(self):
+        if not transaction.get_connection().in_atomic_block:
+            raise TransactionManagementError(
+                'DedupStorage.save() harus di dalam transaction.atomic() bersama baris yang memakainya.'
+            )
+
+    def _save(self, name, content):
+        self._cek_transaksi()
+        nama, tmp, digest, ukuran = self._siapkan_blob(name, content)
+        try:
+            with transaction.atomic():
+                tambah_referensi(nama, digest, ukuran)
+                tmp = self._pasang_blob(nama, tmp)
+        finally:
+            if tmp:
+                os.remove(tmp)
+        return nama
+
+    def simpan_banyak(self, daftar):
+        """
+        Simpan beberapa file sekaligus (form pengajuan). Setiap file di-hash seperti
+        save(), lalu referensinya ditambah lewat tambah_referensi_banyak() -> jumlah
+        query tidak bertambah per file. `daftar`: [(name, content)], return list
+        nama blob dengan urutan yang sama.
+        """
+        self._cek_transaksi()
+        siap = []  # (nama, tmp, digest, ukuran)
+        try:
+            for name, content in daftar:
+                siap.append(self._siapkan_blob(name, content))
+            blob = {}
+            for nama, _, digest, ukuran in siap:
+                jumlah = blob[nama][2] + 1 if nama in blob else 1
+                blob[nama] = (digest, ukuran, jumlah)
+            # Sudah di dalam transaksi pemanggil (_cek_transaksi) -> tanpa savepoint tambahan
+            tambah_referensi_banyak(blob)
+            siap = [(nama, self._pasang_blob(nama, tmp), digest, ukuran) for nama, tmp, digest, ukuran in siap]
+        finally:
+            for _, tmp, _, _ in siap:
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+        return [nama for nama, _, _, _ in siap]
+
+    def _siapkan_blob(self, name, content):
+        """
+        Tulis `content` ke file sementara di folder blob/ (filesystem yang sama
+        dengan blob akhir) sambil di-hash. Return (nama blob, tmp, sha256, ukuran).
+        """
+        ext = os.path.splitext(name)[1].lower()
+        folder = self.path(FOLDER_BLOB)
+        os.makedirs(folder, exist_ok=True)
+
+        sementara = getattr(content, 'temporary_file_path', None)
+        if getattr(content, 'sha256', None) and os.path.exists(sementara()):
+            # Upload multipart: sudah ditulis ke blob/ + di-hash oleh HashUploadHandler,
+            # cukup di-rename ke nama akhir (tanpa salin, tanpa membaca ulang isinya)
+            tmp, digest, ukuran = sementara(), content.sha256, content.size
+        else:
+            # Hash dihitung sambil menulis ke file sementara -> isi hanya dibaca sekali
+            sha = hashlib.sha256()
+            ukuran = 0
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks(UKURAN_CHUNK):
+                        sha.update(chunk)
+                        f.write(chunk)
+                        ukuran += len(chunk)
+            except BaseException:
+                os.remove(tmp)
+                raise
+            digest = sha.hexdigest()
+        # File sementara dibuat 0600 -> samakan dengan file upload biasa (dibaca nginx)
+        os.chmod(tmp, self.file_permissions_mode or 0o644)
+        return f"{FOLDER_BLOB}/{digest[:2]}/{digest[2:4]}/{digest}{ext}", tmp, digest, ukuran
+
+    def _pasang_blob(self, nama, tmp):
+        """
+        Rename `tmp` menjadi blob `nama`. Dipanggil setelah referensi ditambah:
+        lock baris BlobFile dipegang sampai transaksi pemanggil commit, jadi
+        delete() blob yang sama menunggu lalu ikut menghitung baris barunya.
+        Return `tmp` jika blob sudah ada (salinan sementara harus dibuang), None jika dipindah.
+        """
+        path = self.path(nama)
+        if os.path.exists(path):
+            return tmp
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+        return None
+
+    def hitung_ulang(self, nama):
+        """
+        Samakan jumlah_referensi dengan jumlah baris yang benar-benar menunjuk ke
+        `nama` (bukan sekadar dikurangi 1), sehingga tetap benar walau save()
+        sebelumnya ikut rollback. Tidak ada pemakai -> file + barisnya dihapus.
+        Return jumlah pemakai.
+        """
+        BlobFile = apps.get_model('core', 'BlobFile')
+        with transaction.atomic():
+            blob = BlobFile.objects.select_for_update().filter(nama=nama).first()
+            jumlah = hitung_pemakai(nama)
+            if jumlah:
+                if blob and blob.jumlah_referensi != jumlah:
+                    BlobFile.objects.filter(pk=blob.pk).update(jumlah_referensi=jumlah)
+                return jumlah
+            super().delete(nama)
+            if blob:
+                blob.delete()
+        return 0
+
+    def hitung_ulang_banyak(self, daftar):
+        """
+        hitung_ulang() untuk banyak nama sekaligus dengan jumlah query tetap
+        (pasangan simpan_banyak(), mis. saat form pengajuan rollback).
+        Return jumlah blob yang dihapus.
+        """
+        BlobFile = apps.get_model('core', 'BlobFile')
+        daftar = set(daftar)
+        if not daftar:
+            return 0
+        with transaction.atomic():
+            referensi = dict(BlobFile.objects.select_for_update().filter(nama__in=daftar).values_list('nama', 'jumlah_referensi'))
+            pemakai = hitung_pemakai_banyak(daftar)
+            beda = {nama: jumlah for nama, jumlah in pemakai.items() if jumlah and referensi.get(nama, jumlah) != jumlah}
+            if beda:
+                BlobFile.objects.filter(nama__in=beda).update(jumlah_referensi=Case(
+                    *[When(nama=nama, then=Value(jumlah)) for nama, jumlah in beda.items()],
+                    output_field=PositiveIntegerField(),
+                ))
+            kosong = [nama for nama, jumlah in pemakai.items() if not jumlah]
+            for nama in kosong:
+                super().delete(nama)
+            if any(nama in referensi for nama in kosong):
+                BlobFile.objects.filter(nama__in=kosong).delete()
+        return len(kosong)
+
+    def delete(self, name):
+        """
+        Lepas satu pemakai. File lama (dokumen_upload/<uuid>) ikut aturan yang
+        sama: hanya dihapus jika tidak ada baris yang masih menunjuk ke sana.
+        """
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        self.hitung_ulang(name)
+
+dedup_storage = DedupStorage()
+
+def lepas_setelah_commit(storage, nama):
+    """
+    Hapus/lepas file setelah transaksi commit: jika rollback, baris lama masih
+    menunjuk ke file tersebut sehingga file tidak boleh hilang.
+    """
+    if nama:
+        transaction.on_commit(lambda: storage.delete(nama))
+
+# ==========================================
+# UPLOAD HANDLER DOKUMEN (core/uploads.py: terima_upload_dokumen)
+# ==========================================
+# Handler bawaan Django menampung file < 2.5 MB di memori dan sisanya di /tmp,
+# lalu storage menyalinnya lagi ke MEDIA_ROOT. HashUploadHandler menulis setiap
+# chunk langsung ke MEDIA_ROOT/blob/ sambil menghitung SHA-256 dan ukurannya,
+# sehingga DedupStorage cukup me-rename file. Hanya dipasang di view yang
+# menyimpan Dokumen; upload lain (admin, bukti bayar, hasil lapangan) tetap
+# memakai FILE_UPLOAD_HANDLERS bawaan.
+
+class BlobUploadedFile(UploadedFile):
+    """
+    File upload di folder blob/ (satu filesystem dengan tujuan akhirnya).
+    `sha256` terisi setelah upload selesai diterima.
+    """
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        folder = os.path.join(settings.MEDIA_ROOT, FOLDER_BLOB)
+        os.makedirs(folder, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.tmp', dir=folder)
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = None
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass  # Sudah di-rename jadi blob / dipindah storage
+
+class HashUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = BlobUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.sha = hashlib.sha256()
+        raise StopFutureHandlers()  # Handler bawaan tidak perlu menyiapkan salinan di memori / /tmp
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.sha.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+# ==========================================
+# LAPORAN (manage.py laporan_dedup)
+# ==========================================
+
+def laporan_dedup():
+    """
+    Ringkasan penghematan: ukuran logis (seandainya tiap referensi punya salinan
+    sendiri) dibanding ukuran fisik blob di disk.
+    """
+    BlobFile = apps.get_model('core', 'BlobFile')
+    total = BlobFile.objects.filter(jumlah_referensi__gt=0).aggregate(
+        fisik=Sum('ukuran'),
+        logis=Sum(F('ukuran') * F('jumlah_referensi')),
+        referensi=Sum('jumlah_referensi'),
+        jumlah=Count('id'),
+    )
+    fisik, logis = total['fisik'] or 0, total['logis'] or 0
+    return {
+        'jumlah_blob': total['jumlah'],
+        'jumlah_referensi': total['referensi'] or 0,
+        'bytes_fisik': fisik,
+        'bytes_logis': logis,
+        'bytes_hemat': logis - fisik,
+        'persen_hemat': round((logis - fisik) * 100 / logis, 1) if logis else 0,
+    }
+
+def hitung_ulang_semua(storage=dedup_storage):
+    """
+    Perbaiki jumlah_referensi semua blob dari data Dokumen. Return jumlah blob yang dihapus.
+    """
+    BlobFile = apps.get_model('core', 'BlobFile')
+    return sum(
+        1 for nama in BlobFile.objects.values_list('nama', flat=True).iterator()
+        if not storage.hitung_ulang(nama)
+    )
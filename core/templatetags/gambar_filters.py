@@ -0,0 +1,17 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from ..gambar import is_gambar, path_thumbnail
+
+register = template.Library()
+
+@register.filter(name='thumbnail_url')
+def thumbnail_url(file):
+    """
+    URL thumbnail buatan gambar_worker, string kosong jika belum ada (atau bukan gambar).
+    Contoh: {{ dok.path_file|thumbnail_url }}
+    """
+    if not file or not is_gambar(file.name):
+        return ''
+    nama = path_thumbnail(file.name)
+    return default_storage.url(nama) if default_storage.exists(nama) else ''
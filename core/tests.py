@@ -1,3 +1,2231 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    Pelanggan, Karyawan, Layanan, Permohonan, Pembayaran, AktivitasLogin, PdfJob, OutboundEmail,
+    DailyStats, DailyPendapatan, ExportJob, KodeCounter, MasterDokumen, LayananDokumen, Dokumen,
+    PermohonanAuditLog, PembayaranAuditLog, UploadSementara, GambarJob, BlobFile,
+    TahapanLayanan, TahapanPermohonan
+)
+from .antrean import klaim, reset_macet
+from .pdf_jobs import antrekan_pdf_email, proses_antrean
+from . import pdf_cache
+from .pdf_cache import kunci_pdf, ambil_pdf, simpan_pdf, gusur_lru
+from .email_queue import PengirimEmail
+from .kode import GeneratorKode, buat_kode
+from .gambar import antrekan_gambar, proses_antrean_gambar, path_thumbnail
+from .storage import BlobUploadedFile, laporan_dedup
+from .templatetags.gambar_filters import thumbnail_url
+from .export_jobs import antrekan_export, ambil_export, proses_export, hapus_export_kedaluwarsa, buat_link_token
+from .laporan import periode_laporan, konteks_laporan_gabungan
+from .email_templates import EMAIL_TEMPLATES, render_email, kirim_email_template, inline_css
+from .utils import kirim_notifikasi_email, paginate_keyset, halaman_keyset_qs, buat_cursor, render_to_pdf
+from .dashboard import (
+    antrean_admin_qs, riwayat_selesai_qs, tugas_lapangan_qs, riwayat_tugas_qs, permohonan_pelanggan_qs,
+    tagihan_pending_qs, riwayat_lunas_qs, login_staff_terakhir_qs
+)
+from .middleware import PROFILE_CACHE_KEY, ROLE_PELANGGAN, UserProfileMiddleware, get_user_profile, get_user_role
+from .views.manajer_views import manajer_check
+from . import urls as core_urls
+
+
+# ==========================================
+# INDEX DATABASE (EXPLAIN QUERY DASHBOARD)
+# ==========================================
+
+class QueueIndexExplainTest(TestCase):
+    """
+    Pastikan query antrean/riwayat dashboard memakai index gabungan (migrasi 0009).
+    Queryset diambil dari core/dashboard.py (dan halaman_keyset_qs untuk riwayat),
+    sama persis dengan yang dijalankan view. Output EXPLAIN SQLite & MySQL
+    sama-sama memuat nama index yang dipakai.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lap@test.com', email='lap@test.com', password='x')
+        cls.pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        cls.karyawan = Karyawan.objects.create(kode_karyawan='KRY-1', nama='Dedi', email='lap@test.com', role='lapangan')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+
+        Status = Permohonan.Status
+        for i, status in enumerate([Status.MENUNGGU_VERIFIKASI, Status.MENUNGGU_PEMBAYARAN, Status.PROSES_LAPANGAN, Status.SELESAI]):
+            permohonan = Permohonan.objects.create(
+                kode_permohonan=f'PMH-{i}', pelanggan=cls.pelanggan, layanan=layanan,
+                karyawan=cls.karyawan, status_proses=status
+            )
+            Pembayaran.objects.create(
+                nomor_invoice=f'INV-{i}', permohonan=permohonan, total_biaya=1000,
+                status_pembayaran='paid' if i % 2 else 'pending'
+            )
+        AktivitasLogin.objects.create(user=cls.user, ip_address='127.0.0.1')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Query tidak memakai {index_name}:\n{plan}")
+        return plan
+
+    def test_antrean_staff_admin(self):
+        # OR dua daftar status: kedua sisi lewat index status, tanpa full scan tabel
+        plan = self.assertUsesIndex(antrean_admin_qs(), 'pmh_status_')
+        self.assertNotIn('SCAN core_permohonan', plan)
+
+    def test_riwayat_selesai(self):
+        self.assertUsesIndex(halaman_keyset_qs(riwayat_selesai_qs()), 'pmh_status_updated_idx')
+
+    def test_tugas_lapangan(self):
+        self.assertUsesIndex(tugas_lapangan_qs(self.karyawan), 'pmh_kry_updated_idx')
+
+    def test_riwayat_tugas_lapangan(self):
+        self.assertUsesIndex(halaman_keyset_qs(riwayat_tugas_qs(self.karyawan)), 'pmh_kry_updated_idx')
+        # Halaman berikutnya (cursor) tetap lewat index yang sama
+        cursor = buat_cursor(Permohonan.objects.get(status_proses=Permohonan.Status.SELESAI))
+        self.assertUsesIndex(halaman_keyset_qs(riwayat_tugas_qs(self.karyawan), cursor), 'pmh_kry_updated_idx')
+
+    def test_dashboard_pelanggan(self):
+        self.assertUsesIndex(permohonan_pelanggan_qs(self.pelanggan), 'pmh_plg_created_idx')
+
+    def test_antrean_keuangan(self):
+        self.assertUsesIndex(tagihan_pending_qs(), 'pby_status_created_idx')
+
+    def test_riwayat_keuangan(self):
+        self.assertUsesIndex(halaman_keyset_qs(riwayat_lunas_qs()), 'pby_status_updated_idx')
+
+    def test_login_terakhir(self):
+        self.assertUsesIndex(login_staff_terakhir_qs(), 'login_user_time_idx')
+
+
+# ==========================================
+# PAGINATION KEYSET (RIWAYAT)
+# ==========================================
+
+class PaginateKeysetTest(TestCase):
+    """
+    paginate_keyset: urutan (updated_at, id) terbaru dulu, cursor = posisi baris terakhir.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        Permohonan.objects.bulk_create([
+            Permohonan(kode_permohonan=f'PMH-{i}', pelanggan=pelanggan, layanan=layanan, status_proses=Permohonan.Status.SELESAI)
+            for i in range(7)
+        ])
+        # 3 waktu berbeda, beberapa baris per waktu (tie di updated_at)
+        ids = list(Permohonan.objects.order_by('id').values_list('id', flat=True))
+        awal = datetime.datetime(2025, 1, 1, 9, 30, 0, 123456)
+        for i, pk in enumerate(ids):
+            Permohonan.objects.filter(pk=pk).update(updated_at=awal + datetime.timedelta(minutes=i // 3))
+        cls.urutan = list(Permohonan.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        cls.admin = User.objects.create_user(username='adm@test.com', email='adm@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Admin', email='adm@test.com', role='admin')
+
+    def semua_halaman(self, page_size):
+        halaman, cursor = [], None
+        while True:
+            items, cursor = paginate_keyset(Permohonan.objects.all(), cursor, page_size=page_size)
+            halaman.append([p.id for p in items])
+            if cursor is None:
+                return halaman
+
+    def test_cursor_bolak_balik(self):
+        items, cursor = paginate_keyset(Permohonan.objects.all(), page_size=2)
+        self.assertEqual(cursor, buat_cursor(items[-1]))
+        self.assertEqual(cursor, f'20250101{items[-1].updated_at:%H%M%S}123456-{items[-1].id}')
+        lanjut, _ = paginate_keyset(Permohonan.objects.all(), cursor, page_size=2)
+        self.assertEqual([p.id for p in lanjut], self.urutan[2:4])
+
+    def test_tie_updated_at_tidak_hilang_atau_dobel(self):
+        # Ukuran halaman 2 memotong grup berisi 3 baris dengan updated_at sama
+        halaman = self.semua_halaman(page_size=2)
+        self.assertEqual([pk for h in halaman for pk in h], self.urutan)
+        self.assertEqual([len(h) for h in halaman], [2, 2, 2, 1])
+
+    def test_halaman_terakhir(self):
+        # Jumlah data kelipatan page_size: halaman terakhir penuh, tanpa halaman kosong setelahnya
+        halaman = self.semua_halaman(page_size=7)
+        self.assertEqual(halaman, [self.urutan])
+        items, cursor = paginate_keyset(Permohonan.objects.all(), buat_cursor(Permohonan.objects.get(pk=self.urutan[-1])))
+        self.assertEqual((items, cursor), ([], None))
+
+    def test_cursor_rusak(self):
+        for cursor in ('abc', '2025-1', '20250101093000123456', '20250101093000123456-x', '20251301093000123456-1',
+                       '20250101093000123456-1-2', '20250101093000123456-99999999999999999999999'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    paginate_keyset(Permohonan.objects.all(), cursor)
+
+    def test_cursor_rusak_di_view_bukan_500(self):
+        self.client.force_login(self.admin)
+        for cursor in ('abc', '20250101093000123456-99999999999999999999999'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/staff/riwayat-selesai/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+# ==========================================
+# STATE MACHINE STATUS PERMOHONAN
+# ==========================================
+
+class StatusTransisiTest(TestCase):
+    """
+    Perpindahan status_proses wajib lewat Permohonan.TRANSISI_STATUS.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        cls.layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+
+    def buat_permohonan(self, status):
+        return Permohonan(
+            kode_permohonan='PMH-1', pelanggan=self.pelanggan, layanan=self.layanan, status_proses=status
+        )
+
+    def test_semua_status_punya_transisi(self):
+        self.assertEqual(set(Permohonan.TRANSISI_STATUS), set(Permohonan.Status))
+
+    def test_alur_normal(self):
+        Status = Permohonan.Status
+        permohonan = self.buat_permohonan(Status.MENUNGGU_VERIFIKASI)
+        for status in [Status.MENUNGGU_PEMBAYARAN, Status.DIPROSES, Status.PROSES_LAPANGAN,
+                       Status.CEK_FISIK_SELESAI, Status.MENUNGGU_FINALISASI, Status.DIKIRIM, Status.SELESAI]:
+            permohonan.ubah_status(status)
+        self.assertEqual(permohonan.status_proses, Status.SELESAI)
+
+    def test_transisi_ilegal_ditolak(self):
+        permohonan = self.buat_permohonan(Permohonan.Status.PROSES_LAPANGAN)
+        with self.assertRaises(ValueError):
+            permohonan.ubah_status(Permohonan.Status.SELESAI)
+        self.assertEqual(permohonan.status_proses, Permohonan.Status.PROSES_LAPANGAN)
+
+    def test_status_dari_form(self):
+        # Nilai POST berupa string angka; teks bebas/angka asing ditolak
+        permohonan = self.buat_permohonan(Permohonan.Status.PROSES_LAPANGAN)
+        permohonan.ubah_status(str(Permohonan.Status.MENUNGGU_CETAK.value))
+        self.assertEqual(permohonan.status_proses, Permohonan.Status.MENUNGGU_CETAK)
+        for nilai in ['Kembali dari Lapangan', '999', None]:
+            with self.assertRaises(ValueError):
+                permohonan.ubah_status(nilai)
+
+    def test_status_final_terkunci(self):
+        permohonan = self.buat_permohonan(Permohonan.Status.SELESAI)
+        for status in Permohonan.Status:
+            self.assertFalse(permohonan.bisa_ubah_status(status))
+
+    def test_siap_diambil_bisa_dikirim(self):
+        # Alur lama: permohonan di tab "Siap Diambil" tetap bisa difinalisasi via kurir
+        permohonan = self.buat_permohonan(Permohonan.Status.SIAP_DIAMBIL)
+        permohonan.ubah_status(Permohonan.Status.DIKIRIM)
+        self.assertEqual(permohonan.status_proses, Permohonan.Status.DIKIRIM)
+
+
+class StatusTransisiViewTest(TestCase):
+    """
+    ValueError dari ubah_status() di view -> pesan error + redirect, tanpa efek samping.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='adm@test.com', email='adm@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Admin', email='adm@test.com', role='admin')
+        cls.user_pelanggan = User.objects.create_user(username='plg@test.com', email='plg@test.com', password='x')
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        cls.dokumen = Dokumen.objects.create(
+            kode_dokumen='DOK-1', permohonan=cls.permohonan, master_dokumen=MasterDokumen.objects.create(nama_dokumen='KTP'),
+            path_file='blob/aa/ktp.pdf',
+        )
+
+    def post_gagal(self, user, url, data):
+        self.client.force_login(user)
+        with mock.patch.object(Permohonan, 'ubah_status', side_effect=ValueError('transisi ditolak')):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('transisi ditolak', [str(m) for m in get_messages(response.wsgi_request)])
+        return response
+
+    def test_verifikasi_revisi(self):
+        self.post_gagal(self.admin, f'/staff/verifikasi/{self.permohonan.id}/', {
+            'action': 'revision', f'status_dok_{self.dokumen.id}': 'tolak', f'catatan_dok_{self.dokumen.id}': 'buram',
+        })
+        self.dokumen.refresh_from_db()
+        self.assertEqual(self.dokumen.status_file, 'Digital Diupload')
+
+    def test_verifikasi_setujui(self):
+        self.post_gagal(self.admin, f'/staff/verifikasi/{self.permohonan.id}/', {'action': 'verify', 'biaya_resmi': '1000'})
+        self.assertFalse(Pembayaran.objects.exists())
+
+    def test_bayar_online(self):
+        Permohonan.objects.filter(pk=self.permohonan.pk).update(status_proses=Permohonan.Status.MENUNGGU_PEMBAYARAN)
+        pembayaran = Pembayaran.objects.create(nomor_invoice='INV-1', permohonan=self.permohonan, total_biaya=1000)
+        for metode in ('online', 'qris_instant'):
+            with self.subTest(metode=metode):
+                self.post_gagal(self.user_pelanggan, f'/tagihan/{self.permohonan.id}/', {'metode': metode})
+                pembayaran.refresh_from_db()
+                self.assertEqual(pembayaran.status_pembayaran, 'pending')
+
+
+# ==========================================
+# PROFIL USER (MIDDLEWARE & CACHE)
+# ==========================================
+
+class ProfilCacheTest(TestCase):
+    """
+    Cache profil hanya menyimpan (jenis, pk, role) dan dihapus saat User/Karyawan/Pelanggan berubah.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='adm@test.com', email='adm@test.com', password='x')
+        cls.karyawan = Karyawan.objects.create(kode_karyawan='KRY-1', nama='Admin', email='adm@test.com', role='admin')
+        cls.pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def profil(self):
+        # Objek user baru = request baru (memo profil di objek user tidak terbawa)
+        return get_user_profile(User.objects.get(pk=self.user.pk))
+
+    def test_cache_menyimpan_jenis_pk_dan_role(self):
+        self.assertEqual(self.profil(), (self.karyawan, 'admin'))
+        self.assertEqual(cache.get(PROFILE_CACHE_KEY.format(self.user.pk)), ('karyawan', self.karyawan.pk, 'admin'))
+
+        user = User.objects.get(pk=self.user.pk)
+        # Cek role (manajer_check, redirect per role) cukup dari cache
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_role(user), 'admin')
+        # Instance profil baru diambil saat dipakai: satu query per pk, tanpa pencarian email
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_profile(user), (self.karyawan, 'admin'))
+
+    def test_user_tanpa_profil_ikut_di_cache(self):
+        lain = User.objects.create_user(username='lain@test.com', email='lain@test.com', password='x')
+        self.assertEqual(get_user_profile(lain), (None, None))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_profile(User(pk=lain.pk, email='lain@test.com')), (None, None))
+
+    def test_profil_terhapus_tanpa_signal(self):
+        self.profil()
+        Karyawan.objects.filter(pk=self.karyawan.pk).delete()
+        self.assertEqual(self.profil(), (None, None))
+        self.assertEqual(cache.get(PROFILE_CACHE_KEY.format(self.user.pk)), ('', None, None))
+
+    def test_ganti_role_menghapus_cache(self):
+        self.profil()
+        self.karyawan.role = 'manajer'
+        self.karyawan.save()
+        self.assertEqual(get_user_role(User.objects.get(pk=self.user.pk)), 'manajer')
+
+    def test_hapus_karyawan_menghapus_cache(self):
+        self.profil()
+        self.karyawan.delete()
+        self.assertIsNone(cache.get(PROFILE_CACHE_KEY.format(self.user.pk)))
+        self.assertEqual(self.profil(), (None, None))
+
+    def test_ganti_email_user_menghapus_cache(self):
+        self.profil()
+        self.user.email = 'plg@test.com'
+        self.user.save()
+        self.assertIsNone(cache.get(PROFILE_CACHE_KEY.format(self.user.pk)))
+        self.assertEqual(self.profil(), (self.pelanggan, ROLE_PELANGGAN))
+
+    def test_karyawan_didahulukan(self):
+        # Email terdaftar sebagai Karyawan dan Pelanggan -> tetap staff (akses + audit login)
+        Pelanggan.objects.create(kode_pelanggan='PLG-2', nama='Admin', email='adm@test.com')
+        self.assertEqual(self.profil(), (self.karyawan, 'admin'))
+
+        self.assertTrue(self.client.login(username='adm@test.com', password='x'))
+        self.assertEqual(AktivitasLogin.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.client.get('/staff/dashboard/').status_code, 200)
+        self.assertRedirects(self.client.get('/dashboard/'), '/staff/dashboard/', fetch_redirect_response=False)
+
+    def test_middleware_lazy(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        middleware = UserProfileMiddleware(lambda req: HttpResponse())
+        # Tanpa akses ke request.profile/role tidak ada query sama sekali
+        with self.assertNumQueries(0):
+            middleware(request)
+        # Cache kosong: satu query Karyawan, instance-nya dipakai ulang untuk request.profile
+        with self.assertNumQueries(1):
+            self.assertEqual(request.role, 'admin')
+        with self.assertNumQueries(0):
+            self.assertEqual(request.profile.pk, self.karyawan.pk)
+
+    def test_middleware_role_saja_tanpa_query(self):
+        self.profil()  # Cache terisi (request sebelumnya)
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        UserProfileMiddleware(lambda req: HttpResponse())(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(request.role, 'admin')
+            self.assertFalse(manajer_check(request.user))
+        with self.assertNumQueries(1):
+            self.assertEqual(request.profile.pk, self.karyawan.pk)
+
+    def test_login_tidak_menghapus_cache(self):
+        self.profil()
+        self.client.login(username='adm@test.com', password='x')
+        self.assertEqual(cache.get(PROFILE_CACHE_KEY.format(self.user.pk)), ('karyawan', self.karyawan.pk, 'admin'))
+
+
+# ==========================================
+# ANTREAN JOB (KLAIM, JOB MACET, LOOP WORKER)
+# ==========================================
+
+class AntreanTest(TestCase):
+    """
+    core/antrean.py dipakai bersama antrean PDF, email, export dan gambar.
+    """
+
+    def buat_gambar(self, jumlah):
+        return [GambarJob.objects.create(sumber='dokumen', path_asli=f'blob/aa/{i}.jpg') for i in range(jumlah)]
+
+    def test_klaim_tidak_dobel(self):
+        jobs = self.buat_gambar(3)
+        pertama = klaim(GambarJob, 2)
+        self.assertEqual([j.pk for j in pertama], [j.pk for j in jobs[:2]])
+        self.assertEqual({j.status for j in pertama}, {'processing'})
+        self.assertEqual([j.pk for j in klaim(GambarJob, 2)], [jobs[2].pk])
+        self.assertEqual(klaim(GambarJob, 2), [])
+
+    def test_klaim_dengan_kondisi_dan_status_proses(self):
+        kirim_notifikasi_email('Sekarang', '<p>Hi</p>', 'a@test.com')
+        nanti = kirim_notifikasi_email('Nanti', '<p>Hi</p>', 'a@test.com')
+        OutboundEmail.objects.filter(pk=nanti.pk).update(jadwal_kirim=datetime.datetime.now() + datetime.timedelta(hours=1))
+        diklaim = klaim(OutboundEmail, 10, status_proses='sending', urutan='jadwal_kirim', jadwal_kirim__lte=datetime.datetime.now())
+        self.assertEqual([(e.subjek, e.status) for e in diklaim], [('Sekarang', 'sending')])
+
+    def test_reset_macet(self):
+        lama, baru = self.buat_gambar(2)
+        GambarJob.objects.update(status='processing', path_hasil='blob/aa/x.webp')
+        GambarJob.objects.filter(pk=lama.pk).update(updated_at=datetime.datetime.now() - datetime.timedelta(minutes=11))
+        self.assertEqual(reset_macet(GambarJob, path_hasil=None), 1)
+        self.assertEqual(
+            list(GambarJob.objects.order_by('pk').values_list('status', 'path_hasil')),
+            [('pending', None), ('processing', 'blob/aa/x.webp')]
+        )
+
+    def test_worker_sekali(self):
+        # Job macet diantrekan ulang, diproses (file tidak ada -> failed), lalu berhenti karena kosong
+        job, = self.buat_gambar(1)
+        GambarJob.objects.update(status='processing', updated_at=datetime.datetime.now() - datetime.timedelta(hours=1))
+        out = io.StringIO()
+        call_command('gambar_worker', sekali=True, stdout=out)
+        self.assertIn('1 gambar macet diantrekan ulang', out.getvalue())
+        self.assertIn('1 gambar diproses', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_email_worker_sekali(self):
+        kirim_notifikasi_email('Halo', '<p>Hi</p>', 'a@test.com')
+        call_command('email_worker', sekali=True, per_menit=0, stdout=io.StringIO())
+        self.assertEqual([m.subject for m in mail.outbox], ['Halo'])
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+
+# ==========================================
+# ANTREAN PDF (WORKER)
+# ==========================================
+
+class TempPdfCacheMixin:
+    """
+    Arahkan PDF_CACHE_DIR ke folder sementara selama test.
+    """
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+@override_settings(PDF_JOB_MAKS_PERCOBAAN=2)
+class PdfJobTest(TempPdfCacheMixin, TestCase):
+    """
+    Render PDF pindah ke pdf_worker; view hanya menyimpan PdfJob.
+    Test memakai ThreadPoolExecutor agar html_ke_pdf bisa di-mock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_user(username='adm@test.com', email='adm@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Admin', email='adm@test.com', role='staff_admin')
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+
+    def test_verifikasi_tidak_render_pdf(self):
+        self.client.force_login(self.admin_user)
+        with mock.patch('core.utils.html_ke_pdf') as html_ke_pdf, mock.patch('core.views.staff_admin_views.kirim_email_template') as kirim:
+            response = self.client.post(f'/staff/verifikasi/{self.permohonan.id}/', {'action': 'verify', 'biaya_resmi': '5000'})
+
+        self.assertEqual(response.status_code, 302)
+        html_ke_pdf.assert_not_called()
+        kirim.assert_not_called()
+        job = PdfJob.objects.get()
+        self.assertEqual((job.jenis, job.status, job.email_tujuan), ('invoice', 'pending', 'plg@test.com'))
+
+    def buat_job(self):
+        pembayaran = Pembayaran.objects.create(nomor_invoice='INV-1', permohonan=self.permohonan, total_biaya=1000)
+        return antrekan_pdf_email('struk', pembayaran, 'Lunas', '<p>ok</p>', 'plg@test.com', 'Struk.pdf')
+
+    def test_worker_lampirkan_pdf(self):
+        job = self.buat_job()
+        with ThreadPoolExecutor(1) as pool, \
+                mock.patch('core.pdf_jobs.html_ke_pdf', return_value=b'%PDF-1.4'), \
+                mock.patch('core.pdf_jobs.kirim_notifikasi_email') as kirim:
+            self.assertEqual(proses_antrean(pool, 10), 1)
+            self.assertEqual(proses_antrean(pool, 10), 0)
+
+        kirim.assert_called_once_with('Lunas', '<p>ok</p>', 'plg@test.com', b'%PDF-1.4', 'Struk.pdf')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    def test_worker_pakai_cache(self):
+        # Job kedua untuk data yang sama tidak dirender ulang
+        self.buat_job()
+        with ThreadPoolExecutor(1) as pool, \
+                mock.patch('core.pdf_jobs.html_ke_pdf', return_value=b'%PDF-1.4') as html_ke_pdf, \
+                mock.patch('core.pdf_jobs.kirim_notifikasi_email'):
+            proses_antrean(pool, 10)
+            antrekan_pdf_email('struk', Pembayaran.objects.get(), 'Lunas', '<p>ok</p>', 'plg@test.com', 'Struk.pdf')
+            proses_antrean(pool, 10)
+
+        self.assertEqual(html_ke_pdf.call_count, 1)
+        self.assertEqual(PdfJob.objects.filter(status='done').count(), 2)
+
+    def test_worker_gagal_dicoba_ulang(self):
+        job = self.buat_job()
+        with ThreadPoolExecutor(1) as pool, \
+                mock.patch('core.pdf_jobs.html_ke_pdf', return_value=None), \
+                mock.patch('core.pdf_jobs.kirim_notifikasi_email') as kirim:
+            proses_antrean(pool, 10)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.percobaan), ('pending', 1))
+            self.assertGreater(job.tersedia_pada, datetime.datetime.now() + datetime.timedelta(seconds=20))
+            kirim.assert_not_called()
+
+            # Belum jatuh tempo -> tidak diklaim, tidak dirender ulang
+            self.assertEqual(proses_antrean(pool, 10), 0)
+            PdfJob.objects.update(tersedia_pada=datetime.datetime.now())
+            self.assertEqual(proses_antrean(pool, 10), 1)
+
+        # Percobaan habis: email tetap terkirim tanpa lampiran
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.percobaan), ('failed', 2))
+        kirim.assert_called_once_with('Lunas', '<p>ok</p>', 'plg@test.com')
+
+
+# ==========================================
+# CACHE PDF (DISK + ETag)
+# ==========================================
+
+class PdfCacheTest(TempPdfCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manajer = User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Bos', email='mgr@test.com', role='manajer')
+
+    def test_kunci_berubah_jika_data_berubah(self):
+        waktu = datetime.datetime(2025, 1, 1, 10, 0)
+        self.assertEqual(kunci_pdf('a.html', 1, waktu), kunci_pdf('a.html', 1, waktu))
+        self.assertNotEqual(kunci_pdf('a.html', 1, waktu), kunci_pdf('a.html', 1, waktu + datetime.timedelta(seconds=1)))
+        self.assertNotEqual(kunci_pdf('a.html', 1, waktu), kunci_pdf('b.html', 1, waktu))
+
+    def test_gusur_lru(self):
+        for i, kunci in enumerate(['aa1', 'bb2', 'cc3']):
+            simpan_pdf(kunci, b'x' * 100)
+            path = os.path.join(self.cache_dir, kunci[:2], f'{kunci}.pdf')
+            os.utime(path, (1000 + i, 1000 + i))
+
+        # 'aa1' baru dipakai -> jadi yang paling baru, 'bb2' paling lama
+        self.assertEqual(ambil_pdf('aa1'), b'x' * 100)
+        self.assertEqual(gusur_lru(batas_bytes=200), 1)
+        self.assertIsNone(ambil_pdf('bb2'))
+        self.assertIsNotNone(ambil_pdf('aa1'))
+        self.assertIsNotNone(ambil_pdf('cc3'))
+
+    def test_render_gagal_dicatat_ke_logger(self):
+        with self.assertLogs('core.utils', level='ERROR') as log:
+            self.assertIsNone(render_to_pdf('core/pdf/tidak_ada.html', {}))
+        self.assertIn('core/pdf/tidak_ada.html', log.output[0])
+        self.assertIn('TemplateDoesNotExist', log.output[0])
+
+    @override_settings(PDF_CACHE_GUSUR_SETIAP=3)
+    def test_gusur_lru_tiap_n_tulis(self):
+        with mock.patch.object(pdf_cache, '_jumlah_simpan', itertools.count(1)), \
+                mock.patch.object(pdf_cache, 'gusur_lru') as gusur:
+            for i in range(7):
+                simpan_pdf(f'aa{i}', b'x')
+        self.assertEqual(gusur.call_count, 2)
+
+    def test_laporan_dari_cache_dan_etag(self):
+        self.client.force_login(self.manajer)
+        url = '/manajer/cetak-laporan/?periode=bulanan&print=1'
+        with mock.patch('core.views.manajer_views.render_to_pdf', return_value=b'%PDF-1.4') as render:
+            pertama = self.client.get(url)
+            kedua = self.client.get(url)
+            tidak_berubah = self.client.get(url, HTTP_IF_NONE_MATCH=pertama['ETag'])
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(pertama.content, b'%PDF-1.4')
+        self.assertEqual(kedua.content, b'%PDF-1.4')
+        self.assertEqual(kedua['ETag'], pertama['ETag'])
+        self.assertEqual(tidak_berubah.status_code, 304)
+
+
+# ==========================================
+# ANTREAN EMAIL (OUTBOUND EMAIL)
+# ==========================================
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_MAKS_PERCOBAAN=2, EMAIL_RETRY_DETIK=30
+)
+class OutboundEmailTest(TestCase):
+    """
+    kirim_notifikasi_email hanya menyimpan antrean; email_worker mengirim
+    (locmem backend menggantikan SMTP).
+    """
+
+    def test_kirim_notifikasi_hanya_antre(self):
+        kirim_notifikasi_email('Halo', '<p>Hi</p>', 'a@test.com', b'%PDF', 'Invoice.pdf')
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.daftar_tujuan), ('pending', ['a@test.com']))
+
+    def test_batch_satu_koneksi(self):
+        for i in range(3):
+            kirim_notifikasi_email(f'Email {i}', '<p>Hi</p>', [f'{i}@test.com', 'cc@test.com'], b'%PDF' if i == 0 else None)
+
+        pengirim = PengirimEmail(per_menit=0)
+        with mock.patch('core.email_queue.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(pengirim.kirim_batch(10), 3)
+            self.assertEqual(pengirim.kirim_batch(10), 0)
+
+        get_connection.assert_called_once()
+        self.assertEqual([m.subject for m in mail.outbox], ['Email 0', 'Email 1', 'Email 2'])
+        self.assertEqual(mail.outbox[0].to, ['0@test.com', 'cc@test.com'])
+        self.assertEqual(mail.outbox[0].attachments[0][1], b'%PDF')
+        self.assertEqual(OutboundEmail.objects.filter(status='sent').count(), 3)
+
+    def test_retry_backoff_lalu_gagal(self):
+        email = kirim_notifikasi_email('Halo', '<p>Hi</p>', 'a@test.com')
+        pengirim = PengirimEmail(per_menit=0)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            pengirim.kirim_batch(10)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.percobaan), ('pending', 1))
+            self.assertGreater(email.jadwal_kirim, datetime.datetime.now() + datetime.timedelta(seconds=20))
+
+            # Belum jatuh tempo -> tidak diambil
+            self.assertEqual(pengirim.kirim_batch(10), 0)
+
+            OutboundEmail.objects.update(jadwal_kirim=datetime.datetime.now())
+            pengirim.kirim_batch(10)
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.percobaan, email.pesan_error), ('failed', 2, 'SMTP down'))
+
+    def test_rate_limit(self):
+        for i in range(3):
+            kirim_notifikasi_email(f'Email {i}', '<p>Hi</p>', 'a@test.com')
+        sleep = mock.Mock()
+        PengirimEmail(per_menit=30, sleep=sleep).kirim_batch(10)
+
+        # 30/menit = jeda 2 detik antar email (email pertama tidak menunggu)
+        self.assertEqual(sleep.call_count, 2)
+        for call in sleep.call_args_list:
+            self.assertAlmostEqual(call.args[0], 2, delta=0.5)
+
+
+
+# ==========================================
+# TEMPLATE EMAIL (CSS INLINE + TEXT/PLAIN)
+# ==========================================
+
+class EmailTemplateTest(TestCase):
+    """
+    Email dirender dari core/templates/core/email/, CSS di-inline saat template di-load.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko <b>', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(
+            kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan, nomor_resi='JNE123'
+        )
+        cls.pembayaran = Pembayaran.objects.create(
+            nomor_invoice='INV-PMH-1', permohonan=cls.permohonan, total_biaya=150000, status_pembayaran='pending'
+        )
+
+    def context(self):
+        return {'nama': 'Eko', 'permohonan': self.permohonan, 'pembayaran': self.pembayaran, 'daftar_perbaikan': []}
+
+    def test_inline_css(self):
+        rules = [('box', 'padding: 15px'), ('box-warning', 'color: red')]
+        html = inline_css('<div class="box box-warning" style="margin: 0"><p>Hi</p></div>', rules)
+        self.assertEqual(html, '<div style="padding: 15px; color: red; margin: 0;"><p>Hi</p></div>')
+
+    def test_semua_template_tanpa_class(self):
+        for nama in EMAIL_TEMPLATES:
+            with self.subTest(nama=nama):
+                subjek, html = render_email(nama, self.context())
+                self.assertNotIn('class="', html)
+                self.assertIn('style="', html)
+                self.assertNotIn('{', subjek)
+
+    @override_settings(SITE_URL='https://birojasa.example')
+    def test_link_dan_autoescape(self):
+        subjek, html = render_email('tagihan_terbit', self.context())
+        self.assertEqual(subjek, 'Tagihan Terbit: PMH-1')
+        self.assertIn(f'https://birojasa.example/tagihan/{self.permohonan.id}/', html)
+        self.assertIn('Rp 150.000', html)
+        self.assertIn('Eko &lt;b&gt;', html)
+
+    def test_multipart_alternative(self):
+        kirim_email_template('update_status', 'plg@test.com', {'permohonan': self.permohonan})
+        email = OutboundEmail.objects.get()
+        self.assertIn('Menunggu Verifikasi', email.pesan_teks)
+        self.assertNotIn('<', email.pesan_teks.replace('Eko <b>', ''))
+
+        PengirimEmail(per_menit=0).kirim_batch(10)
+        pesan = mail.outbox[0]
+        self.assertEqual(pesan.body, email.pesan_teks)
+        self.assertEqual(pesan.alternatives[0][1], 'text/html')
+
+
+
+# ==========================================
+# ROLLUP STATISTIK HARIAN
+# ==========================================
+
+class DailyStatsTest(TestCase):
+    """
+    Rollup ikut diperbarui di save()/delete, dan sama dengan hasil rebuild_stats.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manajer = User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Bos', email='mgr@test.com', role='manajer')
+        cls.pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        cls.layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+
+    def buat_permohonan(self, kode):
+        return Permohonan.objects.create(kode_permohonan=kode, pelanggan=self.pelanggan, layanan=self.layanan)
+
+    def bayar(self, permohonan, total, metode='Tunai'):
+        pembayaran = Pembayaran.objects.create(nomor_invoice=f'INV-{permohonan}', permohonan=permohonan, total_biaya=total)
+        pembayaran = Pembayaran.objects.get(pk=pembayaran.pk)
+        pembayaran.status_pembayaran = 'paid'
+        pembayaran.metode_pembayaran = metode
+        pembayaran.save()
+        return pembayaran
+
+    def rollup(self):
+        return (
+            sorted(DailyStats.objects.filter(jumlah_permohonan__gt=0).values_list('tanggal', 'layanan_id', 'status_proses', 'jumlah_permohonan')),
+            sorted(DailyPendapatan.objects.filter(jumlah_transaksi__gt=0).values_list('tanggal', 'layanan_id', 'metode_pembayaran', 'jumlah_transaksi', 'total_pemasukan')),
+        )
+
+    def test_save_memperbarui_rollup(self):
+        Status = Permohonan.Status
+        pertama = self.buat_permohonan('PMH-1')
+        self.buat_permohonan('PMH-2')
+        self.assertEqual(DailyStats.objects.get().jumlah_permohonan, 2)
+
+        pertama = Permohonan.objects.get(pk=pertama.pk)
+        pertama.ubah_status(Status.DITOLAK)
+        pertama.save()
+        pertama.save()  # Simpan ulang tanpa perubahan tidak menghitung dobel
+        self.assertEqual(
+            dict(DailyStats.objects.values_list('status_proses', 'jumlah_permohonan')),
+            {Status.MENUNGGU_VERIFIKASI: 1, Status.DITOLAK: 1}
+        )
+
+        pembayaran = self.bayar(pertama, 150000)
+        pembayaran.save()
+        pendapatan = DailyPendapatan.objects.get()
+        self.assertEqual((pendapatan.metode_pembayaran, pendapatan.jumlah_transaksi, pendapatan.total_pemasukan), ('Tunai', 1, 150000))
+
+    def test_instance_basi_disimpan_berurutan(self):
+        Status = Permohonan.Status
+        permohonan = self.buat_permohonan('PMH-1')
+        pertama = Permohonan.objects.get(pk=permohonan.pk)
+        kedua = Permohonan.objects.get(pk=permohonan.pk)
+        pertama.ubah_status(Status.DITOLAK)
+        pertama.save()
+        # `kedua` dimuat saat masih Menunggu Verifikasi; yang dikurangi tetap baris Ditolak
+        kedua.ubah_status(Status.REVISI)
+        kedua.save()
+        self.assertEqual(
+            dict(DailyStats.objects.filter(jumlah_permohonan__gt=0).values_list('status_proses', 'jumlah_permohonan')),
+            {Status.REVISI: 1}
+        )
+        self.assertFalse(DailyStats.objects.filter(jumlah_permohonan__lt=0).exists())
+
+        pembayaran = Pembayaran.objects.create(nomor_invoice='INV-1', permohonan=permohonan, total_biaya=1000)
+        pertama = Pembayaran.objects.get(pk=pembayaran.pk)
+        kedua = Pembayaran.objects.get(pk=pembayaran.pk)
+        pertama.status_pembayaran = 'paid'
+        pertama.save()
+        kedua.status_pembayaran = 'paid'
+        kedua.total_biaya = 2000
+        kedua.save()
+        pendapatan = DailyPendapatan.objects.get()
+        self.assertEqual((pendapatan.jumlah_transaksi, pendapatan.total_pemasukan), (1, 2000))
+
+    def test_delete_cascade_mengurangi_rollup(self):
+        self.bayar(self.buat_permohonan('PMH-1'), 150000)
+        self.pelanggan.delete()
+        self.assertEqual(self.rollup(), ([], []))
+
+    def test_rebuild_sama_dengan_rollup_live(self):
+        self.bayar(self.buat_permohonan('PMH-1'), 150000)
+        self.bayar(self.buat_permohonan('PMH-2'), 50000, metode=None)
+        self.buat_permohonan('PMH-3')
+        live = self.rollup()
+
+        DailyStats.objects.all().delete()
+        DailyPendapatan.objects.all().delete()
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(self.rollup(), live)
+
+    def test_baris_hilang_dibuat_dari_data_saat_delta_negatif(self):
+        Status = Permohonan.Status
+        pertama = self.buat_permohonan('PMH-1')
+        self.buat_permohonan('PMH-2')
+        self.bayar(self.buat_permohonan('PMH-3'), 150000)
+        pembayaran = self.bayar(self.buat_permohonan('PMH-4'), 50000)
+        # Rollup belum di-backfill untuk data lama
+        DailyStats.objects.all().delete()
+        DailyPendapatan.objects.all().delete()
+
+        pertama.ubah_status(Status.DITOLAK)
+        pertama.save()
+        pembayaran.status_pembayaran = 'pending'
+        pembayaran.save()
+
+        hari_ini = datetime.date.today()
+        self.assertEqual(self.rollup(), (
+            [(hari_ini, self.layanan.id, Status.MENUNGGU_VERIFIKASI, 3), (hari_ini, self.layanan.id, Status.DITOLAK, 1)],
+            [(hari_ini, self.layanan.id, 'Tunai', 1, 150000)],
+        ))
+
+    def test_migrasi_backfill_sama_dengan_rollup_live(self):
+        from django.apps import apps
+        from importlib import import_module
+        self.bayar(self.buat_permohonan('PMH-1'), 150000)
+        self.bayar(self.buat_permohonan('PMH-2'), 50000, metode=None)
+        live = self.rollup()
+
+        DailyStats.objects.all().delete()
+        DailyPendapatan.objects.all().delete()
+        import_module('core.migrations.0021_backfill_daily_stats').backfill_rollup(apps, None)
+        self.assertEqual(self.rollup(), live)
+
+    def test_dashboard_membaca_rollup(self):
+        self.bayar(self.buat_permohonan('PMH-1'), 150000)
+        self.buat_permohonan('PMH-2')
+        self.client.force_login(self.manajer)
+        response = self.client.get('/manajer/dashboard/')
+        self.assertEqual((response.context['total_permohonan'], response.context['total_uang']), (2, 150000))
+        self.assertEqual([stat['jumlah'] for stat in response.context['status_stats']], [2])
+
+
+class LaporanGabunganTest(TestCase):
+    """
+    Preview HTML dan PDF memakai konteks_laporan_gabungan yang sama (3 query statistik).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        stnk = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        bpkb = Layanan.objects.create(kode_layanan='LAY-2', nama_layanan='BPKB', harga_jasa=1000)
+        Status = Permohonan.Status
+        for i, (layanan, status, total) in enumerate([
+            (stnk, Status.SELESAI, 100000), (stnk, Status.DITOLAK, None), (stnk, Status.DIPROSES, 50000), (bpkb, Status.SELESAI, 25000),
+        ]):
+            permohonan = Permohonan.objects.create(kode_permohonan=f'PMH-{i}', pelanggan=pelanggan, layanan=layanan, status_proses=status)
+            if total:
+                Pembayaran.objects.create(
+                    nomor_invoice=f'INV-{i}', permohonan=permohonan, total_biaya=total,
+                    status_pembayaran='paid', metode_pembayaran='Tunai' if i else 'QRIS'
+                )
+
+    def test_periode(self):
+        today = datetime.date(2024, 12, 18)
+        self.assertEqual(periode_laporan('bulanan', today=today)[:2], (datetime.date(2024, 12, 1), datetime.date(2024, 12, 31)))
+        self.assertEqual(periode_laporan('mingguan', today=today)[:2], (datetime.date(2024, 12, 16), datetime.date(2024, 12, 22)))
+        # Custom tanpa tanggal -> bulan ini
+        self.assertEqual(periode_laporan('custom', today=today), periode_laporan('bulanan', today=today))
+        for start, end in (('2024-13-01', '2024-12-31'), ('kemarin', '2024-12-31'), ('2024-12-31', '2024-12-01')):
+            with self.subTest(start=start, end=end), self.assertRaises(ValueError):
+                periode_laporan('custom', start, end, today)
+
+    def test_tanggal_tidak_valid_kembali_ke_bulan_ini(self):
+        User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Manajer', email='mgr@test.com', role='manajer')
+        self.client.login(username='mgr@test.com', password='x')
+        response = self.client.get('/manajer/cetak-laporan/', {'periode': 'custom', 'start_date': '2024-02-30', 'end_date': '2024-03-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['periode'], 'bulanan')
+        self.assertEqual(response.context['label_periode'], periode_laporan('bulanan')[2])
+        self.assertIn('Tanggal periode tidak valid', str(list(get_messages(response.wsgi_request))[0]))
+
+    def test_statistik_tiga_query(self):
+        today = datetime.date.today()
+        with self.assertNumQueries(3):
+            context = konteks_laporan_gabungan(today, today)
+
+        self.assertEqual(
+            (context['total_permohonan'], context['permohonan_selesai'], context['permohonan_diproses'], context['permohonan_ditolak']),
+            (4, 2, 1, 1)
+        )
+        self.assertEqual([(s['layanan__nama_layanan'], s['jumlah_count']) for s in context['layanan_stats']], [('STNK', 3), ('BPKB', 1)])
+        self.assertEqual((context['total_transaksi'], context['total_pemasukan']), (3, 175000))
+        self.assertEqual([(s['metode_pembayaran'], s['total_bayar']) for s in context['metode_stats']], [('QRIS', 100000), ('Tunai', 75000)])
+
+    def test_daftar_pdf_tanpa_n_plus_1(self):
+        today = datetime.date.today()
+        context = konteks_laporan_gabungan(today, today, dengan_daftar=True)
+        with self.assertNumQueries(2):
+            nama = [p.pelanggan.nama + p.layanan.nama_layanan for p in context['permohonan_list']]
+            nama += [b.permohonan.pelanggan.nama for b in context['pembayaran_list']]
+        self.assertEqual(len(nama), 7)
+
+
+class ExportCsvTest(TestCase):
+    """
+    Export CSV laporan keuangan di-stream per chunk tanpa query per baris.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manajer = User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Bos', email='mgr@test.com', role='manajer')
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko, S.T.', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        for i in range(5):
+            permohonan = Permohonan.objects.create(kode_permohonan=f'PMH-{i}', pelanggan=pelanggan, layanan=layanan)
+            Pembayaran.objects.create(nomor_invoice=f'INV-{i}', permohonan=permohonan, total_biaya=1000 * i, status_pembayaran='paid')
+        # Semua updated_at sama -> urutan antar chunk ditentukan id
+        Pembayaran.objects.update(updated_at=datetime.datetime(2025, 1, 2, 9, 0))
+
+    def test_streaming_per_chunk(self):
+        self.client.force_login(self.manajer)
+        with mock.patch('core.views.manajer_views.CSV_CHUNK_SIZE', 2):
+            response = self.client.get('/manajer/laporan/?export=1')
+            self.assertTrue(response.streaming)
+            # 5 baris, chunk 2 -> 3 query, tidak bertambah per baris
+            with self.assertNumQueries(3):
+                isi = b''.join(response.streaming_content).decode()
+
+        baris = isi.splitlines()
+        self.assertEqual(baris[0], 'No Invoice,Tanggal,Pelanggan,Total')
+        self.assertEqual(baris[1:], [f'INV-{i},02-01-2025,"Eko, S.T.",{1000 * i}' for i in reversed(range(5))])
+
+    def test_export_xlsx_hanya_manajer(self):
+        User.objects.create_user(username='keu@test.com', email='keu@test.com', password='x')
+        Karyawan.objects.create(kode_karyawan='KRY-2', nama='Keu', email='keu@test.com', role='keuangan')
+        self.client.login(username='keu@test.com', password='x')
+        response = self.client.get('/manajer/laporan/', {'export': 'xlsx', 'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+        self.assertRedirects(response, '/manajer/laporan/?start_date=2025-01-01&end_date=2025-01-31', fetch_redirect_response=False)
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertNotContains(self.client.get('/manajer/laporan/'), 'value="xlsx"')
+
+    def test_export_xlsx_tanggal_tidak_valid(self):
+        self.client.force_login(self.manajer)
+        response = self.client.get('/manajer/laporan/', {'export': 'xlsx', 'start_date': 'foo', 'end_date': '2025-01-31'})
+        self.assertRedirects(response, '/manajer/export/', fetch_redirect_response=False)
+        self.assertIn('Tanggal periode tidak valid', str(list(get_messages(response.wsgi_request))[0]))
+        job = ExportJob.objects.get()
+        self.assertEqual((job.start_date, job.end_date), periode_laporan('bulanan')[:2])
+
+
+# ==========================================
+# EXPORT LAPORAN (BACKGROUND)
+# ==========================================
+
+class ExportJobTest(TempPdfCacheMixin, TestCase):
+    """
+    Export besar diantrekan, dibuat export_worker, lalu diunduh lewat link bertanda tangan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        cls.manajer = Karyawan.objects.create(kode_karyawan='KRY-1', nama='Bos', email='mgr@test.com', role='manajer')
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        for i in range(5):
+            permohonan = Permohonan.objects.create(kode_permohonan=f'PMH-{i}', pelanggan=pelanggan, layanan=layanan)
+            Pembayaran.objects.create(nomor_invoice=f'INV-{i}', permohonan=permohonan, total_biaya=1000, status_pembayaran='paid')
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    def antrekan(self, format='csv'):
+        return antrekan_export('keuangan', format, 'Semua Periode', None, None, self.manajer)
+
+    def test_permintaan_identik_tidak_dobel(self):
+        job, baru = self.antrekan()
+        job_lagi, baru_lagi = self.antrekan()
+        self.assertTrue(baru)
+        self.assertFalse(baru_lagi)
+        self.assertEqual(job_lagi.pk, job.pk)
+
+        # Setelah selesai, permintaan yang sama membuat job baru
+        proses_export(ambil_export())
+        self.assertTrue(self.antrekan()[1])
+
+    def test_format_tidak_valid(self):
+        with self.assertRaises(ValueError):
+            antrekan_export('gabungan', 'csv', 'Semua Periode', None, None, self.manajer)
+
+    def test_worker_buat_csv(self):
+        self.antrekan()
+        job = proses_export(ambil_export())
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.progres, 100)
+        self.assertIsNone(job.kunci_aktif)
+        with job.file.open('rb') as f:
+            baris = f.read().decode().splitlines()
+        self.assertEqual(baris[0], 'No Invoice,Tanggal,Pelanggan,Total')
+        self.assertEqual(len(baris), 6)
+
+    def test_xlsx_tanpa_openpyxl_gagal_rapi(self):
+        self.antrekan('xlsx')
+        with mock.patch('core.export_jobs.openpyxl', None):
+            job = proses_export(ambil_export())
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('openpyxl', job.pesan_error)
+
+    def test_unduh_lewat_link(self):
+        self.antrekan()
+        job = proses_export(ambil_export())
+        self.client.force_login(self.user)
+
+        response = self.client.get(f'/manajer/export/unduh/{buat_link_token(job)}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'No Invoice'))
+
+        self.assertEqual(self.client.get('/manajer/export/unduh/palsu/').status_code, 404)
+        with override_settings(EXPORT_LINK_DETIK=-1):
+            response = self.client.get(f'/manajer/export/unduh/{buat_link_token(job)}/')
+        self.assertRedirects(response, '/manajer/export/')
+
+    def test_file_kedaluwarsa_dihapus(self):
+        self.antrekan()
+        job = proses_export(ambil_export())
+        path = job.file.path
+        ExportJob.objects.filter(pk=job.pk).update(kedaluwarsa_at=datetime.datetime.now() - datetime.timedelta(minutes=1))
+
+        self.assertEqual(hapus_export_kedaluwarsa(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(ExportJob.objects.get(pk=job.pk).status, 'expired')
+
+    def test_cetak_tahunan_diantrekan(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/manajer/cetak-laporan/?periode=tahunan&print=true')
+        self.assertRedirects(response, '/manajer/export/')
+        job = ExportJob.objects.get()
+        self.assertEqual((job.laporan, job.format, job.status), ('gabungan', 'pdf', 'pending'))
+
+        response = self.client.get('/manajer/export/')
+        self.assertContains(response, 'data-export-id')
+
+
+# ==========================================
+# GENERATOR KODE (HI/LO)
+# ==========================================
+
+class GeneratorKodeTest(TestCase):
+
+    def test_kode_tanpa_count(self):
+        generator = GeneratorKode()
+        tanggal = datetime.date(2025, 1, 2)
+        # Sisa blok disimpan setelah commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(generator.buat_kode('PMH', tanggal), 'PMH-20250102-0001')
+        with self.assertNumQueries(0):
+            kode = [generator.buat_kode('PMH', tanggal) for _ in range(19)]
+        self.assertEqual(kode[-1], 'PMH-20250102-0020')
+        # Blok habis -> ambil blok berikutnya tanpa COUNT(*): SAVEPOINT, UPDATE, SELECT nilai, RELEASE
+        with self.assertNumQueries(4):
+            self.assertEqual(generator.buat_kode('PMH', tanggal), 'PMH-20250102-0021')
+
+    def test_lanjut_dari_kode_lama(self):
+        Karyawan.objects.create(kode_karyawan='KRY-001', nama='A', email='a@test.com', role='manajer')
+        Karyawan.objects.create(kode_karyawan='KRY-7', nama='B', email='b@test.com', role='admin')
+        self.assertEqual(buat_kode('KRY'), 'KRY-008')
+        self.assertEqual(buat_kode('KRY'), 'KRY-009')
+
+    def test_rollback_tidak_memakai_ulang_blok(self):
+        generator = GeneratorKode()
+        tanggal = datetime.date(2025, 1, 2)
+        try:
+            with transaction.atomic():
+                generator.buat_kode('PMH', tanggal)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # Reservasi ikut rollback, sisa blok tidak disimpan di memori
+        self.assertEqual(generator.blok, {})
+        self.assertEqual(generator.buat_kode('PMH', tanggal), 'PMH-20250102-0001')
+
+class GeneratorKodeKonkurenTest(TransactionTestCase):
+    """
+    Beberapa "proses" (instance GeneratorKode masing-masing dengan koneksi
+    database sendiri) membuat kode bersamaan -> tidak ada kode dobel.
+    """
+
+    def test_tidak_ada_kode_dobel(self):
+        generators = [GeneratorKode() for _ in range(4)]
+        tanggal = datetime.date(2025, 1, 2)
+
+        def buat_kode_retry(generator):
+            # SQLite in-memory (database test) menolak writer kedua dengan "table is locked"
+            # alih-alih menunggu; transaksi yang gagal sudah rollback, cukup diulang
+            while True:
+                try:
+                    return generator.buat_kode('PMH', tanggal)
+                except OperationalError:
+                    time.sleep(0.001)
+
+        def buat_banyak(generator):
+            try:
+                return [buat_kode_retry(generator) for _ in range(60)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(generators)) as pool:
+            hasil = [kode for daftar in pool.map(buat_banyak, generators) for kode in daftar]
+
+        self.assertEqual(len(hasil), 240)
+        self.assertEqual(len(set(hasil)), 240)
+        self.assertEqual(KodeCounter.objects.get(prefix='PMH-20250102').nilai, 240)
+
+
+# ==========================================
+# FORM PENGAJUAN (ATOMIK + BULK INSERT)
+# ==========================================
+
+class FormPengajuanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='plg@test.com', email='plg@test.com', password='x')
+        Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        cls.layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.syarat = [MasterDokumen.objects.create(nama_dokumen=nama) for nama in ('KTP', 'BPKB', 'STNK Lama')]
+        for master in cls.syarat:
+            LayananDokumen.objects.create(layanan=cls.layanan, master_dokumen=master)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.client.force_login(self.user)
+
+    def kirim(self, syarat=None, isi=lambda master: b'%PDF-1.4 isi'):
+        data = {'metode_pengiriman': 'Ambil di Kantor', 'catatan': '-'}
+        for master in self.syarat if syarat is None else syarat:
+            data[f'file_{master.id}'] = SimpleUploadedFile(f'{master.id}.pdf', isi(master), content_type='application/pdf')
+        return self.client.post(f'/ajukan/{self.layanan.id}/', data)
+
+    def file_di_media(self):
+        folder = os.path.join(self.media_root, 'blob')
+        return [nama for _, _, files in os.walk(folder) for nama in files]
+
+    def test_semua_dokumen_tersimpan(self):
+        response = self.kirim()
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+
+        permohonan = Permohonan.objects.get()
+        dokumen = list(permohonan.berkas_upload.all())
+        self.assertEqual(len(dokumen), 3)
+        self.assertTrue(all(os.path.exists(d.path_file.path) for d in dokumen))
+        self.assertEqual(PermohonanAuditLog.objects.filter(permohonan=permohonan).count(), 1)
+
+    def test_upload_di_hash_saat_diterima_tanpa_dibaca_ulang(self):
+        # Storage tidak boleh membaca ulang file: hash & ukuran sudah dihitung upload handler
+        with mock.patch.object(BlobUploadedFile, 'chunks', side_effect=AssertionError('file dibaca ulang')):
+            response = self.kirim()
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+
+        digest = hashlib.sha256(b'%PDF-1.4 isi').hexdigest()
+        self.assertEqual(set(Dokumen.objects.values_list('path_file', flat=True)), {f'blob/{digest[:2]}/{digest[2:4]}/{digest}.pdf'})
+        self.assertEqual(BlobFile.objects.get().ukuran, len(b'%PDF-1.4 isi'))
+        self.assertEqual(self.file_di_media(), [f'{digest}.pdf'])  # File sementara .tmp sudah tidak ada
+
+    def test_jumlah_query_tidak_bergantung_jumlah_file(self):
+        def jumlah_query(syarat):
+            with CaptureQueriesContext(connection) as queries:
+                self.kirim(syarat, isi=lambda master: f'%PDF-1.4 {len(syarat)} {master.id}'.encode())
+            return len(queries)
+
+        self.kirim()  # Baris counter kode + rollup harian sudah ada untuk kedua pengukuran
+        self.assertEqual(jumlah_query(self.syarat[:1]), jumlah_query(self.syarat))
+        self.assertEqual(BlobFile.objects.count(), 5)
+
+    def test_handler_hash_hanya_di_view_dokumen(self):
+        # Setting bawaan tetap: upload di luar view Dokumen tidak ditulis ke blob/
+        from .uploads import terima_upload_dokumen
+
+        def view(request):
+            with request.FILES['f'] as f:
+                return type(f)
+
+        def request():
+            req = RequestFactory().post('/', {'f': SimpleUploadedFile('a.pdf', b'%PDF', content_type='application/pdf')})
+            req._dont_enforce_csrf_checks = True
+            return req
+
+        self.assertNotEqual(view(request()), BlobUploadedFile)
+        self.assertEqual(terima_upload_dokumen(view)(request()), BlobUploadedFile)
+
+    def test_csrf_tetap_dicek(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(f'/ajukan/{self.layanan.id}/', {'metode_pengiriman': 'Ambil di Kantor'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Permohonan.objects.exists())
+
+    def test_gagal_di_tengah_rollback_dan_file_dihapus(self):
+        with mock.patch('core.views.pelanggan_views.PermohonanAuditLog.objects.create', side_effect=RuntimeError('db putus')):
+            response = self.kirim()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Permohonan.objects.exists())
+        self.assertFalse(Dokumen.objects.exists())
+        self.assertFalse(DailyStats.objects.exists())
+        self.assertEqual(self.file_di_media(), [])
+
+
+# ==========================================
+# UPLOAD BERTAHAP (CHUNKED)
+# ==========================================
+
+@override_settings(UPLOAD_CHUNK_BYTES=4)
+class UploadBertahapTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='plg@test.com', email='plg@test.com', password='x')
+        Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        cls.layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+        LayananDokumen.objects.create(layanan=cls.layanan, master_dokumen=cls.ktp)
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=os.path.join(folder, 'media'), UPLOAD_CHUNK_DIR=os.path.join(folder, 'tmp'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.client.force_login(self.user)
+
+    def mulai(self, nama_file='ktp.jpg', ukuran=10):
+        return self.client.post('/upload/mulai/', {'nama_file': nama_file, 'ukuran': ukuran}, content_type='application/json')
+
+    def kirim_chunk(self, upload_id, offset, data):
+        return self.client.post(f'/upload/{upload_id}/', data, content_type='application/octet-stream', HTTP_X_UPLOAD_OFFSET=str(offset))
+
+    def upload(self, isi):
+        upload_id = self.mulai(ukuran=len(isi)).json()['id']
+        for offset in range(0, len(isi), 4):
+            self.kirim_chunk(upload_id, offset, isi[offset:offset + 4])
+        return upload_id
+
+    def test_lanjut_dari_offset_server(self):
+        response = self.mulai()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['id']
+
+        self.assertEqual(self.kirim_chunk(upload_id, 0, b'0123').json()['offset'], 4)
+        # Chunk yang sama dikirim ulang (respon sebelumnya hilang) -> 409 + offset server
+        response = self.kirim_chunk(upload_id, 0, b'0123')
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4))
+        # Setelah koneksi putus, client menanyakan offset lalu melanjutkan
+        self.assertEqual(self.client.get(f'/upload/{upload_id}/').json()['offset'], 4)
+        self.kirim_chunk(upload_id, 4, b'4567')
+        self.assertTrue(self.kirim_chunk(upload_id, 8, b'89').json()['selesai'])
+
+        upload = UploadSementara.objects.get(id=upload_id)
+        with open(upload.path, 'rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+    def test_validasi(self):
+        self.assertEqual(self.mulai(nama_file='virus.exe').status_code, 400)
+        with override_settings(UPLOAD_MAKS_BYTES=5):
+            self.assertEqual(self.mulai(ukuran=6).status_code, 413)
+        upload_id = self.mulai(ukuran=2).json()['id']
+        self.assertEqual(self.kirim_chunk(upload_id, 0, b'012').status_code, 413)
+
+    def test_form_memakai_id_upload(self):
+        upload_id = self.upload(b'isi foto ktp')
+        path = UploadSementara.objects.get(id=upload_id).path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/ajukan/{self.layanan.id}/', {
+                'metode_pengiriman': 'Ambil di Kantor', f'file_{self.ktp.id}_upload': upload_id
+            })
+
+        dokumen = Dokumen.objects.get()
+        with dokumen.path_file.open('rb') as f:
+            self.assertEqual(f.read(), b'isi foto ktp')
+        # File sementara dihapus setelah commit
+        self.assertFalse(UploadSementara.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_milik_user_lain_ditolak(self):
+        upload_id = self.upload(b'isi foto ktp')
+        lain = User.objects.create_user(username='lain@test.com', email='lain@test.com', password='x')
+        Pelanggan.objects.create(kode_pelanggan='PLG-2', nama='Lain', email='lain@test.com')
+        self.client.force_login(lain)
+
+        self.assertEqual(self.client.get(f'/upload/{upload_id}/').status_code, 404)
+        self.client.post(f'/ajukan/{self.layanan.id}/', {
+            'metode_pengiriman': 'Ambil di Kantor', f'file_{self.ktp.id}_upload': upload_id
+        })
+        self.assertFalse(Dokumen.objects.exists())
+
+
+# ==========================================
+# NORMALISASI GAMBAR + THUMBNAIL
+# ==========================================
+
+@override_settings(GAMBAR_MAKS_PX=1000, GAMBAR_THUMBNAIL_PX=(160, 120))
+class GambarJobTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        cls.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    def foto_hp(self, ukuran=(3000, 2000), orientasi=1):
+        img = Image.new('RGB', ukuran, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = orientasi  # Orientation
+        exif[0x010F] = 'Kamera HP'  # Make
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', exif=exif.tobytes())
+        return ContentFile(buf.getvalue(), name='foto.jpg')
+
+    def buat_dokumen(self, file):
+        dokumen = Dokumen(kode_dokumen=f'DOK-{Dokumen.objects.count()}', permohonan=self.permohonan, master_dokumen=self.ktp)
+        dokumen.path_file.save(file.name, file)
+        antrekan_gambar('dokumen', dokumen.path_file)
+        return dokumen
+
+    def test_diperkecil_tanpa_exif_dan_ada_thumbnail(self):
+        dokumen = self.buat_dokumen(self.foto_hp())
+        path_asli = dokumen.path_file.name
+
+        self.assertEqual(proses_antrean_gambar(10), 1)
+        dokumen.refresh_from_db()
+        self.assertEqual(GambarJob.objects.get().status, 'done')
+        self.assertFalse(default_storage.exists(path_asli))
+
+        with dokumen.path_file.open('rb') as f:
+            img = Image.open(f)
+            self.assertEqual(img.size, (1000, 667))
+            self.assertNotIn(0x010F, img.getexif())
+        with default_storage.open(path_thumbnail(dokumen.path_file.name), 'rb') as f:
+            self.assertEqual(Image.open(f).size, (160, 120))
+        self.assertTrue(thumbnail_url(dokumen.path_file).startswith('/media/thumbnail/'))
+
+    def test_orientasi_exif_diterapkan(self):
+        # Orientation 6 = foto HP tegak yang disimpan miring 90 derajat
+        dokumen = self.buat_dokumen(self.foto_hp(ukuran=(300, 200), orientasi=6))
+        proses_antrean_gambar(10)
+        dokumen.refresh_from_db()
+        with dokumen.path_file.open('rb') as f:
+            self.assertEqual(Image.open(f).size, (200, 300))
+
+    def test_pdf_tidak_diantrekan(self):
+        self.buat_dokumen(ContentFile(b'%PDF-1.4', name='scan.pdf'))
+        self.assertFalse(GambarJob.objects.exists())
+
+    def test_file_diganti_saat_diproses(self):
+        dokumen = self.buat_dokumen(self.foto_hp(ukuran=(300, 200)))
+        Dokumen.objects.filter(pk=dokumen.pk).update(path_file='dokumen_upload/baru.jpg')
+
+        proses_antrean_gambar(10)
+        dokumen.refresh_from_db()
+        # File baru milik user tidak ditimpa, hasil normalisasi file lama dibuang
+        self.assertEqual(dokumen.path_file.name, 'dokumen_upload/baru.jpg')
+        self.assertEqual([f for _, _, files in os.walk(default_storage.path('thumbnail')) for f in files], [])
+
+
+# ==========================================
+# PENYIMPANAN DEDUP (SHA-256)
+# ==========================================
+
+class DedupStorageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = [
+            Permohonan.objects.create(kode_permohonan=f'PMH-{i}', pelanggan=pelanggan, layanan=layanan) for i in range(2)
+        ]
+        cls.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    def upload(self, permohonan, isi, nama='ktp.pdf'):
+        dokumen = Dokumen(kode_dokumen=f'DOK-{Dokumen.objects.count()}', permohonan=permohonan, master_dokumen=self.ktp)
+        dokumen.path_file.save(nama, ContentFile(isi))
+        return dokumen
+
+    def test_isi_sama_disimpan_sekali(self):
+        pertama = self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        kedua = self.upload(self.permohonan[1], b'%PDF-1.4 scan ktp')
+        lain = self.upload(self.permohonan[1], b'%PDF-1.4 scan stnk')
+
+        self.assertEqual(pertama.path_file.name, kedua.path_file.name)
+        self.assertNotEqual(pertama.path_file.name, lain.path_file.name)
+        self.assertRegex(pertama.path_file.name, r'^blob/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.pdf$')
+        self.assertEqual(BlobFile.objects.get(nama=pertama.path_file.name).jumlah_referensi, 2)
+
+        laporan = laporan_dedup()
+        self.assertEqual(laporan['jumlah_blob'], 2)
+        self.assertEqual(laporan['jumlah_referensi'], 3)
+        self.assertEqual(laporan['bytes_hemat'], len(b'%PDF-1.4 scan ktp'))
+
+    def test_simpan_banyak_menambah_referensi_sekaligus(self):
+        pertama = self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        storage = pertama.path_file.storage
+        nama = storage.simpan_banyak([
+            ('a.pdf', ContentFile(b'%PDF-1.4 scan ktp')),
+            ('b.pdf', ContentFile(b'%PDF-1.4 scan stnk')),
+            ('c.pdf', ContentFile(b'%PDF-1.4 scan stnk')),
+        ])
+        self.assertEqual(nama[0], pertama.path_file.name)
+        self.assertEqual(nama[1], nama[2])
+        self.assertEqual(dict(BlobFile.objects.values_list('nama', 'jumlah_referensi')), {nama[0]: 2, nama[1]: 2})
+        self.assertEqual(sorted(os.listdir(os.path.dirname(storage.path(nama[1])))), [os.path.basename(nama[1])])
+        self.assertFalse([f for _, _, files in os.walk(storage.path('blob')) for f in files if f.endswith('.tmp')])
+
+    def test_file_dihapus_setelah_referensi_habis(self):
+        pertama = self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        kedua = self.upload(self.permohonan[1], b'%PDF-1.4 scan ktp')
+        path = pertama.path_file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pertama.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(BlobFile.objects.get().jumlah_referensi, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kedua.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(BlobFile.objects.exists())
+
+    def test_save_rollback_tidak_merusak_referensi(self):
+        pertama = self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        try:
+            with transaction.atomic():
+                self.upload(self.permohonan[1], b'%PDF-1.4 scan ktp')
+                raise RuntimeError('batal')
+        except RuntimeError:
+            pass
+        # Pembersihan seperti form_pengajuan_view: blob masih dipakai dokumen pertama
+        pertama.path_file.storage.delete(pertama.path_file.name)
+        self.assertTrue(os.path.exists(pertama.path_file.path))
+        self.assertEqual(BlobFile.objects.get().jumlah_referensi, 1)
+
+    def test_hitung_ulang_banyak_jumlah_query_tetap(self):
+        pertama = self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        storage = pertama.path_file.storage
+        try:
+            with transaction.atomic():
+                nama = storage.simpan_banyak([
+                    ('a.pdf', ContentFile(b'%PDF-1.4 scan ktp')),
+                    ('b.pdf', ContentFile(b'%PDF-1.4 scan stnk')),
+                    ('c.pdf', ContentFile(b'%PDF-1.4 scan bpkb')),
+                ])
+                raise RuntimeError('batal')
+        except RuntimeError:
+            pass
+        # SAVEPOINT, SELECT blob, COUNT pemakai, RELEASE: tidak per file (baris blob baru ikut rollback)
+        with self.assertNumQueries(4):
+            self.assertEqual(storage.hitung_ulang_banyak(nama), 2)
+        self.assertTrue(os.path.exists(pertama.path_file.path))
+        self.assertFalse(storage.exists(nama[1]) or storage.exists(nama[2]))
+        self.assertEqual(dict(BlobFile.objects.values_list('nama', 'jumlah_referensi')), {pertama.path_file.name: 1})
+
+    @override_settings(GAMBAR_MAKS_PX=100)
+    def test_normalisasi_memindahkan_semua_pemakai_blob(self):
+        buf = io.BytesIO()
+        Image.new('RGB', (300, 200), (0, 90, 200)).save(buf, 'JPEG')
+        dokumen = [self.upload(permohonan, buf.getvalue(), 'ktp.jpg') for permohonan in self.permohonan]
+        antrekan_gambar('dokumen', *(d.path_file for d in dokumen))
+        path_asli = dokumen[0].path_file.name
+
+        self.assertEqual(proses_antrean_gambar(10), 1)
+        for d in dokumen:
+            d.refresh_from_db()
+        self.assertEqual(dokumen[0].path_file.name, dokumen[1].path_file.name)
+        self.assertFalse(default_storage.exists(path_asli))
+        self.assertEqual(BlobFile.objects.get().jumlah_referensi, 2)
+
+        # Upload ulang file asli yang sama -> dinormalisasi lagi, bukan dilewati
+        baru = self.upload(self.permohonan[0], buf.getvalue(), 'ktp.jpg')
+        antrekan_gambar('dokumen', baru.path_file)
+        self.assertEqual(GambarJob.objects.get().status, 'pending')
+
+    def test_command_laporan(self):
+        self.upload(self.permohonan[0], b'%PDF-1.4 scan ktp')
+        self.upload(self.permohonan[1], b'%PDF-1.4 scan ktp')
+        out = io.StringIO()
+        call_command('laporan_dedup', stdout=out)
+        self.assertIn('(50.0%)', out.getvalue())
+
+class DedupStorageKonkurenTest(TransactionTestCase):
+    """
+    Upload blob yang sama berjalan bersamaan dengan penghapusan Dokumen lain
+    pemakai blob tersebut: +1 referensi sudah ditulis, baris Dokumen belum.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        self.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        self.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+
+    def dokumen(self, kode, isi):
+        return Dokumen(
+            kode_dokumen=kode, permohonan=self.permohonan, master_dokumen=self.ktp,
+            path_file=ContentFile(isi, name='ktp.pdf'),
+        )
+
+    def test_save_di_luar_transaksi_ditolak(self):
+        with self.assertRaises(TransactionManagementError):
+            self.dokumen('DOK-1', b'%PDF-1.4 scan ktp').save()
+        self.assertFalse(BlobFile.objects.exists())
+
+    def test_hapus_saat_upload_blob_sama_tidak_menghapus_file(self):
+        with transaction.atomic():
+            lama = self.dokumen('DOK-1', b'%PDF-1.4 scan ktp')
+            lama.save()
+        nama = lama.path_file.name
+
+        sudah_tambah = threading.Event()
+        asli = Dokumen.save
+
+        def simpan_lambat(dokumen, *args, **kwargs):
+            # Dipanggil FileField.pre_save setelah blob + referensi tersimpan, sebelum INSERT
+            sudah_tambah.set()
+            time.sleep(0.2)
+            return asli(dokumen, *args, **kwargs)
+
+        def upload():
+            try:
+                with transaction.atomic():
+                    baru = self.dokumen('DOK-2', b'%PDF-1.4 scan ktp')
+                    baru.path_file.save('ktp.pdf', baru.path_file.file, save=False)
+                    simpan_lambat(baru)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(1) as pool:
+            hasil = pool.submit(upload)
+            self.assertTrue(sudah_tambah.wait(5))
+            # SQLite menolak pembaca selama writer lain aktif -> diulang sampai upload commit
+            while True:
+                try:
+                    with transaction.atomic():
+                        Dokumen.objects.filter(pk=lama.pk).delete()
+                    lama.path_file.storage.delete(nama)
+                    break
+                except OperationalError:
+                    time.sleep(0.01)
+            hasil.result()
+
+        self.assertEqual(list(Dokumen.objects.values_list('kode_dokumen', 'path_file')), [('DOK-2', nama)])
+        self.assertTrue(os.path.exists(lama.path_file.path))
+        self.assertEqual(BlobFile.objects.get().jumlah_referensi, 1)
+
+
+# ==========================================
+# LAYOUT SHARD FILE UPLOAD
+# ==========================================
+
+class PindahFileShardTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        cls.permohonan_lain = Permohonan.objects.create(kode_permohonan='PMH-2', pelanggan=pelanggan, layanan=layanan)
+        cls.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    def file_lama(self, nama, isi):
+        # Tulis langsung ke path lama (tanpa upload_to), seperti data sebelum layout shard
+        path = default_storage.path(nama)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(isi)
+        return nama
+
+    def jalankan(self):
+        out = io.StringIO()
+        call_command('pindah_file_shard', batch=2, stdout=out)
+        return out.getvalue()
+
+    def test_upload_baru_langsung_di_shard(self):
+        pembayaran = Pembayaran.objects.create(nomor_invoice='INV-1', permohonan=self.permohonan, total_biaya=1000)
+        pembayaran.bukti_pembayaran.save('Bukti Transfer BCA.JPG', ContentFile(b'jpg'))
+        self.assertRegex(pembayaran.bukti_pembayaran.name, r'^bukti_bayar/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.jpg$')
+
+    def test_file_lama_dipindah_dan_bisa_dilanjutkan(self):
+        for i in range(3):
+            Dokumen.objects.create(
+                kode_dokumen=f'DOK-{i}', permohonan=self.permohonan, master_dokumen=self.ktp,
+                path_file=self.file_lama(f'dokumen_upload/lama-{i}.pdf', b'%PDF-1.4 ktp sama'),
+            )
+        self.file_lama('thumbnail/dokumen_upload/foto.webp', b'thumb')
+        Permohonan.objects.filter(pk=self.permohonan.pk).update(hasil_lapangan=self.file_lama('dokumen_upload/foto.webp', b'foto'))
+        pembayaran = Pembayaran.objects.create(
+            nomor_invoice='INV-1', permohonan=self.permohonan, total_biaya=1000,
+            bukti_pembayaran=self.file_lama('bukti_bayar/IMG 2024.jpg', b'bukti'),
+        )
+        Pembayaran.objects.create(
+            nomor_invoice='INV-2', permohonan=self.permohonan_lain, total_biaya=1000, bukti_pembayaran='bukti_bayar/hilang.jpg'
+        )
+
+        output = self.jalankan()
+        self.assertIn('5 file dipindah, 1 tidak ditemukan', output)
+
+        # Dokumen: tiga salinan lama isinya sama -> satu blob dedup
+        nama = set(Dokumen.objects.values_list('path_file', flat=True))
+        self.assertEqual(len(nama), 1)
+        self.assertTrue(nama.pop().startswith('blob/'))
+        self.assertEqual(BlobFile.objects.get().jumlah_referensi, 3)
+        self.assertFalse(default_storage.exists('dokumen_upload/lama-0.pdf'))
+
+        self.permohonan.refresh_from_db()
+        self.assertRegex(self.permohonan.hasil_lapangan.name, r'^dokumen_upload/../../[0-9a-f]{32}\.webp$')
+        self.assertFalse(default_storage.exists('dokumen_upload/foto.webp'))
+        self.assertTrue(default_storage.exists(path_thumbnail(self.permohonan.hasil_lapangan.name)))
+
+        pembayaran.refresh_from_db()
+        with pembayaran.bukti_pembayaran.open('rb') as f:
+            self.assertEqual(f.read(), b'bukti')
+
+        # Dijalankan ulang: hanya file yang memang hilang yang tersisa
+        self.assertIn('0 file dipindah, 1 tidak ditemukan', self.jalankan())
+
+    def test_blob_layout_satu_level_dipindah_ke_dua_level(self):
+        isi = b'%PDF-1.4 ktp lama'
+        digest = hashlib.sha256(isi).hexdigest()
+        lama = self.file_lama(f'blob/{digest[:2]}/{digest}.pdf', isi)
+        BlobFile.objects.create(nama=lama, sha256=digest, ukuran=len(isi), jumlah_referensi=2)
+        for i, permohonan in enumerate((self.permohonan, self.permohonan_lain)):
+            Dokumen.objects.create(kode_dokumen=f'DOK-{i}', permohonan=permohonan, master_dokumen=self.ktp, path_file=lama)
+
+        self.assertIn('Dokumen.path_file (blob/): 2 file dipindah', self.jalankan())
+
+        baru = f'blob/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+        self.assertEqual(set(Dokumen.objects.values_list('path_file', flat=True)), {baru})
+        self.assertEqual(list(BlobFile.objects.values_list('nama', 'jumlah_referensi')), [(baru, 2)])
+        self.assertFalse(default_storage.exists(lama))
+        with default_storage.open(baru, 'rb') as f:
+            self.assertEqual(f.read(), isi)
+
+    def test_baris_yang_berubah_di_tengah_tidak_ditimpa(self):
+        pembayaran = Pembayaran.objects.create(
+            nomor_invoice='INV-1', permohonan=self.permohonan, total_biaya=1000,
+            bukti_pembayaran=self.file_lama('bukti_bayar/lama.jpg', b'lama'),
+        )
+        from core import shard
+        asli = shard.siapkan_path_baru
+
+        def ganti_saat_disalin(field, nama_lama):
+            baru = asli(field, nama_lama)
+            Pembayaran.objects.filter(pk=pembayaran.pk).update(bukti_pembayaran='bukti_bayar/aa/bb/upload-baru.jpg')
+            return baru
+
+        with mock.patch('core.shard.siapkan_path_baru', side_effect=ganti_saat_disalin):
+            self.jalankan()
+        pembayaran.refresh_from_db()
+        self.assertEqual(pembayaran.bukti_pembayaran.name, 'bukti_bayar/aa/bb/upload-baru.jpg')
+        self.assertEqual([f for _, _, files in os.walk(default_storage.path('bukti_bayar')) for f in files], ['lama.jpg'])
+
+
+# ==========================================
+# GARBAGE COLLECTOR MEDIA
+# ==========================================
+
+class BersihkanMediaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        cls.permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        cls.ktp = MasterDokumen.objects.create(nama_dokumen='KTP')
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.karantina = os.path.join(folder, 'karantina')
+        override = override_settings(MEDIA_ROOT=os.path.join(folder, 'media'), MEDIA_KARANTINA_DIR=self.karantina)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+
+    def tulis(self, nama, umur_jam=48):
+        path = default_storage.path(nama)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'isi')
+        waktu = time.time() - umur_jam * 3600
+        os.utime(path, (waktu, waktu))
+        return nama
+
+    def test_hanya_file_yatim_yang_dikarantina(self):
+        dokumen = Dokumen(kode_dokumen='DOK-1', permohonan=self.permohonan, master_dokumen=self.ktp)
+        dokumen.path_file.save('ktp.jpg', ContentFile(b'foto ktp'))
+        Permohonan.objects.filter(pk=self.permohonan.pk).update(hasil_lapangan=self.tulis('dokumen_upload/aa/bb/baru.webp'))
+        thumb_dipakai = self.tulis(path_thumbnail(dokumen.path_file.name))
+
+        yatim = [
+            self.tulis('dokumen_upload/aa/bb/lama.webp'),  # Foto hasil lapangan yang ditimpa
+            self.tulis('thumbnail/dokumen_upload/aa/bb/lama.webp'),
+            self.tulis('blob/ff/' + 'f' * 64 + '.pdf'),  # Blob sisa cascade delete
+        ]
+        BlobFile.objects.create(nama=yatim[2], sha256='f' * 64, ukuran=3, jumlah_referensi=1)
+        baru_diupload = self.tulis('bukti_bayar/aa/bb/belum-commit.jpg', umur_jam=0)
+        cache = self.tulis('pdf_cache/ab/abc.pdf')
+
+        out = io.StringIO()
+        call_command('bersihkan_media', stdout=out)
+        self.assertIn('3 file yatim dikarantina', out.getvalue())
+
+        hari_ini = datetime.date.today().strftime('%Y%m%d')
+        for nama in yatim:
+            self.assertFalse(default_storage.exists(nama))
+            self.assertTrue(os.path.exists(os.path.join(self.karantina, hari_ini, nama)))
+        for nama in (dokumen.path_file.name, 'dokumen_upload/aa/bb/baru.webp', thumb_dipakai, baru_diupload, cache):
+            self.assertTrue(default_storage.exists(nama), nama)
+        self.assertFalse(BlobFile.objects.filter(nama=yatim[2]).exists())
+
+    def test_path_terpakai_hanya_satu_direktori(self):
+        from .gc_media import path_terpakai
+        for i, nama in enumerate(('blob/ab/1.pdf', 'blob/ab/2.jpg', 'blob/cd/3.pdf', 'dokumen_upload/lama.jpg', 'dokumen_upload/aa/bb/4.jpg')):
+            Dokumen.objects.create(kode_dokumen=f'DOK-{i}', permohonan=self.permohonan, master_dokumen=self.ktp, path_file=nama)
+
+        self.assertEqual(path_terpakai('blob/ab'), {'blob/ab/1.pdf', 'blob/ab/2.jpg'})
+        self.assertEqual(path_terpakai('dokumen_upload'), {'dokumen_upload/lama.jpg'})
+        self.assertEqual(path_terpakai('thumbnail/blob/ab'), {path_thumbnail('blob/ab/2.jpg')})
+        self.assertEqual(path_terpakai('thumbnail/dokumen_upload/aa/bb'), {path_thumbnail('dokumen_upload/aa/bb/4.jpg')})
+
+    def test_coba_tidak_memindahkan_file(self):
+        nama = self.tulis('dokumen_upload/aa/bb/lama.pdf')
+        out = io.StringIO()
+        call_command('bersihkan_media', coba=True, stdout=out)
+        self.assertIn('1 file yatim ditemukan', out.getvalue())
+        self.assertTrue(default_storage.exists(nama))
+
+    def test_karantina_lama_dihapus(self):
+        lama = os.path.join(self.karantina, '20200101')
+        os.makedirs(lama)
+        os.makedirs(os.path.join(self.karantina, datetime.date.today().strftime('%Y%m%d')))
+        call_command('bersihkan_media', stdout=io.StringIO())
+        self.assertEqual(os.listdir(self.karantina), [datetime.date.today().strftime('%Y%m%d')])
+
+
+# ==========================================
+# MEDIA BER-AUTENTIKASI (X-ACCEL-REDIRECT / RANGE)
+# ==========================================
+
+class MediaViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pemilik = User.objects.create_user(username='plg@test.com', email='plg@test.com', password='x')
+        cls.orang_lain = User.objects.create_user(username='lain@test.com', email='lain@test.com', password='x')
+        cls.admin = User.objects.create_user(username='adm@test.com', email='adm@test.com', password='x')
+        cls.manajer = User.objects.create_user(username='mgr@test.com', email='mgr@test.com', password='x')
+        pelanggan = Pelanggan.objects.create(kode_pelanggan='PLG-1', nama='Eko', email='plg@test.com')
+        Pelanggan.objects.create(kode_pelanggan='PLG-2', nama='Lain', email='lain@test.com')
+        Karyawan.objects.create(kode_karyawan='KRY-1', nama='Admin', email='adm@test.com', role='staff_admin')
+        Karyawan.objects.create(kode_karyawan='KRY-2', nama='Bos', email='mgr@test.com', role='manajer')
+        layanan = Layanan.objects.create(kode_layanan='LAY-1', nama_layanan='STNK', harga_jasa=1000)
+        permohonan = Permohonan.objects.create(kode_permohonan='PMH-1', pelanggan=pelanggan, layanan=layanan)
+        Dokumen.objects.create(
+            kode_dokumen='DOK-1', permohonan=permohonan, path_file='dokumen_upload/ktp.pdf',
+            master_dokumen=MasterDokumen.objects.create(nama_dokumen='KTP')
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_DELIVERY='django')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        for nama, isi in [('dokumen_upload/ktp.pdf', b'0123456789'), ('exports/a.csv', b'x'), ('pdf_cache/ab/c.pdf', b'x')]:
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, nama)), exist_ok=True)
+            with open(os.path.join(self.media_root, nama), 'wb') as f:
+                f.write(isi)
+
+    def get(self, user, url, **headers):
+        self.client.force_login(user)
+        return self.client.get(url, **headers)
+
+    def test_hak_akses(self):
+        self.assertEqual(self.client.get('/media/dokumen_upload/ktp.pdf').status_code, 302)  # Belum login
+        response = self.get(self.pemilik, '/media/dokumen_upload/ktp.pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.get(self.orang_lain, '/media/dokumen_upload/ktp.pdf').status_code, 404)
+        self.assertEqual(self.get(self.admin, '/media/dokumen_upload/ktp.pdf').status_code, 200)
+
+        self.assertEqual(self.get(self.admin, '/media/exports/a.csv').status_code, 404)
+        self.assertEqual(self.get(self.manajer, '/media/exports/a.csv').status_code, 200)
+        self.assertEqual(self.get(self.manajer, '/media/pdf_cache/ab/c.pdf').status_code, 404)
+        self.assertEqual(self.get(self.manajer, '/media/../config/settings.py').status_code, 404)
+
+    def test_range(self):
+        response = self.get(self.pemilik, '/media/dokumen_upload/ktp.pdf', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.get(self.pemilik, '/media/dokumen_upload/ktp.pdf', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.get(self.pemilik, '/media/dokumen_upload/ktp.pdf', HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+    @override_settings(MEDIA_DELIVERY='nginx', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_diserahkan_ke_nginx(self):
+        response = self.get(self.pemilik, '/media/dokumen_upload/ktp.pdf', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/dokumen_upload/ktp.pdf')
+        self.assertEqual(response.content, b'')
+        # Hak akses tetap dicek Django sebelum diserahkan
+        self.assertEqual(self.get(self.orang_lain, '/media/dokumen_upload/ktp.pdf').status_code, 404)
+
+
+# ==========================================
+# DATA SINTETIS (seed_data --scale)
+# ==========================================
+
+# Hash password cepat: seed_data membuat akun login
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedDataScaleTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    def seed(self, **options):
+        call_command('seed_data', scale=300, batch=70, hari=20, stdout=io.StringIO(), **options)
+        return Permohonan.objects.filter(kode_permohonan__contains='-S')
+
+    def test_data_sintetis_konsisten(self):
+        Status = Permohonan.Status
+        permohonan = self.seed()
+        self.assertEqual(permohonan.count(), 300)
+        self.assertGreater(len(set(permohonan.values_list('status_proses', flat=True))), 8)
+        self.assertLess(permohonan.order_by('created_at').first().created_at, datetime.datetime.now() - datetime.timedelta(days=15))
+
+        for item in permohonan.select_related('tagihan'):
+            punya_tagihan = Status.MENUNGGU_PEMBAYARAN <= item.status_proses < Status.DITOLAK
+            self.assertEqual(hasattr(item, 'tagihan'), punya_tagihan, item.kode_permohonan)
+            if punya_tagihan:
+                self.assertEqual(item.tagihan.status_pembayaran == 'paid', item.status_proses > Status.MENUNGGU_PEMBAYARAN)
+            self.assertEqual(item.karyawan_id is not None, Status.PROSES_LAPANGAN <= item.status_proses < Status.DITOLAK)
+
+        # Rollup & referensi blob ikut dibangun ulang
+        self.assertEqual(DailyStats.objects.aggregate(total=Sum('jumlah_permohonan'))['total'], Permohonan.objects.count())
+        self.assertTrue(DailyPendapatan.objects.exists())
+        for blob in BlobFile.objects.all():
+            self.assertEqual(blob.jumlah_referensi, Dokumen.objects.filter(path_file=blob.nama).count())
+            self.assertTrue(default_storage.exists(blob.nama))
+        self.assertTrue(AktivitasLogin.objects.filter(user__email__endswith='@seed.test').exists())
+        self.assertTrue(self.client.login(username='sintetis0000001@seed.test', password='password123'))
+
+    def test_seed_sama_menghasilkan_data_sama(self):
+        def ringkasan():
+            return list(self.seed(seed=7).order_by('id').values_list(
+                'status_proses', 'layanan_id', 'pelanggan__kode_pelanggan', 'tagihan__total_biaya'
+            ))
+        with transaction.atomic():
+            pertama = ringkasan()
+            transaction.set_rollback(True)
+        self.assertEqual(ringkasan(), pertama)
+
+    def test_tidak_bisa_seed_dua_kali(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+# ==========================================
+# BUDGET QUERY PER URL (REGRESI N+1)
+# ==========================================
+
+class QueryBudgetTest(TempPdfCacheMixin, TestCase):
+    """
+    Setiap URL di core/urls.py diakses dengan data sedikit, lalu lagi setelah
+    data ditambah. Jumlah query harus sama (tidak tumbuh dengan jumlah baris)
+    dan tidak melebihi budget. URL baru wajib ditambahkan ke BUDGET (GET) atau
+    BUDGET_POST, dan budget di sini tidak boleh melebihi budget middleware
+    (QUERY_BUDGET_MAKS / QUERY_BUDGET_VIEW di settings).
+    """
+    # nama URL (atau route jika tanpa nama) -> (email login, budget query)
+    BUDGET = {
+        'home': (None, 1),
+        'login': (None, 0),
+        'logout': ('pelanggan@test.com', 4),
+        'firebase_auth': (None, 0),
+        'dashboard': ('pelanggan@test.com', 5),
+        'pilih_layanan': ('pelanggan@test.com', 5),
+        'form_pengajuan': ('pelanggan@test.com', 6),
+        'tagihan': ('pelanggan@test.com', 8),
+        'konfirmasi_selesai': ('pelanggan@test.com', 10),
+        'detail_permohonan': ('pelanggan@test.com', 12),
+        'revisi_pengajuan': ('pelanggan@test.com', 9),
+        'edit_profil': ('pelanggan@test.com', 4),
+        'upload_mulai': ('pelanggan@test.com', 2),
+        'upload_chunk': ('pelanggan@test.com', 3),
+        'staff_dashboard': ('admin@test.com', 5),
+        'verifikasi_permohonan': ('admin@test.com', 8),
+        'tugaskan_staff': ('admin@test.com', 6),
+        'finalisasi_permohonan': ('admin@test.com', 6),
+        'cetak_bast': ('admin@test.com', 7),
+        'staff_riwayat_selesai': ('admin@test.com', 4),
+        'staff_input_walkin': ('admin@test.com', 4),
+        'staff_upload_arsip': ('admin@test.com', 7),
+        'tolak_permohonan': ('admin@test.com', 5),
+        'lapangan_dashboard': ('lapangan@test.com', 6),
+        'update_status_lapangan': ('lapangan@test.com', 4),
+        'lapangan_detail': ('lapangan@test.com', 11),
+        'lapangan_riwayat': ('lapangan@test.com', 4),
+        'keuangan_dashboard': ('keuangan@test.com', 6),
+        'cetak_struk': ('keuangan@test.com', 7),
+        'keuangan_riwayat': ('keuangan@test.com', 4),
+        'manajer/': ('manajer@test.com', 8),
+        'manajer_dashboard': ('manajer@test.com', 8),
+        'laporan_keuangan': ('manajer@test.com', 6),
+        'cetak_laporan_gabungan': ('manajer@test.com', 6),
+        'manajer_export': ('manajer@test.com', 4),
+        'export_status': ('manajer@test.com', 3),
+        'unduh_export': ('manajer@test.com', 3),
+        'manajer_karyawan_list': ('manajer@test.com', 4),
+        'manajer_karyawan_add': ('manajer@test.com', 3),
+        'manajer_karyawan_edit': ('manajer@test.com', 4),
+        'manajer_karyawan_delete': ('manajer@test.com', 3),
+        'master_layanan_list': ('manajer@test.com', 6),
+        'master_layanan_add': ('manajer@test.com', 3),
+        'master_layanan_edit': ('manajer@test.com', 4),
+        'master_layanan_requirements': ('manajer@test.com', 9),
+        'master_layanan_tahapan': ('manajer@test.com', 5),
+        'master_dokumen_list': ('manajer@test.com', 3),
+        'master_dokumen_add': ('manajer@test.com', 3),
+        'master_dokumen_edit': ('manajer@test.com', 4),
+        'master_dokumen_delete': ('manajer@test.com', 3),
+    }
+    # Request POST (form pengajuan, revisi, verifikasi, pembayaran) -> diukur dengan data_post()
+    # sebagai request pertama hari itu (lihat kosongkan_rollup)
+    BUDGET_POST = {
+        'form_pengajuan': ('pelanggan@test.com', 32),
+        'revisi_pengajuan': ('pelanggan@test.com', 20),
+        'verifikasi_permohonan': ('admin@test.com', 19),
+        'konfirmasi_lunas': ('keuangan@test.com', 23),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', stdout=io.StringIO())
+        cls.pelanggan = Pelanggan.objects.get(email='pelanggan@test.com')
+        cls.lapangan = Karyawan.objects.get(role='lapangan')
+        cls.layanan = Layanan.objects.get(kode_layanan='LAY-003')
+        cls.master = list(MasterDokumen.objects.all()[:3])
+        for master in cls.master:
+            LayananDokumen.objects.create(layanan=cls.layanan, master_dokumen=master)
+        cls.nomor = 0
+        cls.contoh = cls.tambah_transaksi(1)
+        cls.upload = UploadSementara.objects.create(user=User.objects.get(email='pelanggan@test.com'), nama_file='ktp.pdf', ukuran=10)
+        # Upload bertahap yang sudah selesai: form pengajuan mengirim id-nya (+ antrean gambar)
+        cls.upload_foto = UploadSementara.objects.create(
+            user=cls.upload.user, nama_file='stnk.jpg', ukuran=4, diterima=4, status='selesai'
+        )
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=media_root, UPLOAD_CHUNK_DIR=os.path.join(media_root, 'upload_tmp'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        os.makedirs(settings.UPLOAD_CHUNK_DIR)
+        with open(self.upload_foto.path, 'wb') as f:
+            f.write(b'foto')
+
+    @classmethod
+    def tambah_transaksi(cls, putaran):
+        """
+        `putaran` permohonan untuk setiap status (+ tagihan, dokumen, tahapan, audit log).
+        Return dict status -> permohonan terakhir.
+        """
+        Status = Permohonan.Status
+        tahapan = list(TahapanLayanan.objects.filter(layanan=cls.layanan))
+        pelanggan_lain = Pelanggan.objects.get(email='pelanggan2@test.com')
+        contoh = {}
+        for ke in range(putaran):
+            for status in Status:
+                cls.nomor += 1
+                permohonan = Permohonan.objects.create(
+                    kode_permohonan=f'PMH-Q-{cls.nomor:04d}', layanan=cls.layanan, status_proses=status,
+                    pelanggan=pelanggan_lain if ke % 2 else cls.pelanggan,
+                    karyawan=cls.lapangan if status in (*Permohonan.STATUS_LAPANGAN, Status.SELESAI) else None,
+                )
+                for master in cls.master:
+                    Dokumen.objects.create(
+                        kode_dokumen=f'DOK-Q-{cls.nomor}-{master.id}', permohonan=permohonan, master_dokumen=master,
+                        path_file=f'blob/aa/{cls.nomor}-{master.id}.jpg',
+                        status_file='Perbaikan' if status == Status.REVISI else 'Digital Diupload',
+                    )
+                for tahap in tahapan:
+                    TahapanPermohonan.objects.create(permohonan=permohonan, tahapan=tahap)
+                PermohonanAuditLog.objects.create(permohonan=permohonan, action='created')
+                if status != Status.MENUNGGU_VERIFIKASI:
+                    pembayaran = Pembayaran.objects.create(
+                        nomor_invoice=f'INV-Q-{cls.nomor:04d}', permohonan=permohonan, total_biaya=500000,
+                        status_pembayaran='pending' if status == Status.MENUNGGU_PEMBAYARAN else 'paid',
+                        metode_pembayaran='Tunai',
+                    )
+                    PembayaranAuditLog.objects.create(pembayaran=pembayaran, action='invoice_created')
+                if permohonan.pelanggan_id == cls.pelanggan.id:
+                    contoh[status] = permohonan
+        return contoh
+
+    def kwargs_url(self, nama):
+        Status = Permohonan.Status
+        permohonan = {
+            'tagihan': Status.MENUNGGU_PEMBAYARAN,
+            'konfirmasi_selesai': Status.DIKIRIM,
+            'detail_permohonan': Status.PROSES_LAPANGAN,
+            'revisi_pengajuan': Status.REVISI,
+            'verifikasi_permohonan': Status.MENUNGGU_VERIFIKASI,
+            'tugaskan_staff': Status.DIPROSES,
+            'finalisasi_permohonan': Status.MENUNGGU_FINALISASI,
+            'cetak_bast': Status.SIAP_DIAMBIL,
+            'staff_upload_arsip': Status.DIPROSES,
+            'tolak_permohonan': Status.MENUNGGU_VERIFIKASI,
+            'update_status_lapangan': Status.PROSES_LAPANGAN,
+            'lapangan_detail': Status.PROSES_LAPANGAN,
+        }
+        pembayaran = {'konfirmasi_lunas': Status.MENUNGGU_PEMBAYARAN, 'cetak_struk': Status.SELESAI}
+        if nama in permohonan:
+            return {'permohonan_id': self.contoh[permohonan[nama]].id}
+        if nama in pembayaran:
+            return {'pembayaran_id': self.contoh[pembayaran[nama]].tagihan.id}
+        if nama in ('form_pengajuan', 'master_layanan_edit', 'master_layanan_requirements', 'master_layanan_tahapan'):
+            return {'layanan_id': self.layanan.id}
+        if nama in ('manajer_karyawan_edit', 'manajer_karyawan_delete'):
+            return {'karyawan_id': self.lapangan.id}
+        if nama in ('master_dokumen_edit', 'master_dokumen_delete'):
+            return {'doc_id': self.master[0].id}
+        if nama == 'upload_chunk':
+            return {'upload_id': self.upload.id}
+        if nama == 'unduh_export':
+            return {'token': 'token-tidak-valid'}
+        return {}
+
+    def data_post(self, kunci):
+        # File baru setiap request (isinya unik -> blob baru, bukan referensi blob lama)
+        self.nomor_upload = getattr(self, 'nomor_upload', 0) + 1
+
+        def file(nama):
+            return SimpleUploadedFile(f'{nama}.pdf', f'%PDF-1.4 {nama} {self.nomor_upload}'.encode(), content_type='application/pdf')
+
+        if kunci == 'form_pengajuan':
+            data = {'metode_pengiriman': 'Ambil di Kantor', 'catatan': '-'}
+            data.update({f'file_{master.id}': file(master.id) for master in self.master[1:]})
+            data[f'file_{self.master[0].id}_upload'] = str(self.upload_foto.id)
+            return data
+        if kunci == 'revisi_pengajuan':
+            berkas = self.contoh[Permohonan.Status.REVISI].berkas_upload.all()
+            return {'catatan': 'sudah diperbaiki', **{f'file_dok_{dok.id}': file(dok.id) for dok in berkas}}
+        if kunci == 'verifikasi_permohonan':
+            return {'action': 'verify', 'biaya_resmi': '5000'}
+        return {'metode': 'Tunai'}
+
+    def kosongkan_rollup(self, kunci):
+        """
+        Jalur terberat POST = request pertama hari itu: baris counter kode dan rollup
+        yang akan ditambah belum ada (UPDATE gagal -> SAVEPOINT + INSERT). Baris
+        rollup status asal tetap ada, karena dikurangi oleh request yang sama.
+        """
+        KodeCounter.objects.all().delete()
+        DailyPendapatan.objects.all().delete()
+        kwargs = self.kwargs_url(kunci)
+        if 'permohonan_id' in kwargs:
+            permohonan = Permohonan.objects.get(pk=kwargs['permohonan_id'])
+        elif 'pembayaran_id' in kwargs:
+            permohonan = Pembayaran.objects.get(pk=kwargs['pembayaran_id']).permohonan
+        else:
+            permohonan = None
+        stats = DailyStats.objects.all()
+        if permohonan:
+            stats = stats.exclude(status_proses=permohonan.status_proses)
+        stats.delete()
+
+    def daftar_url(self):
+        for pattern in core_urls.urlpatterns:
+            kunci = pattern.name or str(pattern.pattern)
+            url = reverse(pattern.name, kwargs=self.kwargs_url(pattern.name)) if pattern.name else f'/{pattern.pattern}'
+            yield kunci, url
+
+    def ukur(self):
+        """
+        Return {kunci URL: jumlah query}. Tiap request di savepoint yang di-rollback
+        (beberapa GET mengubah data) dengan cache profil kosong.
+        """
+        hasil = {}
+        for kunci, url in self.daftar_url():
+            for metode, budget in (('GET', self.BUDGET), ('POST', self.BUDGET_POST)):
+                if kunci not in budget:
+                    continue
+                email, _ = budget[kunci]
+                client = Client()
+                if email:
+                    client.force_login(User.objects.get(email=email))
+                cache.clear()
+                with transaction.atomic():
+                    data = None
+                    if metode == 'POST':
+                        data = self.data_post(kunci)
+                        self.kosongkan_rollup(kunci)
+                    with CaptureQueriesContext(connection) as queries:
+                        if metode == 'POST':
+                            response = client.post(url, data)
+                        else:
+                            response = client.get(url)
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 500, url)
+                if metode == 'POST':
+                    self.assertEqual(response.status_code, 302, f'POST {url} tidak berhasil')
+                hasil[metode, kunci] = len(queries)
+        return hasil
+
+    def test_semua_url_punya_budget(self):
+        self.assertEqual({kunci for kunci, _ in self.daftar_url()}, set(self.BUDGET) | set(self.BUDGET_POST))
+
+    def test_budget_tidak_melebihi_budget_middleware(self):
+        for kunci, (_, budget) in (*self.BUDGET.items(), *self.BUDGET_POST.items()):
+            with self.subTest(url=kunci):
+                self.assertLessEqual(budget, settings.QUERY_BUDGET_VIEW.get(kunci, settings.QUERY_BUDGET_MAKS))
+
+    @override_settings(QUERY_BUDGET_AKTIF=True)
+    def test_jumlah_query_tetap_saat_data_bertambah(self):
+        # Budget di sini dan di settings harus cocok: middleware tidak boleh mencatat apa pun
+        with self.assertNoLogs('core.query_budget', level='WARNING'):
+            sedikit = self.ukur()
+            self.tambah_transaksi(5)
+            banyak = self.ukur()
+        for metode, budget in (('GET', self.BUDGET), ('POST', self.BUDGET_POST)):
+            for kunci, (_, maks) in budget.items():
+                with self.subTest(url=kunci, metode=metode):
+                    self.assertLessEqual(sedikit[metode, kunci], maks)
+                    self.assertEqual(banyak[metode, kunci], sedikit[metode, kunci], 'jumlah query bertambah mengikuti jumlah data (N+1)')
+
+    @override_settings(QUERY_BUDGET_AKTIF=True, QUERY_BUDGET_MAKS=0)
+    def test_middleware_catat_view_melebihi_budget(self):
+        client = Client()
+        client.force_login(User.objects.get(email='manajer@test.com'))
+        with self.assertLogs('core.query_budget', level='WARNING') as log:
+            client.get(reverse('manajer_dashboard'))
+        self.assertIn('(manajer_dashboard)', log.output[0])
+
+    @override_settings(QUERY_BUDGET_AKTIF=True, QUERY_BUDGET_MAKS=0, QUERY_BUDGET_VIEW={'manajer_dashboard': 50})
+    def test_middleware_budget_per_view(self):
+        client = Client()
+        client.force_login(User.objects.get(email='manajer@test.com'))
+        with self.assertNoLogs('core.query_budget', level='WARNING'):
+            client.get(reverse('manajer_dashboard'))
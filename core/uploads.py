@@ -0,0 +1,148 @@
+import datetime
+import functools
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .models import UploadSementara
+from .storage import HashUploadHandler
+
+# Ekstensi yang diterima untuk dokumen persyaratan (foto HP / scan PDF)
+EKSTENSI_UPLOAD = ('jpg', 'jpeg', 'png', 'pdf')
+
+class UploadError(Exception):
+    """
+    Permintaan upload tidak valid. `status` = HTTP status untuk response JSON.
+    """
+    def __init__(self, pesan, status=400):
+        super().__init__(pesan)
+        self.status = status
+
+# ==========================================
+# DIPANGGIL DARI ENDPOINT UPLOAD (/upload/...)
+# ==========================================
+
+def mulai_upload(user, nama_file, ukuran):
+    ext = os.path.splitext(nama_file)[1].lower().lstrip('.')
+    if ext not in EKSTENSI_UPLOAD:
+        raise UploadError(f"Format .{ext} tidak didukung, gunakan {', '.join(EKSTENSI_UPLOAD)}.")
+    if ukuran <= 0 or ukuran > settings.UPLOAD_MAKS_BYTES:
+        raise UploadError(f"Ukuran file maksimal {settings.UPLOAD_MAKS_BYTES // (1024 * 1024)} MB.", status=413)
+
+    os.makedirs(settings.UPLOAD_CHUNK_DIR, exist_ok=True)
+    upload = UploadSementara.objects.create(user=user, nama_file=os.path.basename(nama_file)[:255], ukuran=ukuran)
+    open(upload.path, 'wb').close()
+    return upload
+
+def tulis_chunk(upload_id, user, offset, data):
+    """
+    Tulis satu potongan di posisi `offset`. Offset harus sama dengan jumlah byte
+    yang sudah diterima; selain itu client diminta melanjutkan dari offset server (409).
+    Body dibaca dulu (maks UPLOAD_CHUNK_BYTES), baru baris dikunci selama menulis ke disk.
+    """
+    if len(data) > settings.UPLOAD_CHUNK_BYTES:
+        raise UploadError('Potongan terlalu besar.', status=413)
+
+    with transaction.atomic():
+        upload = UploadSementara.objects.select_for_update().filter(id=upload_id, user=user).first()
+        if upload is None:
+            raise UploadError('Upload tidak ditemukan.', status=404)
+        if upload.status == 'selesai':
+            return upload
+        if offset != upload.diterima:
+            raise UploadError('Offset tidak sesuai, lanjutkan dari offset server.', status=409)
+        if offset + len(data) > upload.ukuran:
+            raise UploadError('Data melebihi ukuran file.', status=413)
+
+        with open(upload.path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+        upload.diterima = offset + len(data)
+        if upload.diterima == upload.ukuran:
+            upload.status = 'selesai'
+        upload.save(update_fields=['diterima', 'status', 'updated_at'])
+    return upload
+
+def info_upload(upload):
+    return {
+        'id': str(upload.id),
+        'offset': upload.diterima,
+        'ukuran': upload.ukuran,
+        'selesai': upload.status == 'selesai',
+        'chunk_bytes': settings.UPLOAD_CHUNK_BYTES,
+    }
+
+def hapus_upload(upload):
+    try:
+        os.remove(upload.path)
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+# ==========================================
+# DIPANGGIL DARI FORM (PENGAJUAN / REVISI / ARSIP)
+# ==========================================
+
+def terima_upload_dokumen(view):
+    """
+    Decorator view yang menyimpan Dokumen: file multipart ditulis ke blob/ dan
+    di-hash sambil diterima (HashUploadHandler). Handler harus dipasang sebelum
+    request.POST dibaca, padahal CsrfViewMiddleware membacanya sebelum view
+    berjalan -> cek CSRF dipindah ke dalam (pola dari dokumentasi Django).
+    """
+    view_csrf = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, HashUploadHandler(request))
+        return view_csrf(request, *args, **kwargs)
+    return wrapper
+
+def file_dari_request(request, nama_input):
+    """
+    File untuk input `nama_input`: multipart biasa (request.FILES) atau upload
+    bertahap yang sudah selesai (POST `<nama_input>_upload` = id upload).
+    Harus dipanggil di dalam transaction.atomic(): file sementara dihapus setelah commit,
+    jika rollback tetap disimpan agar form bisa dikirim ulang tanpa upload ulang.
+    """
+    file_upload = request.FILES.get(nama_input)
+    if file_upload:
+        return file_upload
+
+    upload_id = request.POST.get(f'{nama_input}_upload')
+    try:
+        upload_id = uuid.UUID(upload_id)
+    except (TypeError, ValueError):
+        return None
+    upload = UploadSementara.objects.filter(id=upload_id, user=request.user, status='selesai').first()
+    if upload is None:
+        return None
+
+    berkas = File(open(upload.path, 'rb'), name=upload.nama_file)
+
+    def selesai():
+        berkas.close()
+        hapus_upload(upload)
+    transaction.on_commit(selesai)
+    return berkas
+
+# ==========================================
+# PEMBERSIHAN (manage.py bersihkan_upload)
+# ==========================================
+
+def hapus_upload_kedaluwarsa():
+    """
+    Hapus upload yang tidak dipakai form lebih dari UPLOAD_SIMPAN_JAM. Return jumlah yang dihapus.
+    """
+    batas = datetime.datetime.now() - datetime.timedelta(hours=settings.UPLOAD_SIMPAN_JAM)
+    jumlah = 0
+    for upload in UploadSementara.objects.filter(updated_at__lt=batas):
+        hapus_upload(upload)
+        jumlah += 1
+    return jumlah
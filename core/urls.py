@@ -23,16 +23,19 @@ urlpatterns = [
     path('staff/tugaskan/<int:permohonan_id>/', views.tugaskan_staff_view, name='tugaskan_staff'),
     path('staff/finalisasi/<int:permohonan_id>/', views.finalisasi_permohonan_view, name='finalisasi_permohonan'),
     path('staff/bast/<int:permohonan_id>/', views.cetak_bast_view, name='cetak_bast'),
+    path('staff/riwayat-selesai/', views.staff_riwayat_selesai_view, name='staff_riwayat_selesai'),
 
     # --- AREA STAFF LAPANGAN ---
     path('lapangan/dashboard/', views.lapangan_dashboard_view, name='lapangan_dashboard'),
     path('lapangan/update/<int:permohonan_id>/', views.update_status_lapangan_view, name='update_status_lapangan'),
     path('lapangan/detail/<int:permohonan_id>/', views.lapangan_detail_view, name='lapangan_detail'),
+    path('lapangan/riwayat/', views.lapangan_riwayat_view, name='lapangan_riwayat'),
 
 
     path('keuangan/dashboard/', views.keuangan_dashboard_view, name='keuangan_dashboard'),
     path('keuangan/lunas/<int:pembayaran_id>/', views.konfirmasi_lunas_view, name='konfirmasi_lunas'),
     path('keuangan/cetak/<int:pembayaran_id>/', views.cetak_struk_view, name='cetak_struk'),
+    path('keuangan/riwayat/', views.keuangan_riwayat_view, name='keuangan_riwayat'),
 
     path('profil/edit/', views.edit_profil_view, name='edit_profil'),
     path('staff/input-walkin/', views.staff_input_walkin_view, name='staff_input_walkin'),
@@ -42,6 +45,9 @@ urlpatterns = [
     path('manajer/dashboard/', views.manajer_dashboard_view, name='manajer_dashboard'),
     path('manajer/laporan/', views.laporan_keuangan_view, name='laporan_keuangan'),
     path('manajer/cetak-laporan/', views.cetak_laporan_gabungan_view, name='cetak_laporan_gabungan'),  # NEW
+    path('manajer/export/', views.manajer_export_view, name='manajer_export'),
+    path('manajer/export/status/', views.export_status_view, name='export_status'),
+    path('manajer/export/unduh/<str:token>/', views.unduh_export_view, name='unduh_export'),
 
     path('staff/tolak/<int:permohonan_id>/', views.tolak_permohonan_view, name='tolak_permohonan'),
     path('detail/<int:permohonan_id>/', views.detail_permohonan_view, name='detail_permohonan'),
@@ -62,4 +68,8 @@ urlpatterns = [
     path('manajer/master/dokumen/delete/<int:doc_id>/', views.master_dokumen_list_view, name='master_dokumen_delete'), # Delete handled in list view POST
 
     path('revisi/<int:permohonan_id>/', views.revisi_pengajuan_view, name='revisi_pengajuan'),
+
+    # Upload bertahap (chunked) untuk dokumen besar
+    path('upload/mulai/', views.upload_mulai_view, name='upload_mulai'),
+    path('upload/<uuid:upload_id>/', views.upload_chunk_view, name='upload_chunk'),
 ]
\ No newline at end of file
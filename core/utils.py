@@ -1,8 +1,16 @@
-import threading
-from django.core.mail import EmailMessage
+import csv
+import datetime
+import logging
+import re
+from html import unescape
+from django.db.models import Q
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.template.loader import get_template
+from django.utils.html import strip_tags
 from io import BytesIO
+
+from .models import OutboundEmail
 try: from xhtml2pdf import pisa
 except ImportError: pisa = None
 
@@ -10,6 +18,8 @@ import os
 from django.conf import settings
 from django.contrib.staticfiles import finders
 
+logger = logging.getLogger(__name__)
+
 def link_callback(uri, rel):
     """
     Convert HTML URIs to absolute system paths so xhtml2pdf can verify resources
@@ -39,17 +49,17 @@ def link_callback(uri, rel):
     return path
 
 # --- FUNGSI GENERATE PDF ---
-def render_to_pdf(template_src, context_dict={}):
+def html_ke_pdf(html):
     """
-    Mengubah Template HTML menjadi File PDF (Bytes)
+    Konversi string HTML ke PDF (Bytes). Dipisah dari render_to_pdf agar
+    bisa dijalankan di process pool worker PDF (lihat core/pdf_jobs.py).
+    Gagal -> dicatat ke logger 'core.utils' dan return None.
     """
     if pisa is None:
-        print("❌ ERROR: xhtml2pdf (pisa) is None. Library might not be installed correctly in this process.")
+        logger.error("xhtml2pdf (pisa) tidak tersedia di proses ini, PDF tidak dibuat.")
         return None
 
     try:
-        template = get_template(template_src)
-        html  = template.render(context_dict)
         result = BytesIO()
         
         # Konversi HTML ke PDF dengan link_callback
@@ -58,50 +68,141 @@ def render_to_pdf(template_src, context_dict={}):
         if not pdf.err:
             return result.getvalue() # Mengembalikan file PDF mentah
         else:
-            print(f"❌ PDF CONVERSION ERROR: {pdf.err}")
+            logger.error("Konversi PDF gagal: %s", pdf.err)
             return None
-    except Exception as e:
-        print(f"❌ PDF EXCEPTION: {str(e)}")
+    except Exception:
+        logger.exception("Konversi HTML ke PDF gagal")
         return None
 
-# --- CLASS EMAIL THREAD (DENGAN ATTACHMENT) ---
-class EmailThread(threading.Thread):
-    def __init__(self, subject, html_content, recipient_list, pdf_file=None, pdf_filename="invoice.pdf"):
-        self.subject = subject
-        self.recipient_list = recipient_list
-        self.html_content = html_content
-        self.pdf_file = pdf_file
-        self.pdf_filename = pdf_filename
-        threading.Thread.__init__(self)
-
-    def run(self):
-        try:
-            # Kita pakai EmailMessage agar bisa attach file
-            email = EmailMessage(
-                subject=self.subject,
-                body=self.html_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=self.recipient_list
-            )
-            email.content_subtype = "html" # Set isi email jadi HTML
-            
-            # Jika ada file PDF, lampirkan!
-            if self.pdf_file:
-                email.attach(self.pdf_filename, self.pdf_file, 'application/pdf')
-            
-            email.send()
-            print(f"✅ Email + PDF terkirim ke {self.recipient_list}")
-            
-        except Exception as e:
-            print(f"❌ Gagal kirim email: {e}")
+def render_to_pdf(template_src, context_dict={}):
+    """
+    Mengubah Template HTML menjadi File PDF (Bytes)
+    """
+    try:
+        html = get_template(template_src).render(context_dict)
+    except Exception:
+        logger.exception("Render template PDF %s gagal", template_src)
+        return None
+    return html_ke_pdf(html)
+
+# --- VERSI TEXT/PLAIN DARI EMAIL HTML ---
+RE_LINK = re.compile(r'<a\s[^>]*href="([^"]+)"[^>]*>(.*?)</a>', re.S | re.I)
+RE_BLOK = re.compile(r'<br\s*/?>|</(p|div|h[1-6]|tr|li|table)>', re.I)
+
+def html_ke_teks(html):
+    """
+    Alternatif text/plain untuk email: link jadi "teks: url", blok jadi baris baru.
+    """
+    teks = RE_LINK.sub(lambda m: f"{strip_tags(m.group(2)).strip()}: {m.group(1)}", html)
+    teks = RE_BLOK.sub('\n', teks)
+    teks = unescape(strip_tags(teks))
+    baris = [' '.join(b.split()) for b in teks.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(baris)).strip()
 
 # --- FUNGSI PEMICU UTAMA ---
-def kirim_notifikasi_email(subjek, pesan_html, email_tujuan, pdf_data=None, pdf_name="dokumen.pdf"):
+def kirim_notifikasi_email(subjek, pesan_html, email_tujuan, pdf_data=None, pdf_name="dokumen.pdf", pesan_teks=None):
     """
     Helper praktis. Parameter pdf_data opsional.
+    Email masuk antrean OutboundEmail, dikirim oleh `python manage.py email_worker`.
+    Versi text/plain dibuat otomatis dari HTML jika pesan_teks tidak diisi.
     """
     if not isinstance(email_tujuan, list):
         email_tujuan = [email_tujuan]
 
-    # Jalankan di background
-    EmailThread(subjek, pesan_html, email_tujuan, pdf_data, pdf_name).start()
\ No newline at end of file
+    return OutboundEmail.objects.create(
+        subjek=subjek,
+        pesan_html=pesan_html,
+        pesan_teks=pesan_teks or html_ke_teks(pesan_html),
+        email_tujuan=','.join(email_tujuan),
+        lampiran=pdf_data,
+        nama_lampiran=pdf_name if pdf_data else None
+    )
+
+# --- PAGINATION KEYSET (CURSOR) UNTUK TAB RIWAYAT ---
+RIWAYAT_PAGE_SIZE = 20
+FORMAT_CURSOR = '%Y%m%d%H%M%S%f'
+# Waktu 20 digit + id maks. 18 digit (muat di BIGINT, id lebih besar = OverflowError di driver DB)
+RE_CURSOR = re.compile(r'(\d{20})-(\d{1,18})')
+
+def buat_cursor(item):
+    """
+    Cursor = posisi baris terakhir (updated_at, id), contoh: '20250101093000000000-42'
+    """
+    return f"{item.updated_at.strftime(FORMAT_CURSOR)}-{item.id}"
+
+def halaman_keyset_qs(queryset, cursor=None, page_size=RIWAYAT_PAGE_SIZE):
+    """
+    Queryset satu halaman yang dijalankan paginate_keyset: urut (updated_at, id)
+    terbaru dulu, mulai SETELAH cursor, page_size + 1 baris.
+    Raise ValueError jika format cursor tidak valid.
+    """
+    queryset = queryset.order_by('-updated_at', '-id')
+
+    if cursor:
+        cocok = RE_CURSOR.fullmatch(cursor)
+        if not cocok:
+            raise ValueError(f'Cursor tidak valid: {cursor!r}')
+        waktu = datetime.datetime.strptime(cocok.group(1), FORMAT_CURSOR)
+        last_id = int(cocok.group(2))
+        queryset = queryset.filter(
+            Q(updated_at__lt=waktu) | Q(updated_at=waktu, id__lt=last_id)
+        )
+
+    # Ambil 1 baris lebih untuk tahu apakah masih ada halaman berikutnya
+    return queryset[:page_size + 1]
+
+def paginate_keyset(queryset, cursor=None, page_size=RIWAYAT_PAGE_SIZE):
+    """
+    Ambil satu halaman data urut (updated_at, id) terbaru dulu, mulai SETELAH cursor.
+    Biaya query tetap (pakai WHERE + LIMIT, bukan OFFSET) walau riwayat terus bertambah.
+    Return: (list_item, next_cursor). next_cursor None jika sudah halaman terakhir.
+    Raise ValueError jika format cursor tidak valid.
+    """
+    items = list(halaman_keyset_qs(queryset, cursor, page_size))
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = buat_cursor(items[-1])
+    return items, next_cursor
+
+def iter_keyset(queryset, *fields, chunk_size=2000):
+    """
+    Iterasi values_list('updated_at', 'id', *fields) terbaru dulu, per chunk WHERE + LIMIT.
+    Memori tetap walau data puluhan ribu baris (.iterator() di MySQL tetap
+    memuat seluruh hasil ke memori driver).
+    """
+    queryset = queryset.order_by('-updated_at', '-id')
+    terakhir = None
+    while True:
+        chunk = queryset
+        if terakhir:
+            waktu, last_id = terakhir
+            chunk = chunk.filter(Q(updated_at__lt=waktu) | Q(updated_at=waktu, id__lt=last_id))
+        rows = list(chunk.values_list('updated_at', 'id', *fields)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        terakhir = rows[-1][:2]
+
+# --- EXPORT CSV (STREAMING) ---
+class Echo:
+    """
+    Pseudo-buffer untuk csv.writer: write() langsung mengembalikan barisnya.
+    """
+    def write(self, value):
+        return value
+
+def csv_response(filename, header, rows):
+    """
+    StreamingHttpResponse CSV: baris dikirim ke client sambil dibaca dari `rows`.
+    """
+    writer = csv.writer(Echo())
+
+    def isi():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(isi(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -31,21 +31,24 @@ from .staff_admin_views import (
     tugaskan_staff_view,
     finalisasi_permohonan_view,
     tolak_permohonan_view,
-    cetak_bast_view
+    cetak_bast_view,
+    staff_riwayat_selesai_view
 )
 
 # Staff Keuangan (Finance) Views
 from .staff_keuangan_views import (
     keuangan_dashboard_view,
     konfirmasi_lunas_view,
-    cetak_struk_view
+    cetak_struk_view,
+    keuangan_riwayat_view
 )
 
 # Staff Lapangan (Field) Views
 from .staff_lapangan_views import (
     lapangan_dashboard_view,
     update_status_lapangan_view,
-    lapangan_detail_view
+    lapangan_detail_view,
+    lapangan_riwayat_view
 )
 
 # Manajer (Manager) Views
@@ -53,6 +56,9 @@ from .manajer_views import (
     manajer_dashboard_view,
     laporan_keuangan_view,
     cetak_laporan_gabungan_view,  # NEW
+    manajer_export_view,
+    export_status_view,
+    unduh_export_view,
     manajer_karyawan_list_view,
     manajer_karyawan_create_view,
     manajer_karyawan_edit_view,
@@ -72,6 +78,15 @@ from .shared_views import (
     revisi_pengajuan_view
 )
 
+# Upload Bertahap (Chunked) Views
+from .upload_views import (
+    upload_mulai_view,
+    upload_chunk_view
+)
+
+# Media (File Upload Ber-autentikasi) Views
+from .media_views import media_view
+
 # Export all for "from core.views import *"
 __all__ = [
     # Auth
@@ -95,18 +110,24 @@ __all__ = [
     'finalisasi_permohonan_view',
     'tolak_permohonan_view',
     'cetak_bast_view',
+    'staff_riwayat_selesai_view',
     # Staff Keuangan
     'keuangan_dashboard_view',
     'konfirmasi_lunas_view',
     'cetak_struk_view',
+    'keuangan_riwayat_view',
     # Staff Lapangan
     'lapangan_dashboard_view',
     'update_status_lapangan_view',
     'lapangan_detail_view',
+    'lapangan_riwayat_view',
     # Manajer
     'manajer_dashboard_view',
     'laporan_keuangan_view',
     'cetak_laporan_gabungan_view',  # NEW
+    'manajer_export_view',
+    'export_status_view',
+    'unduh_export_view',
     'manajer_karyawan_list_view',
     'manajer_karyawan_create_view',
     'manajer_karyawan_edit_view',
@@ -121,4 +142,9 @@ __all__ = [
     'edit_profil_view',
     'detail_permohonan_view',
     'revisi_pengajuan_view',
+    # Upload Bertahap
+    'upload_mulai_view',
+    'upload_chunk_view',
+    # Media
+    'media_view',
 ]
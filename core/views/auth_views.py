@@ -17,7 +17,8 @@ from firebase_admin import credentials, auth
 from ..models import Pelanggan, Karyawan
 
 # Import Email Helper
-from ..utils import kirim_notifikasi_email
+from ..email_templates import kirim_email_template
+from ..middleware import get_user_role, ROLE_PELANGGAN
 
 from django.conf import settings
 
@@ -37,19 +38,19 @@ if not firebase_admin._apps:
 def get_role_redirect_url(user):
     """
     Helper untuk menentukan arah redirect berdasarkan Role Karyawan/Pelanggan.
+    Role diambil dari get_user_role (cache profil, tanpa query saat cache terisi).
     """
-    try:
-        karyawan = Karyawan.objects.get(email=user.email)
-        if karyawan.role == 'manajer':
-            return 'manajer_dashboard'
-        elif karyawan.role == 'staff_keuangan':
-            return 'keuangan_dashboard'
-        elif karyawan.role == 'lapangan':
-            return 'lapangan_dashboard'
-        else:
-            return 'staff_dashboard' # Default Staff Admin
-    except Karyawan.DoesNotExist:
+    role = get_user_role(user)
+    if role == 'manajer':
+        return 'manajer_dashboard'
+    elif role == 'staff_keuangan':
+        return 'keuangan_dashboard'
+    elif role == 'lapangan':
+        return 'lapangan_dashboard'
+    elif role is None or role == ROLE_PELANGGAN:
         return 'dashboard' # Default Pelanggan
+    else:
+        return 'staff_dashboard' # Default Staff Admin
 
 # ==========================================
 # PUBLIC & AUTHENTICATION VIEWS
@@ -137,29 +138,7 @@ def firebase_auth_api(request):
                     email=email,
                     no_whatsapp=input_wa
                 )
-                subjek = "Selamat Datang di BiroJasaApp!"
-                pesan = f"""
-                <div style="font-family: Helvetica, Arial, sans-serif; max-width: 600px; margin: auto; border: 1px solid #ddd; border-radius: 8px; overflow: hidden;">
-                    <div style="background-color: #2F4F4F; padding: 20px; text-align: center;">
-                        <h2 style="color: #ffffff; margin: 0;">BiroJasaApp</h2>
-                    </div>
-                    <div style="padding: 30px; background-color: #ffffff;">
-                        <h3 style="color: #333;">Halo, {input_nama}! 👋</h3>
-                        <p style="color: #555; line-height: 1.6;">
-                            Selamat datang di keluarga besar BiroJasaApp. Akun Anda telah berhasil dibuat.
-                            Sekarang Anda dapat menikmati kemudahan mengurus dokumen kendaraan dari rumah.
-                        </p>
-                        <div style="text-align: center; margin: 30px 0;">
-                            <a href="http://127.0.0.1:8000/dashboard/" style="background-color: #2F4F4F; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; font-weight: bold;">Masuk ke Dashboard</a>
-                        </div>
-                        <p style="color: #555; font-size: 12px;">Jika tombol di atas tidak berfungsi, silakan login melalui website kami.</p>
-                    </div>
-                    <div style="background-color: #f8f9fa; padding: 15px; text-align: center; font-size: 12px; color: #888;">
-                        &copy; 2025 BiroJasaApp. Bandung, Jawa Barat.
-                    </div>
-                </div>
-                """
-                kirim_notifikasi_email(subjek, pesan, email)
+                kirim_email_template('selamat_datang', email, {'nama': input_nama})
                 
 
             # 4. Login Session Django
@@ -1,34 +1,56 @@
 import datetime
-import csv
 import uuid
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import HttpResponse
-from django.db.models import Sum, Count
+from django.conf import settings
+from django.core import signing
+from django.db.models import Sum
+from django.http import Http404, JsonResponse
+from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
 
 # Firebase Imports
 import firebase_admin
 from firebase_admin import credentials, auth
 
 # Import Models
-from ..models import Pelanggan, Permohonan, Pembayaran, Karyawan, Layanan, MasterDokumen, LayananDokumen, AktivitasLogin, TahapanLayanan
+from ..models import Pelanggan, Permohonan, Pembayaran, Karyawan, Layanan, MasterDokumen, LayananDokumen, TahapanLayanan, DailyStats, DailyPendapatan, ExportJob
 
 # Import Helpers
-from ..utils import render_to_pdf
+from ..utils import render_to_pdf, csv_response
+from ..pdf_cache import ambil_pdf, simpan_pdf, cek_not_modified, respon_pdf
+from ..laporan import (
+    TEMPLATE_LAPORAN_GABUNGAN, HEADER_LAPORAN_KEUANGAN, laporan_keuangan_qs, baris_laporan_keuangan,
+    periode_laporan, kunci_laporan_gabungan, konteks_laporan_gabungan, konteks_pdf_laporan_gabungan
+)
+from ..export_jobs import antrekan_export, buat_link_token, baca_link_token
+from ..media import kirim_media
+from ..kode import buat_kode
+from ..middleware import get_user_role
+from ..dashboard import login_staff_terakhir_qs
 
 # ==========================================
 # HELPER DECORATOR
 # ==========================================
 
 def manajer_check(user):
+    # Role dari cache profil (get_user_role), tanpa query saat cache terisi
+    return get_user_role(user) == 'manajer'
+
+def periode_dari_request(request, data, today=None):
+    """
+    periode_laporan() dari GET/POST. Tanggal custom tidak valid -> pesan error
+    dan kembali ke periode default (bulan ini), bukan error 500.
+    Return (periode, start_date, end_date, label_periode).
+    """
+    periode = data.get('periode', 'bulanan')
     try:
-        return Karyawan.objects.filter(email=user.email, role='manajer').exists()
-    except:
-        return False
+        return (periode, *periode_laporan(periode, data.get('start_date'), data.get('end_date'), today))
+    except ValueError:
+        messages.error(request, 'Tanggal periode tidak valid, laporan ditampilkan untuk bulan ini.')
+        return ('bulanan', *periode_laporan('bulanan', today=today))
 
 # ==========================================
 # MANAJER VIEWS - DASHBOARD & REPORTS
@@ -36,33 +58,28 @@ def manajer_check(user):
 
 @login_required(login_url='login')
 def manajer_dashboard_view(request):
-    try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'manajer':
-            return redirect('dashboard')
-    except:
+    karyawan = request.profile
+    if request.role != 'manajer':
         return redirect('dashboard')
 
 # Total Pelanggan
     total_pelanggan = Pelanggan.objects.count()
     
-    # Total Transaksi (Semua Permohonan masuk)
-    total_permohonan = Permohonan.objects.count()
-    
-    # Total Pendapatan (Dari Tabel Pembayaran yang sudah LUNAS)
-    total_uang_agg = Pembayaran.objects.filter(status_pembayaran='paid').aggregate(Sum('total_biaya'))
-    total_uang = total_uang_agg['total_biaya__sum'] or 0
+    # Total Transaksi & Pendapatan dari rollup harian (bukan scan semua transaksi)
+    total_permohonan = DailyStats.objects.aggregate(total=Sum('jumlah_permohonan'))['total'] or 0
+    total_uang = DailyPendapatan.objects.aggregate(total=Sum('total_pemasukan'))['total'] or 0
 
     # Statistik Status Permohonan (untuk tabel di Tab Monitoring)
-    status_stats = Permohonan.objects.values('status_proses').annotate(jumlah=Count('id')).order_by('-jumlah')
+    status_stats = list(
+        DailyStats.objects.order_by().values('status_proses').annotate(jumlah=Sum('jumlah_permohonan'))
+        .filter(jumlah__gt=0).order_by('-jumlah')
+    )
+    for stat in status_stats:
+        stat['label'] = Permohonan.Status(stat['status_proses']).label
     
     # --- FITUR MONITORING LOGIN (Peningkatan dengan IP) ---
     # 1. Staff Terkini Login
-    staff_emails = Karyawan.objects.values_list('email', flat=True)
-    recent_staff_logins = AktivitasLogin.objects.filter(user__email__in=staff_emails).order_by('-timestamp')[:10]
-    
-    # Ambil data karyawan untuk ucapan selamat datang
-    karyawan = Karyawan.objects.get(email=request.user.email)
+    recent_staff_logins = login_staff_terakhir_qs()
 
     context = {
         'karyawan': karyawan,
@@ -74,30 +91,45 @@ def manajer_dashboard_view(request):
     }
     return render(request, 'core/manajer/manajer_dashboard.html', context)
 
+# Baris per query saat export CSV
+CSV_CHUNK_SIZE = 2000
+
 @login_required(login_url='login')
 def laporan_keuangan_view(request):
-    if not Karyawan.objects.filter(email=request.user.email).exists():
+    if not isinstance(request.profile, Karyawan):
         return redirect('dashboard')
     
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    laporan = Pembayaran.objects.filter(status_pembayaran='paid').order_by('-updated_at')
-
+    start_date = request.GET.get('start_date') or None
+    end_date = request.GET.get('end_date') or None
+    label_periode = 'Semua Periode'
     if start_date and end_date:
-        laporan = laporan.filter(updated_at__date__range=[start_date, end_date])
+        # Tanggal tidak valid -> pesan error + bulan ini (bukan ValidationError/500)
+        _, start_date, end_date, label_periode = periode_dari_request(
+            request, {'periode': 'custom', 'start_date': start_date, 'end_date': end_date}
+        )
+    laporan = laporan_keuangan_qs(start_date, end_date)
+    bisa_export_xlsx = manajer_check(request.user)
+
+    export = request.GET.get('export')
+    if export == 'xlsx':
+        # XLSX dibuat export_worker di background, diunduh dari halaman export manajer
+        if not bisa_export_xlsx:
+            messages.error(request, 'Export Excel hanya untuk manajer, gunakan Export CSV.')
+            query = request.GET.copy()
+            query.pop('export')
+            return redirect(f"{reverse('laporan_keuangan')}?{query.urlencode()}")
+        return antrekan_dan_redirect(request, 'keuangan', 'xlsx', label_periode, start_date, end_date)
+    if export:
+        # Streaming per chunk: memori tetap & tanpa query per baris (nama pelanggan lewat JOIN)
+        rows = baris_laporan_keuangan(laporan, chunk_size=CSV_CHUNK_SIZE)
+        return csv_response(f"laporan_{datetime.date.today()}.csv", HEADER_LAPORAN_KEUANGAN, rows)
 
     total_pemasukan = laporan.aggregate(Sum('total_biaya'))['total_biaya__sum'] or 0
-
-    if 'export' in request.GET:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="laporan_{datetime.date.today()}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['No Invoice', 'Tanggal', 'Pelanggan', 'Total'])
-        for item in laporan:
-            writer.writerow([item.nomor_invoice, item.updated_at.strftime("%d-%m-%Y"), item.permohonan.pelanggan.nama, item.total_biaya])
-        return response
-
-    return render(request, 'core/manajer/laporan.html', {'laporan': laporan, 'total_pemasukan': total_pemasukan, 'start_date': start_date, 'end_date': end_date})
+    laporan = laporan.select_related('permohonan__pelanggan', 'permohonan__layanan')
+    return render(request, 'core/manajer/laporan.html', {
+        'laporan': laporan, 'total_pemasukan': total_pemasukan, 'start_date': start_date, 'end_date': end_date,
+        'bisa_export_xlsx': bisa_export_xlsx,
+    })
 
 # 🔥 NEW: LAPORAN GABUNGAN (Operasional + Keuangan)
 @login_required(login_url='login')
@@ -107,138 +139,105 @@ def cetak_laporan_gabungan_view(request):
     Cetak Laporan Operasional & Keuangan Gabungan
     Filter: Harian, Mingguan, Bulanan, Tahunan
     """
-    karyawan = Karyawan.objects.get(email=request.user.email)
-    
-    # Default: Bulan ini
+    karyawan = request.profile
     today = timezone.now().date()
-    start_date = today.replace(day=1)
-    end_date = today
-    
-    # Ambil parameter filter
-    periode = request.GET.get('periode', 'bulanan')
-    custom_start = request.GET.get('start_date')
-    custom_end = request.GET.get('end_date')
     
-    # Hitung tanggal berdasarkan periode
-    if periode == 'harian':
-        start_date = today
-        end_date = today
-        label_periode = today.strftime('%d %B %Y')
-    elif periode == 'mingguan':
-        start_date = today - timedelta(days=today.weekday())  # Senin minggu ini
-        end_date = start_date + timedelta(days=6)  # Minggu
-        label_periode = f"{start_date.strftime('%d %b')} - {end_date.strftime('%d %b %Y')}"
-    elif periode == 'bulanan':
-        start_date = today.replace(day=1)
-        # Last day of month
-        if today.month == 12:
-            end_date = today.replace(day=31)
-        else:
-            end_date = (today.replace(month=today.month+1, day=1) - timedelta(days=1))
-        label_periode = today.strftime('%B %Y')
-    elif periode == 'tahunan':
-        start_date = today.replace(month=1, day=1)
-        end_date = today.replace(month=12, day=31)
-        label_periode = f'Tahun {today.year}'
-    elif periode == 'custom' and custom_start and custom_end:
-        start_date = datetime.datetime.strptime(custom_start, '%Y-%m-%d').date()
-        end_date = datetime.datetime.strptime(custom_end, '%Y-%m-%d').date()
-        label_periode = f"{start_date.strftime('%d %b %Y')} - {end_date.strftime('%d %b %Y')}"
-    
-    # === LAPORAN OPERASIONAL ===
-    permohonan_list = Permohonan.objects.filter(
-        created_at__date__range=[start_date, end_date]
-    ).order_by('-created_at')
-    
-    # Statistik operasional
-    total_permohonan = permohonan_list.count()
-    permohonan_selesai = permohonan_list.filter(status_proses='Selesai').count()
-    permohonan_diproses = permohonan_list.exclude(status_proses__in=['Selesai', 'Ditolak']).count()
-    permohonan_ditolak = permohonan_list.filter(status_proses='Ditolak').count()
-    
-    # Breakdown per layanan
-    # Penting: order_by() kosong di awal me-reset sorting default agar GROUP BY valid
-    layanan_stats = permohonan_list.order_by().values('layanan__nama_layanan').annotate(
-        jumlah_count=Count('id')
-    ).order_by('-jumlah_count')
-    
-    # === LAPORAN KEUANGAN ===
-    pembayaran_list = Pembayaran.objects.filter(
-        status_pembayaran='paid',
-        updated_at__date__range=[start_date, end_date]
-    ).order_by('-updated_at')
-    
-    # Statistik keuangan
-    total_transaksi = pembayaran_list.count()
-    total_pemasukan = pembayaran_list.aggregate(Sum('total_biaya'))['total_biaya__sum'] or 0
-    
-    # Breakdown per metode pembayaran
-    # Gunakan QS baru agar tidak terganggu sorting/caching dari pembayaran_list
-    stats_payment_qs = Pembayaran.objects.filter(
-        status_pembayaran='paid',
-        updated_at__date__range=[start_date, end_date]
-    )
-    
-    # values() harus di-chain langsung dengan annotate() tanpa ordering default model
-    metode_stats = stats_payment_qs.order_by().values('metode_pembayaran').annotate(
-        jumlah_count=Count('id'),
-        total_bayar=Sum('total_biaya')
-    ).order_by('-total_bayar')
-    
-    # Jika request adalah cetak PDF
-    if 'print' in request.GET:
-        context = {
+    # Ambil parameter filter (default: bulan ini)
+    periode, start_date, end_date, label_periode = periode_dari_request(request, request.GET, today)
+
+    if 'print' not in request.GET:
+        # Tampilkan form filter + preview statistik
+        context = konteks_laporan_gabungan(start_date, end_date)
+        context.update({
             'karyawan': karyawan,
-            'periode': label_periode,
-            'start_date': start_date,
-            'end_date': end_date,
-            'generated_at': timezone.now(),
-            
-            # Operasional
-            'total_permohonan': total_permohonan,
-            'permohonan_selesai': permohonan_selesai,
-            'permohonan_diproses': permohonan_diproses,
-            'permohonan_ditolak': permohonan_ditolak,
-            'layanan_stats': layanan_stats,
-            'permohonan_list': permohonan_list,
-            
-            # Keuangan
-            'total_transaksi': total_transaksi,
-            'total_pemasukan': total_pemasukan,
-            'metode_stats': metode_stats,
-            'pembayaran_list': pembayaran_list,
-        }
-        
-        pdf = render_to_pdf('core/pdf/laporan_gabungan_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="Laporan_{periode}_{today}.pdf"'
-            return response
-        else:
-            messages.error(request, 'Gagal generate PDF')
-            return redirect('cetak_laporan_gabungan')
-    
-    # Tampilkan form filter
+            'periode': periode,
+            'label_periode': label_periode,
+        })
+        return render(request, 'core/manajer/cetak_laporan_gabungan.html', context)
+
+    # Cetak PDF: cek cache dulu (kunci = updated_at data periode ini),
+    # agar cache hit tidak perlu menghitung statistik & render ulang
+    kunci, last_modified = kunci_laporan_gabungan(karyawan, label_periode, start_date, end_date)
+    filename = f"Laporan_{periode}_{today}.pdf"
+
+    not_modified = cek_not_modified(request, kunci, last_modified)
+    if not_modified:
+        return not_modified
+    pdf = ambil_pdf(kunci)
+    if pdf:
+        return respon_pdf(pdf, kunci, filename, last_modified)
+
+    # Periode panjang (tahunan, custom) -> render di export_worker agar tidak timeout
+    if (end_date - start_date).days + 1 > settings.EXPORT_INLINE_MAKS_HARI:
+        return antrekan_dan_redirect(request, 'gabungan', 'pdf', label_periode, start_date, end_date)
+
+    context = konteks_pdf_laporan_gabungan(karyawan, label_periode, start_date, end_date)
+    pdf = render_to_pdf(TEMPLATE_LAPORAN_GABUNGAN, context)
+    if pdf:
+        simpan_pdf(kunci, pdf)
+        return respon_pdf(pdf, kunci, filename, last_modified)
+    messages.error(request, 'Gagal generate PDF')
+    return redirect('cetak_laporan_gabungan')
+
+# ==========================================
+# MANAJER VIEWS - EXPORT LAPORAN (BACKGROUND)
+# ==========================================
+
+def antrekan_dan_redirect(request, laporan, format, periode, start_date, end_date):
+    job, baru = antrekan_export(laporan, format, periode, start_date, end_date, request.profile)
+    if baru:
+        messages.info(request, f'Export {job} sedang dibuat. File bisa diunduh di halaman ini setelah selesai.')
+    else:
+        messages.info(request, f'Export {job} yang sama sedang diproses, tidak dibuat ulang.')
+    return redirect('manajer_export')
+
+@login_required(login_url='login')
+@user_passes_test(manajer_check, login_url='dashboard')
+def manajer_export_view(request):
+    if request.method == 'POST':
+        laporan = request.POST.get('laporan')
+        format = request.POST.get('format')
+        _, start_date, end_date, label_periode = periode_dari_request(request, request.POST)
+        try:
+            return antrekan_dan_redirect(request, laporan, format, label_periode, start_date, end_date)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('manajer_export')
+
+    export_list = list(ExportJob.objects.select_related('diminta_oleh')[:30])
+    for job in export_list:
+        job.link_unduh = buat_link_token(job) if job.status == 'done' else None
     context = {
-        'karyawan': karyawan,
-        'periode': periode,
-        'label_periode': label_periode,
-        'start_date': start_date,
-        'end_date': end_date,
-        
-        # Operasional
-        'total_permohonan': total_permohonan,
-        'permohonan_selesai': permohonan_selesai,
-        'permohonan_diproses': permohonan_diproses,
-        'permohonan_ditolak': permohonan_ditolak,
-        'layanan_stats': layanan_stats,
-        
-        # Keuangan
-        'total_transaksi': total_transaksi,
-        'total_pemasukan': total_pemasukan,
-        'metode_stats': metode_stats,
+        'export_list': export_list,
+        'ada_yang_berjalan': any(job.status in ('pending', 'processing') for job in export_list),
+        'format_laporan': ExportJob.FORMAT_LAPORAN,
+        'link_menit': settings.EXPORT_LINK_DETIK // 60,
     }
-    return render(request, 'core/manajer/cetak_laporan_gabungan.html', context)
+    return render(request, 'core/manajer/export_list.html', context)
+
+@login_required(login_url='login')
+@user_passes_test(manajer_check, login_url='dashboard')
+def export_status_view(request):
+    """
+    Progres export yang sedang berjalan (dipoll halaman export).
+    """
+    ids = [int(i) for i in request.GET.getlist('id') if i.isdigit()]
+    jobs = ExportJob.objects.filter(id__in=ids).values('id', 'status', 'progres')
+    return JsonResponse({'jobs': list(jobs)})
+
+@login_required(login_url='login')
+@user_passes_test(manajer_check, login_url='dashboard')
+def unduh_export_view(request, token):
+    try:
+        job_id = baca_link_token(token)
+    except signing.SignatureExpired:
+        messages.error(request, 'Link unduhan sudah kedaluwarsa, silakan buka ulang halaman export.')
+        return redirect('manajer_export')
+    except signing.BadSignature:
+        raise Http404('Link unduhan tidak valid.')
+
+    job = get_object_or_404(ExportJob, id=job_id, status='done')
+    return kirim_media(request, job.file.name, nama_unduhan=job.nama_file)
 
 
 # ==========================================
@@ -248,7 +247,7 @@ def cetak_laporan_gabungan_view(request):
 @login_required(login_url='login')
 @user_passes_test(manajer_check, login_url='dashboard')
 def manajer_karyawan_list_view(request):
-    if not Karyawan.objects.filter(email=request.user.email).exists():
+    if not isinstance(request.profile, Karyawan):
         return redirect('dashboard')
     
     karyawan_list = Karyawan.objects.all().order_by('nama')
@@ -266,14 +265,11 @@ def manajer_karyawan_create_view(request):
         no_wa = request.POST.get('no_wa')
         role = request.POST.get('role')
         
-        # Generate kode
-        kode = f"KRY-{Karyawan.objects.count() + 1}"
-        
         # Create User
         try:
             user = User.objects.create_user(username=email, email=email, password=uuid.uuid4().hex[:8])
             Karyawan.objects.create(
-                kode_karyawan=kode,
+                kode_karyawan=buat_kode('KRY'),
                 nama=nama,
                 email=email,
                 no_whatsapp=no_wa,
@@ -411,9 +407,8 @@ def master_layanan_form_view(request, layanan_id=None):
             item.save()
             messages.success(request, "Layanan diupdate.")
         else:
-            kode = f"LAY-{Layanan.objects.count() + 1}"
             Layanan.objects.create(
-                kode_layanan=kode, 
+                kode_layanan=buat_kode('LAY'), 
                 nama_layanan=nama, 
                 deskripsi=deskripsi,
                 harga_jasa=harga, 
@@ -463,7 +458,7 @@ def master_layanan_requirements_view(request, layanan_id):
 
 @login_required(login_url='login')
 @user_passes_test(manajer_check, login_url='dashboard')
-def master_dokumen_list_view(request):
+def master_dokumen_list_view(request, doc_id=None):
     # Sekarang sudah digabung ke Master Control Center
     return redirect('master_layanan_list')
 
@@ -0,0 +1,17 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+
+# Import Helpers
+from ..media import normalisasi_path, boleh_akses, kirim_media
+
+# ==========================================
+# MEDIA VIEWS (FILE UPLOAD BER-AUTENTIKASI)
+# ==========================================
+
+@login_required(login_url='login')
+def media_view(request, path):
+    path = normalisasi_path(path)
+    # 404 (bukan 403) agar keberadaan file milik orang lain tidak bocor
+    if not boleh_akses(request.profile, path):
+        raise Http404('File tidak ditemukan.')
+    return kirim_media(request, path)
@@ -1,7 +1,7 @@
-import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 import uuid
 
@@ -9,7 +9,12 @@ import uuid
 from ..models import Layanan, Pelanggan, Permohonan, LayananDokumen, Dokumen, Pembayaran, Karyawan, PermohonanAuditLog
 
 # Import Helpers
-from ..utils import kirim_notifikasi_email, render_to_pdf
+from ..email_templates import kirim_email_template, render_email
+from ..pdf_jobs import antrekan_pdf_email
+from ..kode import buat_kode
+from ..uploads import file_dari_request, terima_upload_dokumen
+from ..gambar import antrekan_gambar
+from ..dashboard import permohonan_pelanggan_qs
 from .auth_views import get_role_redirect_url
 
 # ==========================================
@@ -19,17 +24,14 @@ from .auth_views import get_role_redirect_url
 @login_required(login_url='login')
 def dashboard_view(request):
     # Security: Karyawan tidak boleh masuk sini
-    if Karyawan.objects.filter(email=request.user.email).exists():
+    if isinstance(request.profile, Karyawan):
         return redirect(get_role_redirect_url(request.user))
 
-    try:
-        pelanggan = Pelanggan.objects.get(email=request.user.email)
-    except Pelanggan.DoesNotExist:
-        pelanggan = None
+    pelanggan = request.profile if isinstance(request.profile, Pelanggan) else None
 
     permohonan_list = []
     if pelanggan:
-        permohonan_list = Permohonan.objects.filter(pelanggan=pelanggan).order_by('-created_at')
+        permohonan_list = permohonan_pelanggan_qs(pelanggan)
 
     return render(request, 'core/pelanggan/dashboard.html', {'pelanggan': pelanggan, 'permohonan_list': permohonan_list})
 
@@ -39,14 +41,16 @@ def pilih_layanan_view(request):
     return render(request, 'core/pelanggan/pilih_layanan.html', {'layanan_list': layanan_list})
 
 @login_required(login_url='login')
+@terima_upload_dokumen
 def form_pengajuan_view(request, layanan_id):
     layanan_terpilih = get_object_or_404(Layanan, id=layanan_id)
-    syarat_dokumen = LayananDokumen.objects.filter(layanan=layanan_terpilih)
+    syarat_dokumen = LayananDokumen.objects.filter(layanan=layanan_terpilih).select_related('master_dokumen')
 
     if request.method == 'POST':
         try:
-            pelanggan = Pelanggan.objects.get(email=request.user.email)
-            
+            pelanggan = request.profile
+            if not isinstance(pelanggan, Pelanggan):
+                raise Pelanggan.DoesNotExist("Data pelanggan tidak ditemukan.")
 
             metode_pengiriman = request.POST.get('metode_pengiriman')
             catatan = request.POST.get('catatan')
@@ -60,40 +64,51 @@ def form_pengajuan_view(request, layanan_id):
                 # Lempar user ke halaman Edit Profil untuk isi alamat
                 return redirect('edit_profil')
             
-            now = datetime.datetime.now()
-            kode_unik = f"PMH-{now.strftime('%Y%m%d-%H%M%S')}"
-
-            # Simpan Permohonan
-            permohonan_baru = Permohonan.objects.create(
-                kode_permohonan=kode_unik,
-                pelanggan=pelanggan,
-                layanan=layanan_terpilih,
-                status_proses='Menunggu Verifikasi',
-                # Gunakan variabel yang sudah kita ambil di atas
-                metode_pengiriman=metode_pengiriman, 
-                catatan_pelanggan=catatan
-            )
-
-            # Simpan Dokumen
-            for syarat in syarat_dokumen:
-                nama_input = f"file_{syarat.master_dokumen.id}"
-                file_upload = request.FILES.get(nama_input)
-                if file_upload:
-                    kode_dok = f"DOK-{permohonan_baru.id}-{syarat.master_dokumen.id}"
-                    Dokumen.objects.create(
-                        kode_dokumen=kode_dok,
+            # Satu transaksi: permohonan + dokumen + audit log tersimpan semua atau tidak sama sekali
+            field = Dokumen._meta.get_field('path_file')
+            file_tersimpan = []
+            try:
+                with transaction.atomic():
+                    permohonan_baru = Permohonan.objects.create(
+                        kode_permohonan=buat_kode('PMH'),
+                        pelanggan=pelanggan,
+                        layanan=layanan_terpilih,
+                        status_proses=Permohonan.Status.MENUNGGU_VERIFIKASI,
+                        # Gunakan variabel yang sudah kita ambil di atas
+                        metode_pengiriman=metode_pengiriman, 
+                        catatan_pelanggan=catatan
+                    )
+
+                    # Simpan Dokumen: semua file di-hash dulu, referensi blob ditambah sekaligus,
+                    # lalu baris di-INSERT sekaligus (jumlah query tidak bergantung jumlah file)
+                    dokumen_baru = []
+                    file_baru = []
+                    for syarat in syarat_dokumen:
+                        file_upload = file_dari_request(request, f"file_{syarat.master_dokumen_id}")
+                        if file_upload:
+                            dokumen_baru.append(Dokumen(
+                                kode_dokumen=f"DOK-{permohonan_baru.id}-{syarat.master_dokumen_id}",
+                                permohonan=permohonan_baru,
+                                master_dokumen=syarat.master_dokumen
+                            ))
+                            file_baru.append((field.generate_filename(None, file_upload.name), file_upload))
+                    file_tersimpan = field.storage.simpan_banyak(file_baru)
+                    for dokumen, nama in zip(dokumen_baru, file_tersimpan):
+                        dokumen.path_file = nama
+                    Dokumen.objects.bulk_create(dokumen_baru)
+                    antrekan_gambar('dokumen', *(dokumen.path_file for dokumen in dokumen_baru))
+
+                    # 🔥 AUDIT LOG: Permohonan dibuat
+                    PermohonanAuditLog.objects.create(
                         permohonan=permohonan_baru,
-                        master_dokumen=syarat.master_dokumen,
-                        path_file=file_upload
+                        karyawan=None,  # Dibuat oleh pelanggan (system)
+                        action='created',
+                        notes=f'Permohonan dibuat oleh {pelanggan.nama} via {metode_pengiriman}'
                     )
-            
-            # 🔥 AUDIT LOG: Permohonan dibuat
-            PermohonanAuditLog.objects.create(
-                permohonan=permohonan_baru,
-                karyawan=None,  # Dibuat oleh pelanggan (system)
-                action='created',
-                notes=f'Permohonan dibuat oleh {pelanggan.nama} via {metode_pengiriman}'
-            )
+            except Exception:
+                # Transaksi rollback -> hapus file yang sudah terlanjur ditulis (sekaligus)
+                field.storage.hitung_ulang_banyak(file_tersimpan)
+                raise
             
             messages.success(request, 'Permohonan berhasil dikirim!')
             return redirect('dashboard')
@@ -118,52 +133,33 @@ def tagihan_view(request, permohonan_id):
     # 3. Logika POST (Saat Tombol Bayar Diklik)
     if request.method == 'POST':
         metode = request.POST.get('metode')
+
+        # Tagihan yang sudah diproses tidak bisa dibayar ulang
+        if permohonan.status_proses != Permohonan.Status.MENUNGGU_PEMBAYARAN:
+            messages.error(request, "Tagihan ini tidak sedang menunggu pembayaran.")
+            return redirect('dashboard')
         
         # --- SKENARIO A: BAYAR ONLINE ---
         if metode == 'online':
-            # 1. Update Data Pembayaran
+            # 1. Status Permohonan dicek dulu, sebelum pembayaran ditandai lunas
+            try:
+                permohonan.ubah_status(Permohonan.Status.DIPROSES)
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect('dashboard')
+
+            # 2. Update Data Pembayaran
             pembayaran.metode_pembayaran = 'Payment Gateway'
             pembayaran.status_pembayaran = 'paid'
             pembayaran.transaction_id_gateway = f"TRX-{uuid.uuid4().hex[:8].upper()}"
             pembayaran.save()
-            
-            # 2. Update Status Permohonan
-            permohonan.status_proses = 'Diproses'
             permohonan.save()
             
-            # 3. Generate PDF Struk
-            pdf_context = {
-                'permohonan': permohonan,
-                'pembayaran': pembayaran
-            }
-            pdf_file = render_to_pdf('core/pdf/struk_lunas_pdf.html', pdf_context)
-            
-            # 4. Siapkan Email
-            subjek = f"LUNAS: Pembayaran {permohonan.kode_permohonan} Berhasil"
-            pesan = f"""
-            <div style="font-family: Helvetica, Arial, sans-serif; max-width: 600px; margin: auto; border: 1px solid #ddd; border-radius: 8px; overflow: hidden;">
-                <div style="background-color: #198754; padding: 20px; text-align: center;">
-                    <h2 style="color: #ffffff; margin: 0;">Pembayaran Diterima ✅</h2>
-                </div>
-                <div style="padding: 30px; background-color: #ffffff;">
-                    <p style="color: #555;">Terima kasih <strong>{permohonan.pelanggan.nama}</strong>,</p>
-                    <p style="color: #555;">Kami telah menerima pembayaran Anda sebesar:</p>
-                    <h1 style="text-align: center; color: #2F4F4F; margin: 20px 0;">Rp {pembayaran.total_biaya}</h1>
-                    <p style="color: #555; text-align: center;">Status Permohonan: <span style="background-color: #e2e3e5; padding: 5px 10px; border-radius: 4px; font-weight: bold;">DIPROSES</span></p>
-                    <p style="color: #555; margin-top: 20px;">
-                        Bukti pembayaran (Struk) terlampir dalam email ini.<br>
-                        Kami akan segera memproses dokumen Anda ke instansi terkait.
-                    </p>
-                </div>
-            </div>
-            """
+            # 3. Siapkan Email
+            subjek, pesan = render_email('pembayaran_lunas', {'permohonan': permohonan, 'pembayaran': pembayaran})
             
-            # 5. Kirim Email (Dengan atau Tanpa PDF)
-            if pdf_file:
-                filename = f"Struk_Lunas_{permohonan.kode_permohonan}.pdf"
-                kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email, pdf_file, filename)
-            else:
-                kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email)
+            # 4. Antrekan PDF Struk, email + lampiran dikirim oleh pdf_worker
+            antrekan_pdf_email('struk', pembayaran, subjek, pesan, permohonan.pelanggan.email, f"Struk_Lunas_{permohonan.kode_permohonan}.pdf")
 
             messages.success(request, "Pembayaran Online Berhasil! Struk dikirim ke email.")
             return redirect('dashboard')
@@ -172,35 +168,28 @@ def tagihan_view(request, permohonan_id):
             pembayaran.metode_pembayaran = 'Tunai'
             pembayaran.save()
             
-            kirim_notifikasi_email(
-                f"Menunggu Pembayaran Tunai: {permohonan.kode_permohonan}",
-                f"Halo, Anda memilih pembayaran Tunai. Silakan lakukan pembayaran di kasir kantor kami.",
-                permohonan.pelanggan.email
-            )
+            kirim_email_template('pembayaran_tunai', permohonan.pelanggan.email, {'permohonan': permohonan, 'pembayaran': pembayaran})
             
             messages.info(request, "Silakan bayar tunai di kantor.")
             return redirect('dashboard')
 
         # --- SKENARIO C: QRIS INSTANT BYPASS (DEMO) ---
         elif metode == 'qris_instant':
+            try:
+                permohonan.ubah_status(Permohonan.Status.DIPROSES)
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect('dashboard')
+
             pembayaran.metode_pembayaran = 'QRIS (Instant)'
             pembayaran.status_pembayaran = 'paid'
             pembayaran.transaction_id_gateway = f"QRIS-DEMO-{uuid.uuid4().hex[:6].upper()}"
             pembayaran.save()
-            
-            permohonan.status_proses = 'Diproses'
             permohonan.save()
             
-            # Email Struk
-            pdf_context = {'permohonan': permohonan, 'pembayaran': pembayaran}
-            pdf_file = render_to_pdf('core/pdf/struk_lunas_pdf.html', pdf_context)
-            subjek = f"LUNAS: Pembayaran QRIS {permohonan.kode_permohonan} Berhasil"
-            pesan = f"Terima kasih {permohonan.pelanggan.nama}, pembayaran QRIS Anda telah diterima."
-            
-            if pdf_file:
-                kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email, pdf_file, f"Struk_QRIS_{permohonan.kode_permohonan}.pdf")
-            else:
-                kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email)
+            # Email Struk (PDF dirender oleh pdf_worker)
+            subjek, pesan = render_email('pembayaran_lunas', {'permohonan': permohonan, 'pembayaran': pembayaran})
+            antrekan_pdf_email('struk', pembayaran, subjek, pesan, permohonan.pelanggan.email, f"Struk_QRIS_{permohonan.kode_permohonan}.pdf")
 
             messages.success(request, "Pembayaran QRIS Berhasil (Mode Demo)!")
             return redirect('dashboard')
@@ -215,9 +204,9 @@ def tagihan_view(request, permohonan_id):
                 pembayaran.bukti_pembayaran = bukti
                 pembayaran.status_pembayaran = 'pending'
                 pembayaran.save()
+                antrekan_gambar('bukti_bayar', pembayaran.bukti_pembayaran)
                 
-                kirim_notifikasi_email(f"KONFIRMASI BAYAR: {permohonan.kode_permohonan}", f"Bukti bayar diupload.", "admin@birojasa.com")
-
+                kirim_email_template('konfirmasi_bayar', "admin@birojasa.com", {'permohonan': permohonan, 'pembayaran': pembayaran})
                 messages.success(request, f"Bukti {metode_asli} berhasil diupload. Mohon tunggu verifikasi.")
                 return redirect('dashboard')
             else:
@@ -235,8 +224,8 @@ def konfirmasi_selesai_view(request, permohonan_id):
     # Hanya permohonan milik yang bersangkutan dan statusnya 'Dikirim'
     permohonan = get_object_or_404(Permohonan, id=permohonan_id, pelanggan__email=request.user.email)
     
-    if permohonan.status_proses == 'Dikirim':
-        permohonan.status_proses = 'Selesai'
+    if permohonan.status_proses == Permohonan.Status.DIKIRIM:
+        permohonan.ubah_status(Permohonan.Status.SELESAI)
         permohonan.save()
         
         # 🔥 AUDIT LOG
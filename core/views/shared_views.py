@@ -1,17 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
 
 # Import Models
 from ..models import Pelanggan, Permohonan, LayananDokumen, Dokumen
 
+# Import Helpers
+from ..uploads import file_dari_request, terima_upload_dokumen
+from ..gambar import antrekan_gambar
+from ..storage import lepas_setelah_commit
+
 # ==========================================
 # SHARED VIEWS (USED BY MULTIPLE ROLES)
 # ==========================================
 
 @login_required(login_url='login')
 def edit_profil_view(request):
-    pelanggan = get_object_or_404(Pelanggan, email=request.user.email)
+    pelanggan = request.profile
+    if not isinstance(pelanggan, Pelanggan):
+        raise Http404("Profil pelanggan tidak ditemukan.")
     if request.method == 'POST':
         pelanggan.nama = request.POST.get('nama')
         pelanggan.no_whatsapp = request.POST.get('no_wa')
@@ -43,17 +53,18 @@ def detail_permohonan_view(request, permohonan_id):
     return render(request, 'core/shared/detail_permohonan.html', context)
 
 @login_required(login_url='login')
+@terima_upload_dokumen
 def revisi_pengajuan_view(request, permohonan_id):
     # Security: Hanya pemilik yang boleh revisi
     permohonan = get_object_or_404(Permohonan, id=permohonan_id, pelanggan__email=request.user.email)
     
     # Izinkan revisi jika status 'Ditolak' (total) ATAU 'Revisi' (parsial)
-    if permohonan.status_proses not in ['Ditolak', 'Revisi']:
+    if permohonan.status_proses not in (Permohonan.Status.DITOLAK, Permohonan.Status.REVISI):
         messages.error(request, "Permohonan ini tidak butuh perbaikan saat ini.")
         return redirect('dashboard')
 
     # Ambil dokumen yang butuh perbaikan
-    if permohonan.status_proses == 'Revisi':
+    if permohonan.status_proses == Permohonan.Status.REVISI:
         dokumen_revisi = permohonan.berkas_upload.filter(status_file='Perbaikan')
     else:
         # Jika ditolak total, tampilkan semua syarat layanan
@@ -61,31 +72,43 @@ def revisi_pengajuan_view(request, permohonan_id):
 
     if request.method == 'POST':
         try:
-            files_count = 0
-            for dok in dokumen_revisi:
-                file_input_name = f"file_dok_{dok.id}"
-                file_upload = request.FILES.get(file_input_name)
+            field = Dokumen._meta.get_field('path_file')
+            with transaction.atomic():
+                # Semua file di-hash dulu, referensi blob ditambah & baris di-UPDATE sekaligus
+                dokumen_diganti = []
+                file_baru = []
+                for dok in dokumen_revisi:
+                    file_input_name = f"file_dok_{dok.id}"
+                    file_upload = file_dari_request(request, file_input_name)
                 
-                if file_upload:
-                    dok.path_file = file_upload
+                    if file_upload:
+                        dokumen_diganti.append(dok)
+                        file_baru.append((field.generate_filename(dok, file_upload.name), file_upload))
+
+                sekarang = timezone.now()
+                for dok, nama in zip(dokumen_diganti, field.storage.simpan_banyak(file_baru)):
+                    lepas_setelah_commit(field.storage, dok.path_file.name)
+                    dok.path_file = nama
                     dok.status_file = 'Digital Diupload' # Reset status
                     dok.catatan_perbaikan = None # Hapus catatan lama
-                    dok.save()
-                    files_count += 1
+                    dok.updated_at = sekarang
+                Dokumen.objects.bulk_update(dokumen_diganti, ['path_file', 'status_file', 'catatan_perbaikan', 'updated_at'])
+                antrekan_gambar('dokumen', *(dok.path_file for dok in dokumen_diganti))
+                files_count = len(dokumen_diganti)
+
+                # Jika sebelumnya ditolak total, hapus catatan penolakan
+                if permohonan.status_proses == Permohonan.Status.DITOLAK:
+                    permohonan.catatan_penolakan = None
 
-            # 2. Reset Status Permohonan ke Verifikasi Ulang
-            permohonan.status_proses = 'Menunggu Verifikasi'
-            
-            # Jika sebelumnya ditolak total, hapus catatan penolakan
-            if permohonan.status_proses == 'Ditolak':
-                permohonan.catatan_penolakan = None
+                # 2. Reset Status Permohonan ke Verifikasi Ulang
+                permohonan.ubah_status(Permohonan.Status.MENUNGGU_VERIFIKASI)
                 
-            # Update catatan pelanggan jika ada
-            catatan_baru = request.POST.get('catatan')
-            if catatan_baru:
-                permohonan.catatan_pelanggan = catatan_baru
+                # Update catatan pelanggan jika ada
+                catatan_baru = request.POST.get('catatan')
+                if catatan_baru:
+                    permohonan.catatan_pelanggan = catatan_baru
                 
-            permohonan.save()
+                permohonan.save()
 
             messages.success(request, f'Berhasil mengupdate {files_count} dokumen. Permohonan Anda dikirim ulang ke admin.')
             return redirect('dashboard')
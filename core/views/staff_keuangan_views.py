@@ -3,12 +3,18 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 
 # Import Models
 from ..models import Pembayaran, Permohonan, Karyawan, PembayaranAuditLog
 
 # Import Helpers
-from ..utils import kirim_notifikasi_email, render_to_pdf
+from ..utils import paginate_keyset
+from ..email_templates import render_email
+from ..pdf_jobs import antrekan_pdf_email
+from ..dashboard import tagihan_pending_qs, riwayat_lunas_qs
+from .auth_views import get_role_redirect_url
 
 # ==========================================
 # STAFF KEUANGAN VIEWS
@@ -16,36 +22,59 @@ from ..utils import kirim_notifikasi_email, render_to_pdf
 
 @login_required(login_url='login')
 def keuangan_dashboard_view(request):
-    try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'staff_keuangan':
-            return redirect(get_role_redirect_url(request.user))
-    except Karyawan.DoesNotExist:
+    karyawan = request.profile
+    if not isinstance(karyawan, Karyawan):
         return redirect('dashboard')
+    if request.role != 'staff_keuangan':
+        return redirect(get_role_redirect_url(request.user))
 
-    list_tagihan = Pembayaran.objects.filter(
-        status_pembayaran='pending'
-    ).order_by('created_at')
-    history = Pembayaran.objects.filter(status_pembayaran='paid').order_by('-updated_at')
+    list_tagihan = list(tagihan_pending_qs())
+    # Riwayat lunas: hanya halaman pertama, sisanya via tombol "Muat Lagi" (keuangan_riwayat_view)
+    history_qs = riwayat_lunas_qs()
+    history, next_cursor = paginate_keyset(history_qs.select_related('permohonan__pelanggan'))
     
     context = {
         'list_tagihan': list_tagihan,
         'history': history,
+        'next_cursor': next_cursor,
+        'total_lunas': history_qs.count(),
         'karyawan': karyawan
     }
     return render(request, 'core/staff/keuangan_dashboard.html', context)
 
 @login_required(login_url='login')
-def konfirmasi_lunas_view(request, pembayaran_id):
+def keuangan_riwayat_view(request):
+    """
+    AJAX "Muat Lagi" untuk tab Riwayat Transaksi (pagination cursor).
+    """
+    if request.role != 'staff_keuangan':
+        return JsonResponse({'status': 'error', 'message': 'Akses Ditolak.'}, status=403)
+
+    history_qs = riwayat_lunas_qs().select_related('permohonan__pelanggan')
     try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'staff_keuangan':
-            return redirect(get_role_redirect_url(request.user))
-    except Karyawan.DoesNotExist:
+        history, next_cursor = paginate_keyset(history_qs, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Cursor tidak valid.'}, status=400)
+
+    html = render_to_string('core/staff/partials/riwayat_keuangan_rows.html', {'history': history}, request=request)
+    return JsonResponse({'status': 'success', 'html': html, 'next_cursor': next_cursor})
+
+@login_required(login_url='login')
+def konfirmasi_lunas_view(request, pembayaran_id):
+    karyawan = request.profile
+    if not isinstance(karyawan, Karyawan):
         return redirect('dashboard')
+    if request.role != 'staff_keuangan':
+        return redirect(get_role_redirect_url(request.user))
         
     if request.method == 'POST': # Pastikan POST
-        pembayaran = get_object_or_404(Pembayaran, id=pembayaran_id)
+        pembayaran = get_object_or_404(Pembayaran.objects.select_related('permohonan__pelanggan'), id=pembayaran_id)
+        permohonan = pembayaran.permohonan
+
+        # Hanya tagihan yang permohonannya masih menunggu pembayaran
+        if not permohonan.bisa_ubah_status(Permohonan.Status.DIPROSES):
+            messages.error(request, f"Permohonan berstatus '{permohonan.get_status_proses_display()}', pembayaran tidak bisa dikonfirmasi.")
+            return redirect('keuangan_dashboard')
         
         # 1. TANGKAP METODE DARI TOMBOL YANG DIKLIK
         metode_dipilih = request.POST.get('metode') # 'Tunai' atau 'Transfer/QRIS Manual'
@@ -56,58 +85,37 @@ def konfirmasi_lunas_view(request, pembayaran_id):
         pembayaran.save()
         
         # 🔥 AUDIT LOG: Payment verification & confirmation
-        staff_keuangan = Karyawan.objects.get(email=request.user.email)
-        PembayaranAuditLog.objects.create(
-            pembayaran=pembayaran,
-            karyawan=staff_keuangan,
-            action='payment_verified',
-            notes=f'Terima {metode_dipilih}. Total: Rp {pembayaran.total_biaya:,}'
-        )
-        PembayaranAuditLog.objects.create(
-            pembayaran=pembayaran,
-            karyawan=staff_keuangan,
-            action='payment_confirmed',
-            notes='Pembayaran dikonfirmasi lunas'
-        )
+        staff_keuangan = karyawan
+        PembayaranAuditLog.objects.bulk_create([
+            PembayaranAuditLog(
+                pembayaran=pembayaran,
+                karyawan=staff_keuangan,
+                action='payment_verified',
+                notes=f'Terima {metode_dipilih}. Total: Rp {pembayaran.total_biaya:,}'
+            ),
+            PembayaranAuditLog(
+                pembayaran=pembayaran,
+                karyawan=staff_keuangan,
+                action='payment_confirmed',
+                notes='Pembayaran dikonfirmasi lunas'
+            ),
+        ])
         
         # 3. Update Status Permohonan
-        permohonan = pembayaran.permohonan
-        permohonan.status_proses = 'Diproses'
+        permohonan.ubah_status(Permohonan.Status.DIPROSES)
         permohonan.save()
         
-# --- MULAI UPDATE (GENERATE STRUK PDF) ---
-        pdf_context = {
-            'permohonan': permohonan,
-            'pembayaran': pembayaran
-        }
-        pdf_file = render_to_pdf('core/pdf/struk_lunas_pdf.html', pdf_context)
-        
-        # Kirim Email + Lampiran Struk
-        subjek = f"LUNAS: Pembayaran {permohonan.kode_permohonan} Berhasil"
-        pesan = f"""
-            <h3>Terima Kasih, {permohonan.pelanggan.nama}</h3>
-            <p>Pembayaran Anda sebesar <b>Rp {pembayaran.total_biaya}</b> via <b>{metode_dipilih}</b> telah kami terima.</p>
-            <p>Terlampir adalah <b>Struk Bukti Pembayaran</b> yang sah.</p>
-            <p>Status permohonan Anda sekarang: <b>Diproses</b>.</p>
-        """
+        # Kirim Email + Lampiran Struk (PDF dirender oleh pdf_worker)
+        subjek, pesan = render_email('pembayaran_lunas', {'permohonan': permohonan, 'pembayaran': pembayaran})
         
-        if pdf_file:
-            filename = f"Struk_Lunas_{permohonan.kode_permohonan}.pdf"
-            kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email, pdf_file, filename)
-        else:
-            kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email)
-        # -----------------------------------------
+        antrekan_pdf_email('struk', pembayaran, subjek, pesan, permohonan.pelanggan.email, f"Struk_Lunas_{permohonan.kode_permohonan}.pdf")
         
         messages.success(request, f"Pembayaran dikonfirmasi & Struk dikirim ke email!")
         return redirect('keuangan_dashboard')
         
 @login_required(login_url='login')
 def cetak_struk_view(request, pembayaran_id):
-    try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'staff_keuangan':
-            return redirect('dashboard')
-    except Karyawan.DoesNotExist:
+    if request.role != 'staff_keuangan':
         return redirect('dashboard')
 
     pembayaran = get_object_or_404(Pembayaran, id=pembayaran_id)
@@ -1,13 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 
 # Import Models
 from ..models import Permohonan, Karyawan, PermohonanAuditLog
 
 # Import Helpers
-from ..utils import kirim_notifikasi_email
+from ..utils import paginate_keyset
+from ..email_templates import kirim_email_template
+from ..gambar import antrekan_gambar
+from ..dashboard import tugas_lapangan_qs, riwayat_tugas_qs
 
 # ==========================================
 # STAFF LAPANGAN VIEWS
@@ -15,47 +19,59 @@ from ..utils import kirim_notifikasi_email
 
 @login_required(login_url='login')
 def lapangan_dashboard_view(request):
-    try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'lapangan':
-            return redirect('dashboard')
-    except:
+    karyawan = request.profile
+    if request.role != 'lapangan':
         return redirect('dashboard')
 
     # Tugas Aktif: Yang statusnya masih progres di lapangan (belum balik kantor/selesai)
-    daftar_tugas = Permohonan.objects.filter(karyawan=karyawan).exclude(
-        status_proses__icontains='Selesai'
-    ).exclude(
-        status_proses='Menunggu Finalisasi'
-    ).exclude(
-        status_proses='Dikirim'
-    ).order_by('-updated_at')
+    daftar_tugas = list(tugas_lapangan_qs(karyawan))
 
-    # Riwayat Tugas: Yang sudah diserahkan balik ke kantor atau sudah beres
-    riwayat_tugas = Permohonan.objects.filter(karyawan=karyawan).filter(
-        models.Q(status_proses__icontains='Selesai') | 
-        models.Q(status_proses='Menunggu Finalisasi') |
-        models.Q(status_proses='Dikirim')
-    ).order_by('-updated_at')
+    # Riwayat Tugas: Hanya halaman pertama, sisanya via tombol "Muat Lagi" (lapangan_riwayat_view)
+    riwayat_qs = riwayat_tugas_qs(karyawan)
+    riwayat_tugas, next_cursor = paginate_keyset(riwayat_qs.select_related('layanan', 'pelanggan'))
     
     context = {
         'karyawan': karyawan, 
         'daftar_tugas': daftar_tugas,
-        'riwayat_tugas': riwayat_tugas
+        'riwayat_tugas': riwayat_tugas,
+        'next_cursor': next_cursor,
+        'total_riwayat': riwayat_qs.count()
     }
     return render(request, 'core/staff/lapangan_dashboard.html', context)
 
+@login_required(login_url='login')
+def lapangan_riwayat_view(request):
+    """
+    AJAX "Muat Lagi" untuk tab Riwayat Tugas (pagination cursor).
+    """
+    if request.role != 'lapangan':
+        return JsonResponse({'status': 'error', 'message': 'Akses Ditolak.'}, status=403)
+
+    riwayat_qs = riwayat_tugas_qs(request.profile).select_related('layanan', 'pelanggan')
+    try:
+        riwayat_tugas, next_cursor = paginate_keyset(riwayat_qs, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Cursor tidak valid.'}, status=400)
+
+    html = render_to_string('core/staff/partials/riwayat_lapangan_rows.html', {'riwayat_tugas': riwayat_tugas}, request=request)
+    return JsonResponse({'status': 'success', 'html': html, 'next_cursor': next_cursor})
+
 @login_required(login_url='login')
 def update_status_lapangan_view(request, permohonan_id):
     permohonan = get_object_or_404(Permohonan, id=permohonan_id)
     
     # SECURITY: Prevent modification of finalized tasks
-    if permohonan.status_proses in ['Menunggu Finalisasi', 'Siap Diambil', 'Selesai', 'Dikirim']:
+    if permohonan.status_proses not in Permohonan.STATUS_LAPANGAN:
         messages.error(request, "Tugas ini sudah selesai dan dikunci. Anda tidak bisa mengubahnya lagi.")
         return redirect('lapangan_dashboard')
     if request.method == 'POST':
-        status_baru = request.POST.get('status_baru')
-        permohonan.status_proses = status_baru
+        # Status tujuan divalidasi lewat tabel transisi (Permohonan.TRANSISI_STATUS)
+        try:
+            permohonan.ubah_status(request.POST.get('status_baru'))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('update_status_lapangan', permohonan_id=permohonan.id)
+        status_baru = permohonan.get_status_proses_display()
         
         # Tangkap foto dokumen jadi jika diupload
         foto_hasil = request.FILES.get('hasil_lapangan')
@@ -63,16 +79,15 @@ def update_status_lapangan_view(request, permohonan_id):
             permohonan.hasil_lapangan = foto_hasil
             
         permohonan.save()
+        if foto_hasil:
+            antrekan_gambar('hasil_lapangan', permohonan.hasil_lapangan)
         
         # 🔥 AUDIT LOG: Status update
-        staff_lapangan = Karyawan.objects.get(email=request.user.email)
-        action_map = {
-            'Proses Lapangan': 'in_progress',
-            'Kembali dari Lapangan': 'completed',
-            'Dikirim ke Pelanggan': 'delivered',
-            'Selesai': 'delivered'
-        }
-        action = action_map.get(status_baru, 'in_progress')
+        staff_lapangan = request.profile
+        if permohonan.status_proses == Permohonan.Status.MENUNGGU_FINALISASI:
+            action = 'completed'
+        else:
+            action = 'in_progress'
         PermohonanAuditLog.objects.create(
             permohonan=permohonan,
             karyawan=staff_lapangan,
@@ -80,29 +95,7 @@ def update_status_lapangan_view(request, permohonan_id):
             notes=f'Status diupdate menjadi: {status_baru}'
         )
         
-        subjek = f"Update Status: {permohonan.kode_permohonan}"
-        pesan = f"""
-        <div style="font-family: Helvetica, Arial, sans-serif; max-width: 600px; margin: auto; border: 1px solid #ddd; border-radius: 8px; overflow: hidden;">
-            <div style="background-color: #0dcaf0; padding: 20px; text-align: center;">
-                <h2 style="color: #ffffff; margin: 0;">Update Progres 🚀</h2>
-            </div>
-            <div style="padding: 30px; background-color: #ffffff;">
-                <p style="color: #555;">Halo {permohonan.pelanggan.nama},</p>
-                <p style="color: #555;">Ada perkembangan terbaru mengenai dokumen <strong>{permohonan.layanan.nama_layanan}</strong> Anda.</p>
-                
-                <div style="background-color: #f0f8ff; border-left: 5px solid #0dcaf0; padding: 15px; margin: 20px 0;">
-                    <p style="margin: 0; font-size: 12px; color: #777;">STATUS TERKINI:</p>
-                    <h3 style="margin: 5px 0 0 0; color: #055160;">{status_baru}</h3>
-                </div>
-
-                <p style="color: #555;">Anda dapat memantau detail lengkapnya di dashboard.</p>
-                <div style="text-align: center; margin-top: 20px;">
-                    <a href="http://127.0.0.1:8000/dashboard/" style="color: #0dcaf0; text-decoration: none; font-weight: bold;">Buka Aplikasi</a>
-                </div>
-            </div>
-        </div>
-        """
-        kirim_notifikasi_email(subjek, pesan, permohonan.pelanggan.email)
+        kirim_email_template('update_status', permohonan.pelanggan.email, {'permohonan': permohonan})
         messages.success(request, "Status diperbarui!")
         return redirect('lapangan_dashboard')
 
@@ -111,11 +104,8 @@ def update_status_lapangan_view(request, permohonan_id):
 @login_required(login_url='login')
 def lapangan_detail_view(request, permohonan_id):
     # Security Check
-    try:
-        karyawan = Karyawan.objects.get(email=request.user.email)
-        if karyawan.role != 'lapangan':
-            return redirect('dashboard')
-    except:
+    karyawan = request.profile
+    if request.role != 'lapangan':
         return redirect('dashboard')
 
     permohonan = get_object_or_404(Permohonan, id=permohonan_id)
@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+# Import Models
+from ..models import UploadSementara
+
+# Import Helpers
+from ..uploads import UploadError, mulai_upload, tulis_chunk, info_upload
+
+# ==========================================
+# UPLOAD BERTAHAP (CHUNKED, BISA DILANJUTKAN)
+# ==========================================
+# Alur (lihat core/shared/chunk_upload_js.html):
+# 1. POST /upload/mulai/ {nama_file, ukuran}          -> {id, offset: 0, chunk_bytes}
+# 2. POST /upload/<id>/ body = potongan file mentah,
+#    header X-Upload-Offset = posisi potongan          -> {offset, selesai}
+# 3. Koneksi putus: GET /upload/<id>/ -> {offset}, lanjut dari offset itu
+# 4. Form dikirim dengan input hidden file_<x>_upload = id
+
+@login_required(login_url='login')
+@require_POST
+def upload_mulai_view(request):
+    try:
+        data = json.loads(request.body)
+        upload = mulai_upload(request.user, str(data.get('nama_file', '')), int(data.get('ukuran', 0)))
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Data upload tidak valid.'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(info_upload(upload), status=201)
+
+@login_required(login_url='login')
+def upload_chunk_view(request, upload_id):
+    if request.method == 'GET':
+        upload = UploadSementara.objects.filter(id=upload_id, user=request.user).first()
+        if upload is None:
+            return JsonResponse({'error': 'Upload tidak ditemukan.'}, status=404)
+        return JsonResponse(info_upload(upload))
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method tidak didukung.'}, status=405)
+    try:
+        offset = int(request.headers.get('X-Upload-Offset', ''))
+        upload = tulis_chunk(upload_id, request.user, offset, request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Header X-Upload-Offset wajib diisi.'}, status=400)
+    except UploadError as e:
+        respon = {'error': str(e)}
+        if e.status == 409:
+            respon['offset'] = UploadSementara.objects.filter(id=upload_id, user=request.user).values_list('diterima', flat=True).first()
+        return JsonResponse(respon, status=e.status)
+    return JsonResponse(info_upload(upload))